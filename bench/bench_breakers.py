@@ -0,0 +1,77 @@
+# bench/bench_breakers.py – värdar som är nere: utan brytare (BREAKER_FAILURES=0) mot brytare per värd/endpoint
+#   python bench/bench_breakers.py [-n 3] [--case standard|artiklar] [--hang-s 16] [--fault värd/prefix=503|drop|hang:S ...]
+# Varje körning är en egen process med samma CACHE_DIR (som cron), så brytarläget måste överleva mellan
+# körningarna. Rapporten: väggtid, anrop mot de trasiga värdarna och överhoppade anrop per brytare.
+#   standard  Reddits JSON hänger längre än timeouten och SweClockers feed svarar 503
+#   artiklar  artikellänkarna kan inte avkodas lokalt (opaque_articles) och publicisten de omdirigerar till
+#             stänger anslutningen, och från andra körningen även Googles artikelsidor själva.
+#             Kontroll: brytaren news.google.com (RSS-sökningarna) får aldrig hoppa över något anrop.
+import argparse, io, json, os, subprocess, sys, tempfile, time
+from contextlib import redirect_stdout
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+from replay_server import ReplayServer
+
+MODES = {"av": "0", "på": "3"}
+
+def child(base_url: str):
+    import trendkollen_worker as tk
+    base = base_url.rstrip("/")
+    tk.HTTP.url_rewrite = lambda url: (lambda u: f"{base}/{u.netloc}{u.path}" + (f"?{u.query}" if u.query else ""))(urlparse(url))
+    buf = io.StringIO()
+    t0 = time.perf_counter()
+    with redirect_stdout(buf):
+        tk.main()
+    wall = time.perf_counter() - t0
+    lines = [l for l in buf.getvalue().splitlines() if l.startswith("🔌")]
+    print(json.dumps({"wall_s": wall, "posts": buf.getvalue().count("✅ Postad"), "breakers": lines,
+                      "skipped": tk.BREAKERS.report()["skipped"]}, ensure_ascii=False))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--runs", type=int, default=3, help="körningar i följd per läge")
+    ap.add_argument("--case", choices=("standard", "artiklar"), default="standard")
+    ap.add_argument("--hang-s", type=float, default=16, help="hur länge Reddits JSON hänger (timeout 15 s)")
+    ap.add_argument("--fault", action="append", default=[], metavar="VÄRD[/PREFIX]=FEL", help="ersätter standardfelen")
+    ap.add_argument("--child", metavar="URL", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child)
+
+    opaque = args.case == "artiklar"
+    faults = dict(f.split("=", 1) for f in args.fault) or ({"www.svt.se": "drop"} if opaque else {
+        "www.reddit.com/r/sweden/top/.json": f"hang:{args.hang_s:g}",
+        "www.sweclockers.com": "503",
+    })
+    print("fel: " + ", ".join(f"{k}={v}" for k, v in faults.items()))
+    failed = False
+    for mode, failures in MODES.items():
+        server = ReplayServer(latency_ms=20, jitter_ms=10, openai_ms=200, opaque_articles=opaque).start()
+        server.faults = dict(faults)
+        env = dict(os.environ, CACHE_DIR=tempfile.mkdtemp(prefix="tk-brk-"), BREAKER_FAILURES=failures,
+                   WP_BASE_URL="https://trendkoll.bench", WP_USER="bench", WP_APP_PASS="bench",
+                   OPENAI_API_KEY="bench", YT_API_KEY="bench", POST_PAUSE_SCALE="0")
+        print(f"\nbrytare {mode}:")
+        for i in range(args.runs):
+            server.reset_counts()
+            if opaque and not args.fault and i == 1:
+                server.faults["news.google.com/rss/articles"] = "drop"
+            out = subprocess.run([sys.executable, __file__, "--child", server.base_url], env=env,
+                                 stdout=subprocess.PIPE, text=True).stdout
+            res = json.loads(out.strip().splitlines()[-1])
+            hits = server.snapshot()["faults"]
+            print(f"  körning {i + 1}: {res['wall_s']:6.1f} s  poster={res['posts']}  överhoppade={sum(res['skipped'].values()):3}  "
+                  + " ".join(f"{k}={n}" for k, n in hits.items()))
+            for line in res["breakers"]: print(f"    {line}")
+            if res["skipped"]: print("    överhoppade per brytare: " + " ".join(f"{k}={n}" for k, n in res["skipped"].items()))
+            if opaque and res["skipped"].get("news.google.com"):
+                print("    ✗ RSS-sökningarna hoppades över: artikelupplösningen belastade news.google.com")
+                failed = True
+        server.stop()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# bench/bench_e2e.py – hela körningen offline mot bench/replay_server.py (inspelade svar + latens/jitter)
+#   python bench/bench_e2e.py [-n 3] [--latency-ms 50] [--jitter-ms 25] [--openai-ms 800] [--warm] [--ingest-media]
+#                             [--stage-reps 5] [--json rapport.json] [--compare före.json]
+# Rapporten: väggtid per main()-körning, tid till första post, p50/p95 per steg, anrop per värd och
+# högsta RSS. Spara --json på två commits och jämför med --compare.
+import argparse, io, json, os, resource, subprocess, sys, tempfile, time
+from contextlib import redirect_stdout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+from replay_server import ReplayServer
+
+# Instrumenterade steg i main(); källgeneratorn mäts från start tills pipelinen stänger den. Bildrenderingen
+# sker i RENDERER:s processer och hämtas ur workerns egna spann (bild:render).
+STAGES = ["WP_INDEX.load", "iter_diverse_topics", "gnews_snippets_sv", "summarize_with_retries",
+          "wp_post_trend", "upload_media_to_wp", "set_post_media", "wp_append_update"]
+
+def pct(values, p):
+    if not values: return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, int(round(p / 100.0 * len(s) + 0.5)) - 1))]
+
+class Spans:
+    def __init__(self):
+        self.samples = {}; self.events = []
+    def add(self, name, ms):
+        self.samples.setdefault(name, []).append(ms)
+    def summary(self) -> dict:
+        return {name: {"n": len(v), "p50_ms": round(pct(v, 50), 2), "p95_ms": round(pct(v, 95), 2), "total_ms": round(sum(v), 1)}
+                for name, v in sorted(self.samples.items())}
+
+def instrument(tk, spans: Spans):
+    """Byt modulens funktioner mot tidtagande omslag (globala namn slås upp vid anrop)."""
+    def wrap(name, fn):
+        def inner(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                spans.add(name, (time.perf_counter() - t0) * 1000)
+                spans.events.append((name, time.perf_counter()))
+        return inner
+    def wrap_gen(name, fn):
+        def inner(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                yield from fn(*a, **kw)
+            finally:
+                spans.add(name, (time.perf_counter() - t0) * 1000)
+        return inner
+    for name in STAGES:
+        if name == "WP_INDEX.load":
+            tk.WP_INDEX.load = wrap(name, tk.WP_INDEX.load)
+        elif name == "iter_diverse_topics":
+            setattr(tk, name, wrap_gen(name, getattr(tk, name)))
+        else:
+            setattr(tk, name, wrap(name, getattr(tk, name)))
+
+def reset_state(tk, warm: bool):
+    tk.HTTP.reset_stats()
+    if warm: return
+    tk.HTTP.close()
+    for c in tk._CACHES: c.clear()
+    tk.BREAKERS.clear()
+    tk.reset_gnews_decode_stats()
+    tk.WP_INDEX.loaded = False; tk.WP_INDEX.posts = []; tk.WP_INDEX.by_key = {}
+
+def run_main(tk, spans: Spans, server: ReplayServer, runs: int, warm: bool) -> dict:
+    walls, first_posts, posts = [], [], []
+    for i in range(runs):
+        reset_state(tk, warm)
+        spans.events.clear()
+        buf = io.StringIO()
+        t0 = time.perf_counter()
+        with redirect_stdout(buf):
+            tk.main()
+        walls.append(time.perf_counter() - t0)
+        for sec in list(tk.METRICS.spans.get("bild:render", [])):
+            spans.add("bild:render", sec * 1000)
+        firsts = [t for name, t in spans.events if name == "wp_post_trend"]
+        first_posts.append(min(firsts) - t0 if firsts else None)
+        posts.append(buf.getvalue().count("✅ Postad"))
+    return {"runs": runs, "wall_s": [round(w, 3) for w in walls], "wall_p50_s": round(pct(walls, 50), 3),
+            "wall_p95_s": round(pct(walls, 95), 3),
+            "first_post_s": [round(f, 3) if f is not None else None for f in first_posts], "posts": posts,
+            "http": tk.HTTP.stats()}
+
+def run_stages(tk, spans: Spans, reps: int):
+    """Varje steg för sig (kalla cachar), så att ett steg kan jämföras utan resten av pipelinen."""
+    titles = ["Riksbanken sänker styrräntan igen", "Storm väntas över Götaland", "Malmö FF klart för Champions League",
+              "Apple släpper iPhone 18 i Sverige", "Djurgården vann derbyt mot AIK"]
+    with redirect_stdout(io.StringIO()):
+        for i in range(reps):
+            reset_state(tk, warm=False)
+            t0 = time.perf_counter(); tk.pick_diverse_topics(max_total=tk.MAX_TRENDS * 3)
+            spans.add("steg:pick_diverse_topics", (time.perf_counter() - t0) * 1000)
+            title = titles[i % len(titles)]
+            t0 = time.perf_counter(); snippets = tk.gnews_snippets_sv(title, max_items=4, max_age_hours=72)
+            spans.add("steg:gnews_snippets_sv", (time.perf_counter() - t0) * 1000)
+            tk.SUMMARY_CACHE.clear()
+            t0 = time.perf_counter(); tk.summarize_with_retries(title, snippets)
+            spans.add("steg:summarize_with_retries", (time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter(); tk.generate_og_image(title, "nyheter", "Nyheter", "2026-10-18", io.BytesIO())
+            spans.add("steg:generate_og_image", (time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            res = tk.wp_post_trend(title=title, body="<p>bench</p>", topics=["idag"], categories=["nyheter"], excerpt="bench")
+            tk.upload_media_to_wp(b"\x89PNG bench", f"card_trend_{res.get('post_id')}.png")
+            spans.add("steg:wp_post", (time.perf_counter() - t0) * 1000)
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except Exception:
+        return ""
+
+def print_report(rep: dict):
+    m = rep["main"]
+    print(f"commit {rep['commit'] or '?'} | latens {rep['config']['latency_ms']}±{rep['config']['jitter_ms']} ms, "
+          f"OpenAI {rep['config']['openai_ms']} ms, {'varm' if rep['config']['warm'] else 'kall'} cache")
+    print(f"main()     väggtid p50 {m['wall_p50_s']:.2f} s  p95 {m['wall_p95_s']:.2f} s  (körningar={m['runs']}, poster={m['posts']})")
+    fp = [f for f in m["first_post_s"] if f is not None]
+    if fp: print(f"första post p50 {pct(fp, 50):.2f} s")
+    print(f"{'steg':34} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'summa ms':>10}")
+    for name, s in rep["stages"].items():
+        print(f"{name:34} {s['n']:>4} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['total_ms']:>10.0f}")
+    r = rep["requests"]
+    print(f"anrop: {r['total']} (304={r['not_modified']}, {r['bytes_out'] / 1024:.0f} KiB) " +
+          " ".join(f"{h}={n}" for h, n in r["requests"].items()))
+    posts = sum(m["posts"])
+    if posts and r.get("wp"):
+        publish = sum(n for k, n in r["wp"].items() if k.startswith("POST"))
+        print(f"WP: {publish / posts:.1f} POST-anrop per publicerad post | " + " ".join(f"{k}={n}" for k, n in r["wp"].items()))
+    print(f"högsta RSS: {rep['peak_rss_mb']:.1f} MiB (inkl. bench-servern)")
+
+def print_compare(rep: dict, old: dict):
+    def delta(a, b): return f"{b:8.2f} → {a:8.2f} ({(a - b) / b * 100:+.0f}%)" if b else f"{a:8.2f}"
+    print(f"\njämförelse mot {old.get('commit') or 'tidigare'}:")
+    print(f"  main() väggtid p50 s      {delta(rep['main']['wall_p50_s'], old['main']['wall_p50_s'])}")
+    for name, s in rep["stages"].items():
+        if name in old.get("stages", {}):
+            print(f"  {name:26} p50 {delta(s['p50_ms'], old['stages'][name]['p50_ms'])}")
+    print(f"  anrop                     {delta(rep['requests']['total'], old['requests']['total'])}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--runs", type=int, default=3, help="antal main()-körningar")
+    ap.add_argument("--latency-ms", type=float, default=50)
+    ap.add_argument("--jitter-ms", type=float, default=25)
+    ap.add_argument("--openai-ms", type=float, default=800)
+    ap.add_argument("--warm", action="store_true", help="behåll cachar och anslutningar mellan körningarna")
+    ap.add_argument("--stage-reps", type=int, default=5, help="isolerade körningar per steg (0 = hoppa över)")
+    ap.add_argument("--ingest-media", action="store_true", help="WP_INGEST_MEDIA=1: bilderna följer med i ingest-anropet")
+    ap.add_argument("--json", help="skriv rapporten som JSON")
+    ap.add_argument("--compare", help="JSON-rapport från en tidigare commit att jämföra med")
+    args = ap.parse_args()
+
+    server = ReplayServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, openai_ms=args.openai_ms).start()
+    cache_dir = tempfile.mkdtemp(prefix="tk-bench-")
+    os.environ.update(CACHE_DIR=cache_dir, WP_BASE_URL="https://trendkoll.bench", WP_USER="bench", WP_APP_PASS="bench",
+                      OPENAI_API_KEY="bench", YT_API_KEY="bench", POST_PAUSE_SCALE="0",
+                      WP_INGEST_MEDIA="1" if args.ingest_media else "0")
+    import trendkollen_worker as tk
+    tk.HTTP.url_rewrite = server.rewrite
+
+    spans = Spans()
+    instrument(tk, spans)
+    try:
+        main_rep = run_main(tk, spans, server, args.runs, args.warm)
+        requests_main = server.snapshot()
+        stages = spans.summary()
+        if args.stage_reps > 0:
+            spans.samples.clear()
+            run_stages(tk, spans, args.stage_reps)
+            stages.update((k, v) for k, v in spans.summary().items() if k.startswith("steg:"))
+    finally:
+        server.stop()
+
+    rep = {"commit": git_commit(), "config": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                                              "openai_ms": args.openai_ms, "warm": args.warm, "max_trends": tk.MAX_TRENDS,
+                                              "ingest_media": args.ingest_media},
+           "main": main_rep, "stages": stages, "requests": requests_main,
+           "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+    print_report(rep)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_compare(rep, json.load(f))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench/bench_links.py – första externa länken ur HTML: BeautifulSoup-trädet (före) mot strömmande HTMLParser
+#   python bench/bench_links.py [-n 200] [--fuzz 3000]
+# Korpus: bench/fixtures/links/*.html, alla description-fält i gnews_search.xml, stora consent/nyhetssidor
+# samt slumpvis klippta/ihopskarvade varianter. Avbryter med fel om något svar skiljer sig.
+import argparse, glob, os, random, re, statistics, sys, time, tracemalloc
+from html import unescape
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from bs4 import BeautifulSoup
+import trendkollen_worker as tk
+
+# --- Referens: implementationerna före (ordagrant) ---
+def legacy_first_external_href_from_html(html):
+    try:
+        soup = BeautifulSoup(html, "html.parser")
+        for a in soup.find_all("a", href=True):
+            href = a["href"]
+            if not any(h in href for h in tk.GOOGLE_HOSTS):
+                return href
+    except Exception:
+        pass
+    return None
+
+def legacy_extract_external_from_news_html(html):
+    try:
+        soup = BeautifulSoup(html, "html.parser")
+        for a in soup.find_all("a", href=True):
+            href = a["href"]
+            if not any(h in href for h in tk.GOOGLE_HOSTS) and href.startswith("http"):
+                return href
+    except Exception:
+        pass
+    return None
+
+def big_page(rnd, n_google=400, script_kb=200):
+    """Stor Google-sida: mycket inline-skript och hundratals interna länkar före första externa."""
+    script = "<script>var d='" + "x" * (script_kb * 1024) + "';</script>"
+    google = "".join(f"<div class='c{i}'><a href='https://news.google.com/topics/{i}'>Ämne {i}</a></div>" for i in range(n_google))
+    tail = "".join(f"<p><a href='https://www.svt.se/n/{rnd.randint(1, 10**6)}'>Nyhet</a></p>" for _ in range(200))
+    return f"<html><head>{script}</head><body>{google}{tail}</body></html>"
+
+def corpus(fuzz: int, seed: int = 7):
+    rnd = random.Random(seed)
+    docs = {}
+    for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "links", "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            docs[os.path.basename(path)] = f.read()
+    with open(os.path.join(HERE, "fixtures", "gnews_search.xml"), encoding="utf-8") as f:
+        for i, d in enumerate(re.findall(r"<description>(.*?)</description>", f.read(), re.S)):
+            docs[f"gnews_summary_{i}"] = unescape(d)
+    docs["big_consent"] = big_page(rnd)
+    docs["big_news"] = big_page(rnd, n_google=60, script_kb=40)
+    small = [d for d in docs.values() if len(d) < 20000]
+    for i in range(fuzz):
+        a, b = rnd.choice(small), rnd.choice(small)
+        cut_a, cut_b = rnd.randint(0, len(a)), rnd.randint(0, len(b))
+        doc = a[:cut_a] + b[cut_b:]
+        if rnd.random() < 0.3: doc = doc.upper()
+        docs[f"fuzz_{i}"] = doc
+    return docs
+
+def measure(fn, docs, reps):
+    times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        for d in docs: fn(d)
+        times.append(time.perf_counter() - t0)
+    peaks = []
+    for d in docs:
+        tracemalloc.start(); fn(d); peaks.append(tracemalloc.get_traced_memory()[1]); tracemalloc.stop()
+    return statistics.median(times), max(peaks)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5, help="varv per mätning")
+    ap.add_argument("--fuzz", type=int, default=3000)
+    args = ap.parse_args()
+    docs = corpus(args.fuzz)
+
+    mismatches = 0
+    for name, d in docs.items():
+        for old, new in ((legacy_first_external_href_from_html, tk._first_external_href_from_html),
+                         (legacy_extract_external_from_news_html, tk._extract_external_from_news_html)):
+            a, b = old(d), new(d)
+            if a != b:
+                mismatches += 1
+                if mismatches <= 10: print(f"SKILLNAD {name} {new.__name__}: {a!r} != {b!r}")
+    print(f"dokument: {len(docs)}  skillnader: {mismatches}")
+
+    groups = {"gnews-summary": [d for k, d in docs.items() if k.startswith("gnews_summary")],
+              "stora sidor": [docs["big_consent"], docs["big_news"]],
+              "fixtures+fuzz": [d for k, d in docs.items() if k.endswith(".html") or k.startswith("fuzz")]}
+    for label, group in groups.items():
+        t_old, m_old = measure(legacy_first_external_href_from_html, group, args.n)
+        t_new, m_new = measure(tk._first_external_href_from_html, group, args.n)
+        print(f"{label:14} n={len(group):5}  före {t_old * 1000:8.1f} ms {m_old / 1024:8.0f} KiB topp  "
+              f"efter {t_new * 1000:7.1f} ms {m_new / 1024:6.0f} KiB topp  → {t_old / t_new:5.1f}x")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
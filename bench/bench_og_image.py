@@ -0,0 +1,74 @@
+# bench/bench_og_image.py – mikrobenchmark för bakgrunden i generate_og_image
+#   python bench/bench_og_image.py [-n 50]
+import argparse, io, os, random, statistics, sys, time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from PIL import Image, ImageChops, ImageDraw
+import trendkollen_worker as tk
+
+W, H = 1200, 630
+
+def grad_color(c1, c2, t):
+    r1,g1,b1 = tk._hex_to_rgb(c1); r2,g2,b2 = tk._hex_to_rgb(c2)
+    return (tk._lerp(r1,r2,t), tk._lerp(g1,g2,t), tk._lerp(b1,b2,t))
+
+def legacy_background(title, cat_slug):
+    """Bakgrunden som den ritades före vektoriseringen: 630 draw.line + 120 separata RGBA-prickar."""
+    base1, base2 = tk.CAT_COLORS.get(cat_slug, ("#111827","#374151"))
+    random.seed(tk._seed_from_title(title))
+    img = Image.new("RGB", (W,H), tk._hex_to_rgb(base1))
+    draw = ImageDraw.Draw(img)
+    for y in range(H):
+        draw.line([(0,y),(W,y)], fill=grad_color(base1, base2, y / (H-1)))
+    for _ in range(120):
+        x = random.randint(0,W); y = random.randint(0,H)
+        r = random.randint(2,5); alpha = random.randint(18,32)
+        dot = Image.new("RGBA",(r*2,r*2),(0,0,0,0))
+        ImageDraw.Draw(dot).ellipse((0,0,r*2,r*2), fill=(255,255,255,alpha))
+        img.paste(dot,(x,y),dot)
+    return img
+
+def legacy_image(title, cat_slug):
+    """Hel bild (med text) som före: gamla bakgrunden + dagens textlager."""
+    orig = tk._render_background
+    tk._render_background = legacy_background
+    try:
+        tk.generate_og_image(title, cat_slug, "Sport", "2026-10-18", io.BytesIO(), with_text=True)
+    finally:
+        tk._render_background = orig
+
+def current_image(title, cat_slug):
+    tk.generate_og_image(title, cat_slug, "Sport", "2026-10-18", io.BytesIO(), with_text=True)
+
+def timed(fn, titles, cat_slug):
+    out = []
+    for t in titles:
+        t0 = time.perf_counter(); fn(t, cat_slug); out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=50, help="antal bilder per variant")
+    ap.add_argument("--cat", default="sport")
+    args = ap.parse_args()
+    titles = [f"Stormen Amy drar in över Sverige – uppdatering {i}" for i in range(args.n)]
+
+    with redirect_stdout(io.StringIO()):
+        bg_before = timed(legacy_background, titles, args.cat)
+        bg_after = timed(tk._render_background, titles, args.cat)
+        img_before = timed(legacy_image, titles, args.cat)
+        img_after = timed(current_image, titles, args.cat)
+
+    diff_max = 0
+    for t in titles[:10]:
+        d = ImageChops.difference(legacy_background(t, args.cat), tk._render_background(t, args.cat))
+        diff_max = max(diff_max, max(hi for _, hi in d.getextrema()))
+
+    p50 = statistics.median
+    print(f"bakgrund   före {p50(bg_before):7.2f} ms  efter {p50(bg_after):7.2f} ms  (p50, n={args.n})")
+    print(f"hel bild   före {p50(img_before):7.2f} ms  efter {p50(img_after):7.2f} ms  (inkl. text + PNG)")
+    print(f"max kanalavvikelse mot före: {diff_max}")
+
+if __name__ == "__main__":
+    main()
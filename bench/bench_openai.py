@@ -0,0 +1,109 @@
+# bench/bench_openai.py – sammanfattningssteget mot replay-serverns OpenAI-stubbe, med kontroller
+#   python bench/bench_openai.py [--retry-after 3] [--openai-ms 300] [--jitter-ms 300]
+# Tre fall, var och ett i en egen process med tom cache:
+#   429       de två första chat-anropen får 429 + Retry-After: inget nytt anrop får nå servern under pausen
+#             (hinken stängs för alla trådar, även efter sista försöket), och Retry-After över HTTP_BACKOFF_MAX
+#             ska följas; sammanfattningarna kommer ändå från AI
+#   fallback  gpt-5 svarar 503: varje ämne provar gpt-5 (ett omförsök, tills gpt-5:s egen brytare öppnar)
+#             och får sin text från gpt-5-mini
+#   no-AI     båda modellerna svarar 503: posterna publiceras med no-AI-texten
+# I alla fall ska posterna publiceras i kandidatordning (den ordning sammanfattningarna beställdes), trots att
+# OpenAI-svaren kommer i annan ordning. Avslutas med felkod om någon kontroll fallerar.
+import argparse, io, json, os, subprocess, sys, tempfile, time
+from contextlib import redirect_stdout
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+from replay_server import ReplayServer
+
+CHAT = "api.openai.com/v1/chat/completions"
+NO_AI_MARK = "Sök efter relaterade produkter/tjänster"
+
+def child(base_url: str):
+    import trendkollen_worker as tk
+    base = base_url.rstrip("/")
+    tk.HTTP.url_rewrite = lambda url: (lambda u: f"{base}/{u.netloc}{u.path}" + (f"?{u.query}" if u.query else ""))(urlparse(url))
+    ordered = []
+    submit = tk.SUMMARIZER.submit
+    def recording_submit(topic, snippets):
+        ordered.append(topic)
+        return submit(topic, snippets)
+    tk.SUMMARIZER.submit = recording_submit
+    buf = io.StringIO()
+    t0 = time.perf_counter()
+    with redirect_stdout(buf):
+        tk.main()
+    print(json.dumps({"wall_s": time.perf_counter() - t0, "ordered": ordered,
+                      "posts": buf.getvalue().count("✅ Postad")}, ensure_ascii=False))
+
+def check_order(ordered: list, ingested: list) -> list:
+    titles = [p["title"] for p in ingested]
+    expected = [t for t in ordered if t in titles]
+    return [] if titles == expected else [f"publiceringsordning {titles} ≠ kandidatordning {expected}"]
+
+def check_429(log: list, pause: float) -> list:
+    errors = []
+    throttled = [e for e in log if e["status"] == 429]
+    if not throttled: errors.append("inga 429 nådde workern")
+    for e in throttled:
+        early = [x for x in log if e["answered"] + 0.1 < x["received"] < e["answered"] + pause - 0.1]
+        if early:
+            errors.append(f"{len(early)} anrop inom {pause:g} s efter 429 (första efter {early[0]['received'] - e['answered']:.2f} s)")
+    return errors
+
+def check_fallback(log: list, posts: int) -> list:
+    big = [e for e in log if e["model"] == "gpt-5"]; mini = [e for e in log if e["model"] == "gpt-5-mini"]
+    errors = []
+    if len(mini) != posts or any(e["status"] != 200 for e in mini):
+        errors.append(f"gpt-5-mini gav {sum(e['status'] == 200 for e in mini)} sammanfattningar för {posts} poster")
+    if not big or len(big) > 2 * len(mini): errors.append(f"gpt-5 provades {len(big)} gånger för {len(mini)} ämnen (högst 2 per ämne)")
+    if mini and big and min(e["received"] for e in mini) < min(e["received"] for e in big):
+        errors.append("gpt-5-mini anropades före gpt-5")
+    return errors
+
+def check_texts(ingested: list, no_ai: bool) -> list:
+    if not ingested: return ["inga poster publicerades"]
+    wrong = [p["title"] for p in ingested if (NO_AI_MARK in p["content"]) != no_ai]
+    return [f"{len(wrong)} poster {'utan' if no_ai else 'med'} no-AI-text: {wrong[:2]}"] if wrong else []
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--retry-after", type=float, default=3, help="Retry-After i 429-fallet (över HTTP_BACKOFF_MAX=1)")
+    ap.add_argument("--openai-ms", type=float, default=300)
+    ap.add_argument("--jitter-ms", type=float, default=300, help="slumpad extra latens – OpenAI-svaren kommer i blandad ordning")
+    ap.add_argument("--child", metavar="URL", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child)
+
+    cases = {
+        "429":      ({CHAT: f"429:{args.retry_after:g}@2"}, {}),
+        "fallback": ({}, {"gpt-5": "503"}),
+        "no-AI":    ({}, {"gpt-5": "503", "gpt-5-mini": "503"}),
+    }
+    failed = False
+    for name, (faults, model_faults) in cases.items():
+        server = ReplayServer(latency_ms=10, jitter_ms=args.jitter_ms, openai_ms=args.openai_ms).start()
+        server.faults, server.model_faults = faults, model_faults
+        env = dict(os.environ, CACHE_DIR=tempfile.mkdtemp(prefix="tk-oai-"), WP_BASE_URL="https://trendkoll.bench",
+                   WP_USER="bench", WP_APP_PASS="bench", OPENAI_API_KEY="bench", YT_API_KEY="bench",
+                   POST_PAUSE_SCALE="0", HTTP_BACKOFF_MAX="1")
+        out = subprocess.run([sys.executable, __file__, "--child", server.base_url], env=env,
+                             stdout=subprocess.PIPE, text=True).stdout
+        server.stop()
+        res = json.loads(out.strip().splitlines()[-1])
+        log, ingested = server.openai_log, server.ingested
+        errors = check_order(res["ordered"], ingested) + check_texts(ingested, no_ai=name == "no-AI")
+        if name == "429": errors += check_429(log, args.retry_after)
+        if name == "fallback": errors += check_fallback(log, len(ingested))
+        calls = " ".join(f"{m}={sum(1 for e in log if e['model'] == m)}" for m in ("gpt-5", "gpt-5-mini"))
+        print(f"{name:9} {res['wall_s']:6.1f} s  poster={res['posts']}  {calls}  429={sum(1 for e in log if e['status'] == 429)}  "
+              + ("OK" if not errors else "FEL"))
+        for e in errors: print(f"    ✗ {e}")
+        failed |= bool(errors)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# bench/bench_rss.py – feedparser.parse(text) (före) mot iter_feed_entries(bytes) (snabbväg + feedparser-reserv)
+#   python bench/bench_rss.py [-n 20] [--fuzz 300]
+# Korpus: bench/fixtures/*.xml, stora syntetiska feeds och varianter som ska gå till reserven (HTML-rubriker,
+# relativa länkar, RSS 1.0, trasig/avklippt XML, latin-1 …). Jämför de fält workern läser; avbryter med fel
+# om något skiljer sig.
+import argparse, glob, os, random, statistics, sys, time, tracemalloc
+from itertools import islice
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+import feedparser
+import trendkollen_worker as tk
+
+def fields(e) -> tuple:
+    """Det som gnews_recent_entries, gnews_snippets_sv, reddit-reserven och feed_titles läser ur en post."""
+    src = e.get("source") or {}
+    return (getattr(e, "title", None), getattr(e, "link", None), getattr(e, "id", None), tk.parse_entry_dt(e),
+            src.get("href"), src.get("title"), tk._first_external_href_from_html(getattr(e, "summary", "") or ""))
+
+RSS_ITEM = ("<item><title>{title}</title><link>https://www.svt.se/nyheter/{i}</link><guid isPermaLink=\"false\">g{i}</guid>"
+            "<pubDate>{date}</pubDate><description>&lt;a href=&quot;https://www.svt.se/nyheter/{i}&quot;&gt;{title}&lt;/a&gt;"
+            "&amp;nbsp;&lt;font color=&quot;#6f6f6f&quot;&gt;SVT&lt;/font&gt;</description>"
+            "<source url=\"https://www.svt.se\">SVT Nyheter</source></item>")
+
+def rss(items, head='<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>T</title>', tail="</channel></rss>"):
+    return head + "\n".join(items) + tail
+
+def variants(rnd):
+    d = "Sat, 17 Oct 2026 07:25:00 GMT"
+    item = lambda i, **kw: RSS_ITEM.format(i=i, title=kw.get("title", f"Nyhet nummer {i} om Sverige"), date=kw.get("date", d))
+    big = [item(i, date=f"Sat, 17 Oct 2026 {i % 24:02d}:{i % 60:02d}:00 GMT") for i in range(2000)]
+    out = {
+        "stor_rss_2000": rss(big),
+        "h&m_och_q&a": rss([item(1, title="H&amp;M och Q&amp;A – vad händer?"), item(2, title="A &lt; B")]),
+        "html_i_rubrik": rss([item(1), item(2, title="&lt;b&gt;Fet&lt;/b&gt; rubrik"), item(3)]),
+        "entitet_i_rubrik": rss([item(1, title="Ett &amp;amp; två"), item(2)]),
+        "cdata": rss([item(1).replace("<title>Nyhet nummer 1 om Sverige</title>", "<title><![CDATA[Nyhet <i>CDATA</i>]]></title>")]),
+        "guid_permalink": rss(["<item><title>Guid</title><guid>https://ex.se/a/1</guid><pubDate>%s</pubDate></item>" % d,
+                               "<item><title>Guid2</title><guid isPermaLink=\"false\">https://ex.se/a/2</guid><pubDate>%s</pubDate></item>" % d]),
+        "utan_datum": rss([item(1), "<item><title>Odaterad</title><link>https://ex.se/1</link></item>", item(3)]),
+        "dc_date": rss(['<item><title>DC</title><link>https://ex.se/1</link><dc:date xmlns:dc="http://purl.org/dc/elements/1.1/">2026-10-17T07:00:00Z</dc:date></item>']),
+        "iso_pubdate": rss([item(1, date="2026-10-17T07:00:00+02:00")]),
+        "skräpdatum": rss([item(1, date="igår kväll")]),
+        "relativ_länk": rss([item(1), item(2).replace("https://www.svt.se/nyheter/2&quot;", "/nyheter/2&quot;")]),
+        "content_encoded": rss(['<item><title>CE</title><link>https://ex.se/1</link><pubDate>%s</pubDate>'
+                                '<content:encoded xmlns:content="http://purl.org/rss/1.0/modules/content/">&lt;p&gt;x&lt;/p&gt;</content:encoded></item>' % d]),
+        "media_och_dc_creator": rss([item(1).replace("</item>", '<media:content xmlns:media="http://search.yahoo.com/mrss/" url="https://ex.se/i.jpg"/>'
+                                                     '<dc:creator xmlns:dc="http://purl.org/dc/elements/1.1/">Anna</dc:creator></item>')]),
+        "rss10_rdf": '<?xml version="1.0"?><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/">'
+                     '<channel rdf:about="x"><title>R</title></channel><item rdf:about="https://ex.se/1"><title>RDF</title>'
+                     '<link>https://ex.se/1</link><dc:date xmlns:dc="http://purl.org/dc/elements/1.1/">2026-10-17T07:00:00Z</dc:date></item></rdf:RDF>',
+        "nbsp_odeklarerad": rss([item(1), item(2, title="Ny&nbsp;rubrik"), item(3)]),
+        "latin1": rss([item(1, title="Åtta nya fall i Växjö")], head='<?xml version="1.0" encoding="ISO-8859-1"?><rss version="2.0"><channel>'),
+        "atom_xhtml": '<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><entry><title type="xhtml"><div xmlns="http://www.w3.org/1999/xhtml">X<b>y</b></div></title>'
+                      '<link href="https://ex.se/1"/><id>1</id><updated>2026-10-17T07:00:00Z</updated></entry></feed>',
+        "atom_bara_updated": '<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><entry><title>U</title><link href="https://ex.se/1"/>'
+                             '<link rel="enclosure" type="image/png" href="https://ex.se/1.png"/><id>1</id><updated>2026-10-17T07:00:00Z</updated></entry></feed>',
+        "atom_reddit": '<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom" xmlns:media="http://search.yahoo.com/mrss/">'
+                       '<entry><author><name>/u/x</name><uri>https://www.reddit.com/user/x</uri></author><category term="sweden" label="r/sweden"/>'
+                       '<content type="html">&lt;p&gt;hej&lt;/p&gt;</content><id>t3_1</id><media:thumbnail url="https://i.redd.it/1.jpg"/>'
+                       '<link href="https://www.reddit.com/r/sweden/comments/1/"/><updated>2026-10-17T07:00:00+00:00</updated>'
+                       '<published>2026-10-17T06:00:00+00:00</published><title>Reddit-rubrik</title></entry></feed>',
+        "atom_relativ": '<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom" xml:base="https://ex.se/"><entry><title>R</title>'
+                        '<link href="a/1"/><id>1</id><updated>2026-10-17T07:00:00Z</updated></entry></feed>',
+        "inte_xml": "<html><body>Inte en feed</body></html>",
+        "tom": "",
+    }
+    for name in list(out):
+        if name.startswith("stor") or name == "tom": continue
+        body = out[name]
+        for k in range(3):   # avklippt mitt i: snabbvägen ger början, feedparser resten
+            out[f"{name}_klippt{k}"] = body[:rnd.randint(len(body) // 3, len(body))]
+    return out
+
+def corpus(fuzz: int, seed: int = 11):
+    rnd = random.Random(seed)
+    docs = {}
+    for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "*.xml"))):
+        with open(path, encoding="utf-8") as f:
+            docs[os.path.basename(path)] = f.read()
+    docs.update(variants(rnd))
+    names = [n for n in docs if not n.startswith("stor")]
+    for i in range(fuzz):
+        a = docs[rnd.choice(names)]
+        docs[f"fuzz_{i}"] = a[:rnd.randint(0, len(a))]
+    enc = lambda name, text: text.encode("iso-8859-1") if name.startswith("latin1") else text.encode("utf-8")
+    return {name: (text, enc(name, text)) for name, text in docs.items()}
+
+def legacy(text, raw, first=None):
+    return feedparser.parse(text).entries
+
+def fast(text, raw, first=None):
+    it = tk.iter_feed_entries(raw)
+    return list(islice(it, first)) if first else list(it)
+
+def measure(fn, docs, reps, first=None):
+    times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        for text, raw in docs: fn(text, raw, first)
+        times.append(time.perf_counter() - t0)
+    peaks = []
+    for text, raw in docs:
+        tracemalloc.start(); fn(text, raw, first); peaks.append(tracemalloc.get_traced_memory()[1]); tracemalloc.stop()
+    return statistics.median(times), max(peaks)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5, help="varv per mätning")
+    ap.add_argument("--fuzz", type=int, default=300)
+    args = ap.parse_args()
+    docs = corpus(args.fuzz)
+
+    mismatches = 0
+    for name, (text, raw) in docs.items():
+        # före: fetch_rss gav r.text (avkodad) till feedparser
+        text_in = raw.decode("iso-8859-1") if name.startswith("latin1") else text
+        a = [fields(e) for e in feedparser.parse(text_in).entries]
+        b = [fields(e) for e in tk.iter_feed_entries(raw)]
+        if a != b:
+            mismatches += 1
+            if mismatches <= 10:
+                diff = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+                print(f"SKILLNAD {name}: {len(a)} mot {len(b)} poster, första skillnad #{diff}: "
+                      f"{a[diff] if diff < len(a) else None!r} != {b[diff] if diff < len(b) else None!r}")
+    print(f"dokument: {len(docs)}  skillnader: {mismatches}  "
+          f"snabbväg={tk.FEED_PARSE_STATS['fast']} poster, feedparser={tk.FEED_PARSE_STATS['fallback']} feeds")
+
+    groups = {"fixtures": ([docs[k] for k in docs if k.endswith(".xml")], None),
+              "stor rss, alla": ([docs["stor_rss_2000"]], None),
+              "stor rss, 20 första": ([docs["stor_rss_2000"]], 20),
+              "reserv-varianter": ([v for k, v in docs.items() if not k.endswith(".xml") and not k.startswith(("stor", "fuzz"))], None)}
+    for label, (group, first) in groups.items():
+        t_old, m_old = measure(legacy, group, args.n)
+        t_new, m_new = measure(fast, group, args.n, first)
+        print(f"{label:20} n={len(group):3}  före {t_old * 1000:8.1f} ms {m_old / 1024:7.0f} KiB topp  "
+              f"efter {t_new * 1000:7.1f} ms {m_new / 1024:6.0f} KiB topp  → {t_old / t_new:5.1f}x")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
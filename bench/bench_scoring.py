@@ -0,0 +1,124 @@
+# bench/bench_scoring.py – rubrikstädning + poäng över en stor titelkorpus, gamla funktionerna mot ScoringEngine
+#   python bench/bench_scoring.py [-n 100000] [--reps 5]
+# Före och efter körs omväxlande --reps gånger; tiderna är medianen (en enstaka körning är för brusig).
+import argparse, os, random, re, statistics, sys, time, unicodedata
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import trendkollen_worker as tk
+
+# --- Referens: implementationerna före poängmotorn (ordagrant) ---
+def legacy_normalize_title_key(s):
+    s = s.strip().lower()
+    for a,b in {"’":"'", "‘":"'", "“":'"', "”":'"', "–":"-", "—":"-"}.items():
+        s = s.replace(a,b)
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if ch.isalnum() or ch.isspace())
+    return re.sub(r"\s+"," ",s).strip()
+
+def legacy_clean_topic_title(t):
+    t = t.strip()
+    t = re.sub(r'^(JUST NU:|DN Direkt\s*-\s*|LIVE:|AB:\s*|Aftonbladet:\s*|Expressen:\s*)\s*', '', t, flags=re.I)
+    if re.match(r'^(se\s|ett inlägg i\s*”?se)', t, flags=re.I):
+        return ""
+    return re.sub(r'\s+[–-]\s+[^\-–—|:]{2,}$', '', t).strip()
+
+def legacy_swedishify(title):
+    t = title.strip()
+    for k,v in tk.SWEDISHIFY_REPL.items():
+        t = re.sub(k, v, t, flags=re.I)
+    return legacy_clean_topic_title(t)
+
+def legacy_is_probably_swedish(title):
+    if re.search(r"[åäöÅÄÖ]", title): return True
+    return bool(re.search(r"\b(är|och|eller|men|som|på|för|med|utan|en|ett|det|den|i|från)\b", title, flags=re.I))
+
+def legacy_is_clickbait(t):
+    low = t.lower()
+    return any(re.search(p, low, flags=re.I) for p in tk.CLICKBAIT_PATTERNS)
+
+def legacy_score(title, cat_slug, origin):
+    score = 0; reasons = {}
+    if legacy_is_probably_swedish(title): score += 3; reasons["åäö/sv-ord"] = +3
+    dom = ""
+    if origin:
+        try: dom = urlparse(origin).netloc.lower()
+        except Exception: dom = ""
+    if dom:
+        if dom.endswith(".se") or dom in tk.SV_DOMAINS: score += 3; reasons[".se/domän"] = +3
+        elif not dom.endswith(".com"): score -= 1; reasons["utländsk domän"] = -1
+    if any(w in title.lower() for w in tk.SE_WORDS): score += 2; reasons["Sverige-ord"] = +2
+    if cat_slug == "sport" and any(w in title.lower() for w in tk.SPORT_WORDS): score += 2; reasons["sport-ord"] = +2
+    if cat_slug in ("prylradar","teknik-prylar","gaming-esport") and re.search(r"\b(lanser|släpper|uppdatering|recension|test|release|utrullning)\b", title, flags=re.I):
+        score += 2; reasons["pryl-signal"] = +2
+    if re.search(r"\b(India|Indien|China|Kina|USA|US|UK)\b", title) and not any(w in title.lower() for w in ("sverige","svensk","stockholm","göteborg","malmö")):
+        score -= 2; reasons["utlandsfokus"] = -2
+    L = len(title)
+    if L < 28: score -= 1; reasons["för kort"] = -1
+    elif L > 120: score -= 1; reasons["för lång"] = -1
+    else: score += 1; reasons["lagom längd"] = +1
+    return score, reasons
+
+# --- Korpus ---
+WORDS = ("Sverige svenska Stockholm Göteborg Malmö Umeå AIK Hammarby derby SHL Allsvenskan slutspel Stormen Amy "
+         "och är för med på från iPhone Samsung update review launch rollout stable leaked teases coming to "
+         "lansering släpper uppdatering recension test release USA Kina UK India börsen räntan Riksbanken "
+         "chock skandal galna Trumps kvinna så här polisen gripen “citat” – — ’ tåg SJ").split()
+PREFIXES = ["", "", "", "JUST NU: ", "LIVE: ", "DN Direkt - ", "Aftonbladet: ", "Se ", "ett inlägg i ”Se"]
+SUFFIXES = ["", "", " - Aftonbladet", " – SVT Nyheter", " | Omni", " - The Verge"]
+ORIGINS = ["", "", "https://www.svt.se/a", "https://www.theverge.com/x", "https://www.heise.de/y", "https://feber.se/z"]
+CATS = ["nyheter", "sport", "prylradar", "teknik-prylar", "gaming-esport", "viralt-trend"]
+
+def corpus(n, seed=7):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        body = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 22)))
+        out.append((rnd.choice(PREFIXES) + body + rnd.choice(SUFFIXES), rnd.choice(ORIGINS), rnd.choice(CATS)))
+    return out
+
+def run(items, clean, click, swe, norm, score_pool):
+    out = []
+    by_cat = {}
+    for title, origin, cat in items:
+        c = clean(title)
+        if not c or click(c): continue
+        if cat in ("prylradar", "teknik-prylar"): c = swe(c)
+        by_cat.setdefault(cat, []).append((c, origin, norm(c)))
+    for cat, rows in by_cat.items():
+        for (c, o, k), (sc, why) in zip(rows, score_pool([r[0] for r in rows], cat, [r[1] for r in rows])):
+            out.append((cat, c, k, sc, tuple(why.items())))
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=100_000)
+    ap.add_argument("--reps", type=int, default=5, help="omväxlande körningar per sida (medianen rapporteras)")
+    args = ap.parse_args()
+    items = corpus(args.n)
+
+    times_before, times_after = [], []
+    for _ in range(max(1, args.reps)):
+        t0 = time.perf_counter()
+        before = run(items, legacy_clean_topic_title, legacy_is_clickbait, legacy_swedishify, legacy_normalize_title_key,
+                     lambda ts, cat, os_: [legacy_score(t, cat, o) for t, o in zip(ts, os_)])
+        times_before.append(time.perf_counter() - t0)
+
+        tk.normalize_title_key.cache_clear()
+        t0 = time.perf_counter()
+        after = run(items, tk.clean_topic_title, tk.is_clickbait_title, tk.swedishify_title_if_needed, tk.normalize_title_key,
+                    tk.SCORER.score_many)
+        times_after.append(time.perf_counter() - t0)
+    t_before, t_after = statistics.median(times_before), statistics.median(times_after)
+
+    print(f"titlar: {args.n}  kvar efter filter: {len(after)}  (median av {len(times_before)} körningar)")
+    print(f"före : {t_before:6.2f} s  ({t_before / args.n * 1e6:5.1f} µs/titel)")
+    print(f"efter: {t_after:6.2f} s  ({t_after / args.n * 1e6:5.1f} µs/titel)  → {t_before / t_after:.1f}x")
+    print("identiska titlar/nycklar/poäng/skäl:", "JA" if before == after else "NEJ")
+    if before != after:
+        diff = next(i for i, (a, b) in enumerate(zip(before, after)) if a != b)
+        print("första skillnad:", before[diff], "≠", after[diff])
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
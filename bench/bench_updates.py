@@ -0,0 +1,104 @@
+# bench/bench_updates.py – händelseuppdateringar: hela posten fram och tillbaka (före) mot lokalt register +
+# ändringskontroll (REST, inte atomisk) och trendkollen/v1/append, mot replay-serverns WP-stubbe
+#   python bench/bench_updates.py [-n 60] [--writers 2 --per-writer 15]
+# Del 1: byte per uppdatering när posten växer. Del 2: överlappande körningar (egna processer med egna
+# cachar) som uppdaterar samma post samtidigt – hur många uppdateringar finns kvar i posten efteråt.
+import argparse, json, os, subprocess, sys, tempfile, time
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+from replay_server import ReplayServer
+
+MODES = ("före", "rest", "append")
+POST_ID = 4711
+
+def setup_env(cache_dir: str):
+    os.environ.update(CACHE_DIR=cache_dir, WP_BASE_URL="https://trendkoll.bench", WP_USER="bench", WP_APP_PASS="bench")
+
+def legacy_append_update(tk, post_id: int, extra_html: str):
+    """wp_append_update före ändringen (ordagrant): hämta renderat innehåll, skicka tillbaka allt."""
+    url = f"{tk.WP_BASE_URL}/wp-json/wp/v2/trend/{post_id}"
+    try:
+        cur = tk.HTTP.get(url, auth=(tk.WP_USER, tk.WP_APP_PASS), timeout=20).json()
+        old_content = cur.get("content",{}).get("rendered","")
+    except Exception:
+        old_content = ""
+    new_content = old_content + "\n<hr />\n<h3>Uppdatering</h3>\n" + extra_html
+    resp = tk.HTTP.post(url, json={"content": new_content}, auth=(tk.WP_USER, tk.WP_APP_PASS), timeout=30)
+    resp.raise_for_status()
+    return resp.json()
+
+def appender(tk, mode: str):
+    tk.WP_APPEND_ENDPOINT = mode == "append"
+    if mode == "före":
+        return lambda post_id, html: legacy_append_update(tk, post_id, html)
+    return tk.wp_append_update
+
+def update_html(tag: str, i: int) -> str:
+    return (f"<p>[{tag}-{i}] Stormen Amy: SMHI förlänger varningen för Götaland, flera tåglinjer inställda och "
+            f"tusentals hushåll utan ström. Källor: SVT Nyheter, Aftonbladet, SMHI.</p>")
+
+def child(mode: str, base_url: str, n: int, tag: str):
+    setup_env(tempfile.mkdtemp(prefix="tk-upd-"))
+    import trendkollen_worker as tk
+    base = base_url.rstrip("/")
+    tk.HTTP.url_rewrite = lambda url: (lambda u: f"{base}/{u.netloc}{u.path}" + (f"?{u.query}" if u.query else ""))(urlparse(url))
+    append = appender(tk, mode)
+    errors = 0
+    for i in range(n):
+        try: append(POST_ID, update_html(tag, i))
+        except Exception: errors += 1
+    print(json.dumps({"errors": errors}))
+
+def growth(n: int):
+    print(f"Del 1: {n} uppdateringar av samma post (byte per uppdatering, båda riktningarna)")
+    print(f"{'läge':8} {'#1':>10} {'#10':>10} {f'#{n}':>10} {'summa KiB':>10} {'ms/st':>7} {'block':>6}")
+    setup_env(tempfile.mkdtemp(prefix="tk-upd-"))
+    import trendkollen_worker as tk
+    for mode in MODES:
+        server = ReplayServer(latency_ms=5, jitter_ms=0).start()
+        tk.HTTP.url_rewrite = server.rewrite
+        tk.UPDATE_LOG.clear()
+        append = appender(tk, mode)
+        sizes, t0 = [], time.perf_counter()
+        for i in range(n):
+            before = server.snapshot()
+            append(POST_ID, update_html("a", i))
+            after = server.snapshot()
+            sizes.append(after["bytes_in"] + after["bytes_out"] - before["bytes_in"] - before["bytes_out"])
+        ms = (time.perf_counter() - t0) * 1000 / n
+        blocks = sum(update_html("a", i) in server.post_content(POST_ID) for i in range(n))
+        server.stop()
+        pick = lambda k: sizes[min(k, n) - 1]
+        print(f"{mode:8} {pick(1):>10} {pick(10):>10} {pick(n):>10} {sum(sizes) / 1024:>10.0f} {ms:>7.1f} {blocks:>6}")
+
+def overlap(writers: int, per_writer: int):
+    print(f"\nDel 2: {writers} överlappande körningar × {per_writer} uppdateringar av samma post")
+    for mode in MODES:
+        server = ReplayServer(latency_ms=20, jitter_ms=20).start()
+        procs = [subprocess.Popen([sys.executable, __file__, "--child", mode, server.base_url, str(per_writer), f"w{w}"],
+                                  stdout=subprocess.PIPE, text=True) for w in range(writers)]
+        errors = sum(json.loads(p.communicate()[0].strip().splitlines()[-1])["errors"] for p in procs)
+        content = server.post_content(POST_ID)
+        kept = sum(update_html(f"w{w}", i) in content for w in range(writers) for i in range(per_writer))
+        server.stop()
+        print(f"{mode:8} kvar {kept:>3}/{writers * per_writer}  fel={errors}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=60, help="uppdateringar i del 1")
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--per-writer", type=int, default=15)
+    ap.add_argument("--child", nargs=4, metavar=("LÄGE", "URL", "N", "TAGG"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        mode, url, n, tag = args.child
+        return child(mode, url, int(n), tag)
+    growth(args.n)
+    if args.writers > 1:
+        overlap(args.writers, args.per_writer)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# bench/replay_server.py – lokal ersättare för alla externa tjänster workern pratar med
+#
+# Spelar upp svar ur bench/fixtures/ (samma form som de riktiga tjänsternas svar):
+#   news.google.com/rss/search      → gnews_search.xml (20 av posterna, roterat per sökfråga)
+#   news.google.com/rss/articles/…  → liten HTML-sida med originallänk (för upplösnings-fallbacken)
+#                                     opaque_articles=True: sökfeedens artikellänkar går inte att avkoda lokalt
+#                                     och saknar länk i beskrivningen, och artikelsidan omdirigerar (302) till
+#                                     publicisten (www.svt.se → liten HTML-sida) – upplösningen måste gå via HTTP
+#   pryl-feeds (PRYL_FEEDS_*)       → pryl_feed.xml, theverge.com → atom_feed.xml
+#   wikimedia.org pageviews         → wikimedia_top.json
+#   reddit.com/r/sweden/top/.json   → reddit_top.json
+#   googleapis.com/youtube/v3       → youtube_videos.json
+#   api.openai.com chat/completions → openai_chat.json (egen latens)
+#   WP REST + ingest                → wp_*.json (löpande id:n); ingest med featured_media/meta bekräftas som av
+#                                     ett plugin med mediastöd (ingest_media=False = äldre plugin);
+#                                     DELETE media/{id} svarar deleted
+#   WP trend/{id}, trendkollen/v1/append → posternas innehåll hålls i minnet (context=edit, _fields,
+#                                     modified_gmt ändras vid varje skrivning; append_endpoint=False = 404)
+# faults {"värd[/sökvägsprefix]": "503" | "429:S" | "drop" | "hang:S"} låter en värd/endpoint svara med fel
+# (429:S = med Retry-After: S), stänga anslutningen direkt eller hänga i S sekunder utan svar (som en timeout);
+# "fel@N" gäller bara de N första träffarna. model_faults {"gpt-5": fel} gör detsamma per OpenAI-modell.
+# fault_hits räknar träffarna, openai_log varje chat-anrop (modell, status, mottaget/besvarat) och
+# ingested titel + innehåll för varje ingest i den ordning de publicerades.
+# Datum i feeds flyttas så att nyaste posten alltid är några minuter gammal, och feeds har ETag så
+# att villkorliga GET (304) fungerar som mot de riktiga källorna.
+#
+# Används via HttpClient.url_rewrite: https://värd/sökväg → http://127.0.0.1:port/värd/sökväg
+import hashlib, json, os, random, re, threading, time
+from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FEED_WINDOW = 20
+
+_RFC822_RE = re.compile(r"<pubDate>([^<]+)</pubDate>")
+_ISO_RE = re.compile(r"<(published|updated)>([^<]+)</\1>")
+_ITEM_RE = re.compile(r"<item>.*?</item>", re.S)
+_ARTICLE_TOKEN_RE = re.compile(r"(news\.google\.com/rss/articles/)([A-Za-z0-9_-]+)")
+_DESC_LINK_RE = re.compile(r"&lt;a href=.*?&gt;|&lt;/a&gt;")
+
+def _load(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def _shift_dates(body: str, now: datetime) -> str:
+    """Flytta alla datum lika mycket så att det nyaste hamnar 5 min före now."""
+    rfc = [parsedate_to_datetime(m) for m in _RFC822_RE.findall(body)]
+    iso = [datetime.fromisoformat(v) for _, v in _ISO_RE.findall(body)]
+    if not rfc and not iso: return body
+    delta = (now - timedelta(minutes=5)) - max(rfc + iso)
+    body = _RFC822_RE.sub(lambda m: f"<pubDate>{format_datetime(parsedate_to_datetime(m.group(1)) + delta, usegmt=True)}</pubDate>", body)
+    return _ISO_RE.sub(lambda m: f"<{m.group(1)}>{(datetime.fromisoformat(m.group(2)) + delta).isoformat()}</{m.group(1)}>", body)
+
+def _window(body: str, key: str, n: int = FEED_WINDOW) -> str:
+    """Välj n poster ur feeden med startpunkt efter sökfrågan – olika frågor ger delvis olika träffar."""
+    items = _ITEM_RE.findall(body)
+    if len(items) <= n: return body
+    start = int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16) % len(items)
+    picked = (items + items)[start:start + n]
+    head, tail = body[:body.index(items[0])], body[body.rindex(items[-1]) + len(items[-1]):]
+    return head + "\n".join(picked) + tail
+
+class ReplayServer:
+    """Trådad HTTP-server på 127.0.0.1 med konfigurerbar latens (+ jitter) och räknare per värd."""
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 25, openai_ms: float = 800, seed: int = 1,
+                 ingest_media: bool = True, append_endpoint: bool = True, opaque_articles: bool = False):
+        self.latency_ms, self.jitter_ms, self.openai_ms = latency_ms, jitter_ms, openai_ms
+        self.ingest_media, self.append_endpoint, self.opaque_articles = ingest_media, append_endpoint, opaque_articles
+        self._posts = {}   # post_id -> {"raw": ..., "modified": int}
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = 1000
+        self._fixtures = {name: _load(name) for name in os.listdir(FIXTURES) if os.path.isfile(os.path.join(FIXTURES, name))}
+        self._httpd = None
+        self.faults = {}; self.model_faults = {}
+        self.reset_counts()
+
+    # --- livscykel ---
+    def start(self):
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive som mot riktiga värdar
+            def log_message(self, *a): pass
+            def do_GET(self):  server._handle(self, "GET")
+            def do_HEAD(self): server._handle(self, "HEAD")
+            def do_POST(self): server._handle(self, "POST")
+            def do_DELETE(self): server._handle(self, "DELETE")
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="replay-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown(); self._httpd.server_close(); self._httpd = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def rewrite(self, url: str) -> str:
+        u = urlparse(url)
+        return f"{self.base_url}/{u.netloc}{u.path}" + (f"?{u.query}" if u.query else "")
+
+    # --- statistik ---
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}; self.wp_calls = {}; self.not_modified = 0; self.bytes_out = 0; self.bytes_in = 0
+            self.fault_hits = {}; self.openai_log = []; self.ingested = []
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests": dict(sorted(self.counts.items())), "total": sum(self.counts.values()),
+                    "wp": dict(sorted(self.wp_calls.items())), "faults": dict(self.fault_hits),
+                    "not_modified": self.not_modified, "bytes_out": self.bytes_out, "bytes_in": self.bytes_in}
+
+    def post_content(self, post_id: int) -> str:
+        with self._lock:
+            return self._post(post_id)["raw"]
+
+    # --- routing ---
+    def _next_id(self) -> int:
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def _feed(self, name: str, key: str, windowed: bool = False):
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        now -= timedelta(minutes=now.minute % 10)   # stabil ETag inom tio minuter
+        body = self._fixtures[name]
+        if windowed: body = _window(body, key)
+        if self.opaque_articles and name == "gnews_search.xml":
+            # Nyare token-format ("AU_yqL…") som bara Google kan avkoda, och beskrivningar utan originallänk
+            body = _ARTICLE_TOKEN_RE.sub(lambda m: m.group(1) + "AU_yqL" + hashlib.md5(m.group(2).encode()).hexdigest(), body)
+            body = _DESC_LINK_RE.sub("", body)
+        body = _shift_dates(body, now)
+        return 200, "application/rss+xml; charset=utf-8", body, {"ETag": '"%s"' % hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]}
+
+    def _post(self, post_id: int) -> dict:
+        """Postens tillstånd (anropas med _lock); nya poster får fixturens innehåll."""
+        st = self._posts.get(post_id)
+        if st is None:
+            fx = json.loads(self._fixtures["wp_trend_post.json"])
+            st = self._posts[post_id] = {"raw": fx["content"]["rendered"], "modified": 0}
+        return st
+
+    def _trend(self, method: str, post_id: int, q: dict, body: bytes):
+        req = json.loads(body or b"{}") if method == "POST" else {}
+        with self._lock:
+            st = self._post(post_id)
+            if "content" in req:
+                st["raw"] = req["content"]; st["modified"] += 1
+            data = json.loads(self._fixtures["wp_trend_post.json"])
+            modified = datetime(2026, 10, 17, 7, 30, tzinfo=timezone.utc) + timedelta(seconds=st["modified"])
+            data.update(id=post_id, modified_gmt=modified.strftime("%Y-%m-%dT%H:%M:%S"))
+            data["content"] = {"rendered": st["raw"], "protected": False}
+            if (q.get("context") or [""])[0] == "edit": data["content"]["raw"] = st["raw"]
+        fields = (q.get("_fields") or [""])[0]
+        if fields:
+            data = {k: v for k, v in data.items() if k in fields.split(",")}
+        return 200, "application/json; charset=utf-8", json.dumps(data, ensure_ascii=False), {}
+
+    def _append(self, body: bytes):
+        if not self.append_endpoint:
+            return 404, "application/json; charset=utf-8", '{"code":"rest_no_route"}', {}
+        req = json.loads(body or b"{}")
+        with self._lock:
+            st = self._post(int(req["post_id"]))
+            appended = f"tk-update:{req['block_id']}" not in st["raw"]
+            if appended:
+                st["raw"] += req["html"]; st["modified"] += 1
+        return 200, "application/json; charset=utf-8", json.dumps({"ok": True, "appended": appended}), {}
+
+    def _json(self, name: str, **override):
+        data = json.loads(self._fixtures[name])
+        if override and isinstance(data, dict): data.update(override)
+        return 200, "application/json; charset=utf-8", json.dumps(data, ensure_ascii=False), {}
+
+    def _route(self, method: str, host: str, path: str, query: str, body: bytes = b""):
+        q = parse_qs(query)
+        if host == "news.google.com":
+            if path.startswith("/rss/search"):
+                return self._feed("gnews_search.xml", (q.get("q") or [""])[0], windowed=True)
+            if path.startswith("/rss/articles/"):
+                n = int(hashlib.md5(path.encode("utf-8")).hexdigest()[:6], 16)
+                if self.opaque_articles:
+                    return 302, "text/plain; charset=utf-8", "", {"Location": f"https://www.svt.se/nyheter/{n}"}
+                return 200, "text/html; charset=utf-8", f"<html><body><a href='https://www.svt.se/nyheter/{n}'>Läs</a></body></html>", {}
+        if host == "www.svt.se" and path.startswith("/nyheter/"):
+            return 200, "text/html; charset=utf-8", "<html><head><title>SVT Nyheter</title></head><body></body></html>", {}
+        if host.endswith("theverge.com"):
+            return self._feed("atom_feed.xml", path)
+        if host == "wikimedia.org" and "/pageviews/top/" in path:
+            return self._json("wikimedia_top.json")
+        if host.endswith("reddit.com") and path.endswith("/.json"):
+            return self._json("reddit_top.json")
+        if host == "www.googleapis.com" and path.startswith("/youtube/v3/videos"):
+            return self._json("youtube_videos.json")
+        if host == "api.openai.com" and method == "POST" and path == "/v1/chat/completions":
+            return self._json("openai_chat.json")
+        if path.startswith("/wp-json/"):
+            if path == "/wp-json/trendkollen/v1/append" and method == "POST":
+                return self._append(body)
+            if path == "/wp-json/trendkollen/v1/ingest" and method == "POST":
+                req = json.loads(body or b"{}")
+                with self._lock: self.ingested.append({"title": req.get("title", ""), "content": req.get("content", "")})
+                applied = {k: req[k] for k in ("featured_media", "meta") if k in req} if self.ingest_media else {}
+                return self._json("wp_ingest.json", post_id=self._next_id(), **applied)
+            if path == "/wp-json/wp/v2/media" and method == "POST":
+                mid = self._next_id()
+                return self._json("wp_media.json", id=mid, source_url=f"https://trendkoll.se/wp-content/uploads/bench/{mid}.png")
+            if re.fullmatch(r"/wp-json/wp/v2/media/\d+", path) and method == "DELETE":
+                return 200, "application/json; charset=utf-8", json.dumps({"deleted": True}), {}
+            if path == "/wp-json/wp/v2/trend":
+                status, ctype, body, headers = self._json("wp_trend_list.json")
+                return status, ctype, body, {"X-WP-Total": "0", "X-WP-TotalPages": "1"}
+            m = re.fullmatch(r"/wp-json/wp/v2/trend/(\d+)", path)
+            if m:
+                return self._trend(method, int(m.group(1)), q, body)
+        if any(s in host for s in ("feber.se", "sweclockers.com", "idg.se", "mobil.se", "surfa.se", "nyteknik.se",
+                                   "gsmarena.com", "engadget.com", "techradar.com")):
+            return self._feed("pryl_feed.xml", host + path)
+        return 404, "text/plain; charset=utf-8", "not found", {}
+
+    def _fault(self, host: str, path: str, model: str = None):
+        rules = [(f"{host}#{model}", spec) for m, spec in self.model_faults.items() if m == model] if model else []
+        rules += [(prefix, spec) for prefix, spec in self.faults.items() if (host + path).startswith(prefix)]
+        for key, spec in rules:
+            spec, _, limit = spec.partition("@")
+            with self._lock:
+                hits = self.fault_hits[key] = self.fault_hits.get(key, 0) + 1
+            if not limit or hits <= int(limit):
+                return spec
+        return None
+
+    def _handle(self, h: BaseHTTPRequestHandler, method: str):
+        length = int(h.headers.get("Content-Length") or 0)
+        body_in = h.rfile.read(length) if length else b""
+        _, host, rest = h.path.split("/", 2) if h.path.count("/") >= 2 else ("", "", "")
+        u = urlparse("/" + rest)
+        received = time.monotonic()
+        model = json.loads(body_in or b"{}").get("model") if host == "api.openai.com" and method == "POST" else None
+        fault = self._fault(host, u.path, model)
+        if fault and fault.startswith(("drop", "hang:")):
+            if fault.startswith("hang:"): time.sleep(float(fault[5:]))
+            h.close_connection = True
+            return
+        if fault:
+            code, _, retry_after = fault.partition(":")
+            status, ctype, body, headers = int(code), "text/plain; charset=utf-8", "fault", {}
+            if retry_after: headers["Retry-After"] = retry_after
+        else:
+            status, ctype, body, headers = self._route(method, host, u.path, u.query, body_in)
+
+        delay = self.openai_ms if host == "api.openai.com" else self.latency_ms
+        with self._lock:
+            delay += self._rnd.uniform(0, self.jitter_ms)
+            self.counts[host] = self.counts.get(host, 0) + 1
+            if u.path.startswith("/wp-json/"):
+                key = f"{method} {re.sub(r'/[0-9]+', '/{id}', u.path[len('/wp-json'):])}"
+                self.wp_calls[key] = self.wp_calls.get(key, 0) + 1
+        time.sleep(delay / 1000.0)
+
+        etag = headers.get("ETag")
+        if etag and h.headers.get("If-None-Match") == etag:
+            with self._lock: self.not_modified += 1
+            status, body = 304, ""
+        data = body.encode("utf-8")
+        with self._lock:
+            self.bytes_out += len(data); self.bytes_in += len(body_in)
+            if model is not None:
+                self.openai_log.append({"model": model, "status": status, "received": received, "answered": time.monotonic()})
+        h.send_response(status)
+        h.send_header("Content-Type", ctype)
+        h.send_header("Content-Length", str(0 if method == "HEAD" else len(data)))
+        for k, v in headers.items(): h.send_header(k, v)
+        h.end_headers()
+        if method != "HEAD" and status != 304: h.wfile.write(data)
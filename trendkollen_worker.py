@@ -1,13 +1,26 @@
 # trendkollen_worker.py
-import os, time, random, requests, re, unicodedata, hashlib
+import os, sys, io, time, random, requests, re, unicodedata, hashlib, threading, queue, pickle, atexit, signal, base64, bisect, json
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
-from urllib.parse import quote, urlparse, parse_qs, unquote
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlparse, urljoin, parse_qs, unquote
+from xml.etree import ElementTree as ET
 from html import escape, unescape
+from html.parser import HTMLParser
 import feedparser
+try:
+    from feedparser.datetimes import _parse_date as _feed_parse_date   # samma datumtolkning som feedparser
+except ImportError:
+    _feed_parse_date = None
 from dotenv import load_dotenv
-from requests.exceptions import ReadTimeout, HTTPError, RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ReadTimeout, HTTPError, RequestException, ConnectionError as ReqConnectionError, Timeout, TooManyRedirects
 from PIL import Image, ImageDraw, ImageFont  # Pillow för bildgenerering
-from bs4 import BeautifulSoup  # för att plocka original-länkar ur Google News RSS
 
 load_dotenv()
 
@@ -16,13 +29,90 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 WP_BASE_URL    = os.getenv("WP_BASE_URL")
 WP_USER        = os.getenv("WP_USER")
 WP_APP_PASS    = os.getenv("WP_APP_PASS")
+# Ingest-pluginet tar emot featured_media + meta.tk_social_image direkt (bilderna laddas upp före posten)
+WP_INGEST_MEDIA = os.getenv("WP_INGEST_MEDIA", "").strip().lower() in ("1", "true", "yes")
+# Pluginet har trendkollen/v1/append (händelseuppdatering som ett block, atomiskt på serversidan)
+WP_APPEND_ENDPOINT = os.getenv("WP_APPEND_ENDPOINT", "").strip().lower() in ("1", "true", "yes")
 MAX_TRENDS     = int(os.getenv("MAX_TRENDS", "8"))
+# Paus efter varje publicering skalas med denna faktor (0 = ingen paus, t.ex. i benchmarks)
+POST_PAUSE_SCALE = float(os.getenv("POST_PAUSE_SCALE", "1"))
+# OpenAI: antal samtidiga anrop + takt (anrop/minut, token bucket; varje 429 pausar hinken i Retry-After)
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "3"))
+OPENAI_RPM         = float(os.getenv("OPENAI_RPM", "60"))
+# Timeouter per anrop (anslutning, svar) och total tidsgräns för en sammanfattning över båda modellerna
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5"))
+OPENAI_READ_TIMEOUT_S    = float(os.getenv("OPENAI_READ_TIMEOUT_S", "45"))
+OPENAI_DEADLINE_S        = float(os.getenv("OPENAI_DEADLINE_S", "90"))
 
 YT_API_KEY     = os.getenv("YT_API_KEY", "").strip()
 YT_REGION      = os.getenv("YT_REGION", "SE").strip() or "SE"
 
+# Parallell hämtning av källor: totalt antal trådar + tak per värd (news.google.com strypt hårdast)
+FETCH_WORKERS         = int(os.getenv("FETCH_WORKERS", "8"))
+HOST_MAX_CONCURRENCY  = int(os.getenv("HOST_MAX_CONCURRENCY", "4"))
+GNEWS_MAX_CONCURRENCY = int(os.getenv("GNEWS_MAX_CONCURRENCY", "3"))
+# Frågeplanering: antal sökfrågor som slås ihop med OR i en och samma Google News-sökning
+GNEWS_PLAN_MAX_TERMS  = int(os.getenv("GNEWS_PLAN_MAX_TERMS", "4"))
+# Strömmande pipeline: max antal objekt som väntar mellan två steg (källa → förbered → rendera → publicera)
+PIPELINE_QUEUE_SIZE   = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+# HTTP: gemensam retry/backoff-policy + poolstorlek per värd ("news.google.com=6,api.openai.com=4")
+HTTP_RETRIES      = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF      = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_BACKOFF_MAX  = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+# Retry-After (429/503) följs upp till denna gräns – egen gräns, servern vet bättre än vår backoff hur länge den behöver
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "60"))
+HTTP_POOL_SIZES   = os.getenv("HTTP_POOL_SIZES", "")
+# ReadTimeout omförsöks inte som standard: en värd som hänger kostar då en timeout, inte (1 + HTTP_RETRIES) st
+HTTP_RETRY_READ_TIMEOUT = os.getenv("HTTP_RETRY_READ_TIMEOUT", "").strip().lower() in ("1", "true", "yes")
+# Brytare per värd/endpoint: öppnas efter N misslyckade anrop i rad (nätverksfel/timeout/5xx efter omförsök), släpper fram
+# ett provanrop efter cooldown (fördubblas vid varje misslyckat prov upp till max). 0 = av. Läget sparas i CACHE_DIR.
+BREAKER_FAILURES       = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_S     = float(os.getenv("BREAKER_COOLDOWN_S", "300"))
+BREAKER_COOLDOWN_MAX_S = float(os.getenv("BREAKER_COOLDOWN_MAX_S", "3600"))
+
+# Persistenta cachar (pickle-filer i CACHE_DIR)
+CACHE_DIR          = os.getenv("CACHE_DIR", ".cache")
+FEED_CACHE_TTL_H   = float(os.getenv("FEED_CACHE_TTL_H", "72"))
+FEED_CACHE_MAX     = int(os.getenv("FEED_CACHE_MAX", "400"))
+GNEWS_URL_TTL_H    = float(os.getenv("GNEWS_URL_TTL_H", "336"))
+GNEWS_URL_FAIL_TTL_M = float(os.getenv("GNEWS_URL_FAIL_TTL_M", "30"))
+GNEWS_URL_CACHE_MAX  = int(os.getenv("GNEWS_URL_CACHE_MAX", "5000"))
+SUMMARY_CACHE_TTL_H  = float(os.getenv("SUMMARY_CACHE_TTL_H", "48"))
+SUMMARY_CACHE_MAX    = int(os.getenv("SUMMARY_CACHE_MAX", "2000"))
+UPDATE_LOG_TTL_H     = float(os.getenv("UPDATE_LOG_TTL_H", "48"))
+UPDATE_LOG_MAX       = int(os.getenv("UPDATE_LOG_MAX", "200"))
+# Högvattenmärken per feed/sökning: bara poster nyare än det som redan behandlats går vidare till poängsättning.
+# FORCE_FULL_RESCAN=1 (eller --full-rescan) läser hela åldersfönstret igen (märkena flyttas ändå fram).
+FEED_MARKS_TTL_D     = float(os.getenv("FEED_MARKS_TTL_D", "30"))
+FEED_MARKS_MAX       = int(os.getenv("FEED_MARKS_MAX", "2000"))
+FEED_MARKS_SEEN_MAX  = int(os.getenv("FEED_MARKS_SEEN_MAX", "500"))   # id:n per sökfeed
+FORCE_FULL_RESCAN    = os.getenv("FORCE_FULL_RESCAN", "").strip().lower() in ("1", "true", "yes") or "--full-rescan" in sys.argv[1:]
+
+# Daemon-läge (--daemon / DAEMON=1): pollintervall per källtyp i sekunder, ± jitter-andel, minsta vila mellan cykler
+DAEMON           = os.getenv("DAEMON", "").strip().lower() in ("1", "true", "yes")
+POLL_WIKI_S      = float(os.getenv("POLL_WIKI_S", "86400"))
+POLL_REDDIT_S    = float(os.getenv("POLL_REDDIT_S", "3600"))
+POLL_YOUTUBE_S   = float(os.getenv("POLL_YOUTUBE_S", "3600"))
+POLL_GNEWS_S     = float(os.getenv("POLL_GNEWS_S", "300"))
+POLL_FEEDS_S     = float(os.getenv("POLL_FEEDS_S", "900"))
+POLL_JITTER      = float(os.getenv("POLL_JITTER", "0.1"))
+DAEMON_MIN_SLEEP_S = float(os.getenv("DAEMON_MIN_SLEEP_S", "30"))
+
+# Körningsrapport: JSON per körning (tom sökväg = av) + valfri Prometheus-textfil (node_exporter textfile)
+RUN_REPORT_PATH    = os.getenv("RUN_REPORT_PATH", os.path.join(CACHE_DIR, "run_report.json"))
+PROM_TEXTFILE_PATH = os.getenv("PROM_TEXTFILE_PATH", "")
+
+# Nära-dubbletter: Jaccard-likhet (tecken-4-gram) över vilken två titlar räknas som samma nyhet
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))
+
 FONT_REG_PATH  = os.getenv("FONT_REG_PATH", "assets/fonts/Inter-Regular.ttf")
 FONT_BOLD_PATH = os.getenv("FONT_BOLD_PATH","assets/fonts/Inter-Bold.ttf")
+# Bildformat för uppladdning: png | png-opt (optimerad PNG) | webp
+OG_IMAGE_FORMAT = os.getenv("OG_IMAGE_FORMAT", "png").strip().lower()
+OG_WEBP_QUALITY = int(os.getenv("OG_WEBP_QUALITY", "88"))
+# Processer för bildrenderingen (Pillow håller GIL:en); 0 = rendera i trådar i huvudprocessen
+RENDER_WORKERS  = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
 
 UA_HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"}
 
@@ -85,6 +175,7 @@ SPORT_QUERIES = [
     "Allsvenskan", "SHL", "Damallsvenskan", "Tre Kronor",
     "Sveriges landslag fotboll", "Premier League Sverige", "Champions League Sverige"
 ]
+PRYL_SITES = ["site:surfa.se", "site:m3.idg.se", "site:mobil.se", "site:sweclockers.com", "site:feber.se", "site:nyteknik.se"]
 PRYL_QUERIES = [
     "lansering smartphone", "\"ny mobil\"", "iPhone lansering",
     "Samsung släpper", "smartwatch lansering", "AI-kamera lansering",
@@ -126,50 +217,1077 @@ def is_recent(dt, max_age_hours=48):
     if not dt: return False
     return (_to_aware_utc(datetime.now(timezone.utc)) - _to_aware_utc(dt)) <= timedelta(hours=max_age_hours)
 
+_QUOTES_DASHES = str.maketrans({"’":"'", "‘":"'", "“":'"', "”":'"', "–":"-", "—":"-"})
+_NON_ALNUM_SPACE = re.compile(r"[^\w\s]|_")  # \w = isalnum() + "_", \s = isspace()
+_WS_RUN = re.compile(r"\s+")
+
+@lru_cache(maxsize=65536)
 def normalize_title_key(s: str) -> str:
-    s = s.strip().lower()
-    for a,b in {"’":"'", "‘":"'", "“":'"', "”":'"', "–":"-", "—":"-"}.items():
-        s = s.replace(a,b)
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if ch.isalnum() or ch.isspace())
-    return re.sub(r"\s+"," ",s).strip()
+    s = unicodedata.normalize("NFKD", s.strip().lower().translate(_QUOTES_DASHES))
+    return _WS_RUN.sub(" ", _NON_ALNUM_SPACE.sub("", s)).strip()
+
+# === Mätning: spann per steg, latens per värd, körningsrapport ===
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # sekunder, Prometheus-stil
+
+def _percentile(values, p):
+    if not values: return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, int(p / 100.0 * len(s) + 0.5) - 1))]
+
+class RunMetrics:
+    """Tidtagning för en körning: spann per steg (källor, URL-upplösning, OpenAI, bilder, WP) och latens per
+    värd för varje utgående anrop. report() ger körningsrapporten, write() sparar den som JSON (+ Prometheus)."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now(timezone.utc); self._t0 = time.perf_counter()
+            self.spans = {}   # namn -> [sekunder]
+            self.hosts = {}   # värd -> {"count", "errors", "retries", "sum", "buckets", "status"}
+            self.marks = {}   # händelse -> sekunder från start (första gången)
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def observe(self, name: str, seconds: float):
+        """Ett spann som mätts någon annanstans (t.ex. i en renderingsprocess)."""
+        with self._lock: self.spans.setdefault(name, []).append(seconds)
+
+    def timed(self, name: str):
+        """Dekorator: hela anropet blir ett spann."""
+        def wrap(fn):
+            @wraps(fn)
+            def inner(*args, **kw):
+                with self.span(name):
+                    return fn(*args, **kw)
+            return inner
+        return wrap
+
+    def _host(self, host: str) -> dict:
+        h = self.hosts.get(host)
+        if h is None:
+            h = self.hosts[host] = {"count": 0, "errors": 0, "retries": 0, "sum": 0.0,
+                                    "buckets": [0] * (len(self.buckets) + 1), "status": {}}
+        return h
+
+    def observe_request(self, host: str, seconds: float, status: int = None):
+        """Ett försök mot värden; status None = nätverksfel/timeout."""
+        with self._lock:
+            h = self._host(host)
+            h["count"] += 1; h["sum"] += seconds
+            h["buckets"][bisect.bisect_left(self.buckets, seconds)] += 1
+            key = str(status) if status is not None else "fel"
+            h["status"][key] = h["status"].get(key, 0) + 1
+            if status is None: h["errors"] += 1
+
+    def retry(self, host: str):
+        with self._lock: self._host(host)["retries"] += 1
+
+    def mark(self, event: str):
+        with self._lock: self.marks.setdefault(event, round(time.perf_counter() - self._t0, 3))
+
+    def report(self, **extra) -> dict:
+        with self._lock:
+            spans = {k: list(v) for k, v in self.spans.items()}
+            hosts = {k: dict(v, buckets=list(v["buckets"]), status=dict(v["status"])) for k, v in self.hosts.items()}
+            marks = dict(self.marks); elapsed = time.perf_counter() - self._t0
+        caches = {}
+        for c in _CACHES:
+            st = c.stats(); looked = st["hits"] + st["misses"]
+            caches[c.name] = dict(st, hit_rate=round(st["hits"] / looked, 3) if looked else None)
+        decoded = GNEWS_DECODE_STATS["hit"] + GNEWS_DECODE_STATS["miss"]
+        caches["gnews_token"] = dict(GNEWS_DECODE_STATS, hit_rate=round(GNEWS_DECODE_STATS["hit"] / decoded, 3) if decoded else None)
+        extra.setdefault("gnews_queries", dict(GNEWS_QUERY_STATS))
+        extra.setdefault("feed_parse", dict(FEED_PARSE_STATS))
+        extra.setdefault("breakers", BREAKERS.report())
+        extra.setdefault("feed_marks", dict(FEED_MARKS.stats, full_rescan=FEED_MARKS.force))
+        for h in hosts.values():
+            h["sum"] = round(h["sum"], 3)
+            h["buckets"] = {str(le): n for le, n in zip(self.buckets + ("+Inf",), h["buckets"])}
+        return {
+            "started_at": self.started.isoformat(timespec="seconds"),
+            "duration_s": round(elapsed, 3),
+            "time_to_first_post_s": marks.get("first_post"),
+            "marks": marks,
+            "stages": {k: {"count": len(v), "sum_s": round(sum(v), 3), "p50_s": round(_percentile(v, 50), 4),
+                           "p95_s": round(_percentile(v, 95), 4), "max_s": round(max(v), 4)} for k, v in sorted(spans.items())},
+            "hosts": dict(sorted(hosts.items())),
+            "http": HTTP.stats(),
+            "caches": caches,
+            **extra,
+        }
+
+    def prometheus(self, rep: dict) -> str:
+        def esc(v): return str(v).replace("\\", "\\\\").replace('"', '\\"')
+        out = ["# TYPE trendkoll_run_duration_seconds gauge", f"trendkoll_run_duration_seconds {rep['duration_s']}"]
+        if rep.get("time_to_first_post_s") is not None:
+            out += ["# TYPE trendkoll_time_to_first_post_seconds gauge",
+                    f"trendkoll_time_to_first_post_seconds {rep['time_to_first_post_s']}"]
+        for key in ("posted", "collected"):
+            if key in rep: out += [f"# TYPE trendkoll_run_{key} gauge", f"trendkoll_run_{key} {rep[key]}"]
+        out.append("# TYPE trendkoll_stage_seconds summary")
+        for name, st in rep["stages"].items():
+            lbl = f'stage="{esc(name)}"'
+            out += [f'trendkoll_stage_seconds{{{lbl},quantile="0.5"}} {st["p50_s"]}',
+                    f'trendkoll_stage_seconds{{{lbl},quantile="0.95"}} {st["p95_s"]}',
+                    f"trendkoll_stage_seconds_sum{{{lbl}}} {st['sum_s']}", f"trendkoll_stage_seconds_count{{{lbl}}} {st['count']}"]
+        out.append("# TYPE trendkoll_http_request_seconds histogram")
+        for host, h in rep["hosts"].items():
+            lbl = f'host="{esc(host)}"'; cum = 0
+            for le, n in h["buckets"].items():
+                cum += n
+                out.append(f'trendkoll_http_request_seconds_bucket{{{lbl},le="{le}"}} {cum}')
+            out += [f"trendkoll_http_request_seconds_sum{{{lbl}}} {h['sum']}", f"trendkoll_http_request_seconds_count{{{lbl}}} {h['count']}"]
+        out.append("# TYPE trendkoll_http_retries gauge")
+        out += [f'trendkoll_http_retries{{host="{esc(host)}"}} {h["retries"]}' for host, h in rep["hosts"].items()]
+        out.append("# TYPE trendkoll_http_errors gauge")
+        out += [f'trendkoll_http_errors{{host="{esc(host)}"}} {h["errors"]}' for host, h in rep["hosts"].items()]
+        out += ["# TYPE trendkoll_cache_hits gauge", "# TYPE trendkoll_cache_misses gauge"]
+        for name, c in rep["caches"].items():
+            out += [f'trendkoll_cache_hits{{cache="{esc(name)}"}} {c.get("hits", c.get("hit", 0))}',
+                    f'trendkoll_cache_misses{{cache="{esc(name)}"}} {c.get("misses", c.get("miss", 0))}']
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def _write_atomic(path: str, text: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def write(self, **extra) -> dict:
+        rep = self.report(**extra)
+        try:
+            if RUN_REPORT_PATH:
+                self._write_atomic(RUN_REPORT_PATH, json.dumps(rep, ensure_ascii=False, indent=1))
+            if PROM_TEXTFILE_PATH:
+                self._write_atomic(PROM_TEXTFILE_PATH, self.prometheus(rep))
+        except Exception as e:
+            print("⚠️ Kunde inte skriva körningsrapport:", e)
+        return rep
+
+METRICS = RunMetrics()
+
+# === HTTP-klient: keep-alive-sessioner per värd, samtidighetstak och central retry-policy ===
+HOST_LIMITS = {"news.google.com": GNEWS_MAX_CONCURRENCY, "api.openai.com": OPENAI_CONCURRENCY}
+
+def _parse_host_sizes(raw: str) -> dict:
+    sizes = {}
+    for part in (raw or "").split(","):
+        host, _, n = part.partition("=")
+        if host.strip() and n.strip().isdigit():
+            sizes[host.strip().lower()] = int(n)
+    return sizes
+
+class RetryPolicy:
+    """Omförsök vid nätverksfel och 429/5xx, exponentiell backoff med jitter. Retry-After (sekunder eller
+    HTTP-datum) följs upp till retry_after_max, inte backoff_max. ReadTimeout omförsöks bara med
+    retry_read_timeouts=True; anslutningsfel (inkl. ConnectTimeout) alltid."""
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, backoff_max=HTTP_BACKOFF_MAX,
+                 retry_read_timeouts=HTTP_RETRY_READ_TIMEOUT, retry_after_max=HTTP_RETRY_AFTER_MAX):
+        self.retries = retries; self.backoff = backoff; self.backoff_max = backoff_max
+        self.retry_read_timeouts = retry_read_timeouts; self.retry_after_max = retry_after_max
+
+    def retryable(self, exc: Exception, method: str) -> bool:
+        # En POST som hann fram kan redan ha behandlats – skicka den aldrig igen efter ReadTimeout
+        if not isinstance(exc, ReadTimeout): return True
+        return self.retry_read_timeouts and method in HttpClient.IDEMPOTENT
+
+    def retry_after(self, resp) -> float | None:
+        ra = ((resp.headers.get("Retry-After") if resp is not None else None) or "").strip()
+        if not ra: return None
+        if ra.isdigit():
+            secs = float(ra)
+        else:
+            try:
+                secs = (parsedate_to_datetime(ra) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        return min(max(secs, 0.0), self.retry_after_max)
+
+    def delay(self, attempt: int, resp=None) -> float:
+        ra = self.retry_after(resp)
+        if ra is not None:
+            return ra
+        return min(self.backoff * (2 ** attempt), self.backoff_max) * random.uniform(0.75, 1.25)
+
+class TokenBucket:
+    """Takt-begränsare: rate anrop/s med burst; pause() stänger hinken (t.ex. efter 429 + Retry-After)."""
+    def __init__(self, rate_per_s: float, burst: int = 1):
+        self.rate = max(rate_per_s, 1e-6); self.capacity = max(1, burst)
+        self._tokens = float(self.capacity); self._stamp = time.monotonic(); self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate); self._stamp = now
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+class CircuitOpenError(RequestException):
+    """Anropet skickades inte: brytaren för värden/endpointen är öppen."""
+
+class HttpClient:
+    """En requests.Session per värd (poolade keep-alive-anslutningar) som alla modulens anrop går genom.
+    GET/HEAD omförsöks enligt policyn; POST bara med retry=True (ingest/media ska inte dubbelpostas).
+    url_rewrite (valfri funktion url → url) skickar anropen någon annanstans, t.ex. till bench-servern;
+    värdgränser och pooler räknas fortfarande på den ursprungliga värden, och svaret bär den ursprungliga
+    URL:en. breakers (CircuitBreakers) nyckas på värden eller på breaker="namn" när en endpoint ska kunna
+    stängas av för sig. Omdirigeringar följs här, ett hopp i taget, så varje hopp går genom sin egen värds
+    session, tak, mätning och brytare – ett fel hos publicisten efter en omdirigering belastar inte värden
+    (eller endpointen) som skickade dit."""
+    IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS"})
+    MAX_REDIRECTS = 10
+
+    def __init__(self, policy: RetryPolicy = None, host_limits: dict = None, pool_sizes: dict = None, rate_limits: dict = None):
+        self.policy = policy or RetryPolicy()
+        self.host_limits = dict(host_limits or {})
+        self.pool_sizes = dict(pool_sizes or {})
+        self.rate_limits = dict(rate_limits or {})  # värd -> TokenBucket
+        self._sessions = {}; self._sems = {}
+        self._lock = threading.Lock()
+        self.url_rewrite = None
+        self.breakers = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts = {"requests": 0, "retries": 0, "errors": 0}
+            self._pool_base = {host: self._pool_counters(sess) for host, sess in self._sessions.items()}
+        if self.breakers: self.breakers.reset_stats()
+
+    def _limit(self, host: str) -> int:
+        return self.host_limits.get(host, HOST_MAX_CONCURRENCY)
+
+    def _session(self, host: str) -> requests.Session:
+        with self._lock:
+            sess = self._sessions.get(host)
+            if sess is None:
+                size = self.pool_sizes.get(host, self._limit(host))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, size), max_retries=0)
+                sess = requests.Session()
+                sess.mount("https://", adapter); sess.mount("http://", adapter)
+                self._sessions[host] = sess
+            return sess
+
+    def host_slot(self, host: str):
+        """Semafor för värden – håller nere antalet samtidiga anrop mot samma värd."""
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self._limit(host))
+        return sem
+
+    def request(self, method: str, url: str, retry: bool = None, retries: int = None, breaker: str = None,
+                allow_redirects: bool = True, **kw):
+        method = method.upper()
+        key = breaker or self._host(url)
+        history = []
+        while True:
+            resp = self._call(method, url, key, retry, retries, **kw)
+            target = self._session(self._host(url)).get_redirect_target(resp) if allow_redirects else None
+            if not target:
+                break
+            history.append(resp); resp.close()
+            if len(history) > self.MAX_REDIRECTS:
+                raise TooManyRedirects(f"fler än {self.MAX_REDIRECTS} omdirigeringar", response=resp)
+            url, method, kw = self._redirect(url, method, resp.status_code, target, kw)
+            key = self._host(url)
+        if history: resp.history = history
+        if self.url_rewrite: resp.url = url
+        return resp
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return (urlparse(url).netloc or "").lower()
+
+    @staticmethod
+    def _redirect(url: str, method: str, status: int, target: str, kw: dict):
+        """Nästa hopp som requests själv skulle ha gjort det: relativ Location mot den ursprungliga (inte
+        omskrivna) URL:en, 302/303 → GET (301 bara för POST) och inloggning följer inte med till en annan värd."""
+        nxt = urljoin(url, target)
+        if method != "HEAD" and (status in (302, 303) or (status == 301 and method == "POST")):
+            method = "GET"
+            kw = {k: v for k, v in kw.items() if k not in ("data", "json", "files")}
+        if HttpClient._host(nxt) != HttpClient._host(url):
+            kw = {k: v for k, v in kw.items() if k != "auth"}
+        return nxt, method, kw
+
+    def _call(self, method: str, url: str, key: str, retry: bool, retries: int, **kw):
+        host = self._host(url)
+        if retry is None: retry = method in self.IDEMPOTENT
+        max_retries = (self.policy.retries if retries is None else retries) if retry else 0
+        breakers = self.breakers
+        if not breakers:
+            return self._send(method, url, host, max_retries, **kw)
+        # Brytaren räknar hela anropet (med omförsök) som ett utfall: öppen → CircuitOpenError direkt,
+        # halvöppen → ett enda försök. 429 räknas inte – där bromsar TokenBucket/Retry-After i stället.
+        if breakers.allow(key) == CircuitBreakers.HALF_OPEN:
+            max_retries = 0
+        try:
+            resp = self._send(method, url, host, max_retries, **kw)
+        except (ReqConnectionError, Timeout) as e:
+            breakers.failure(key, type(e).__name__)
+            raise
+        except BaseException:
+            breakers.release(key)
+            raise
+        if resp.status_code in CircuitBreakers.FAIL_STATUSES: breakers.failure(key, f"HTTP {resp.status_code}")
+        elif resp.status_code == 429: breakers.release(key)
+        else: breakers.success(key)
+        return resp
+
+    def _send(self, method: str, url: str, host: str, max_retries: int, **kw):
+        sess = self._session(host)
+        bucket = self.rate_limits.get(host)
+        if self.url_rewrite: url = self.url_rewrite(url)
+        attempt = 0
+        while True:
+            resp = None
+            if bucket: bucket.acquire()
+            try:
+                with self.host_slot(host):
+                    with self._lock: self._counts["requests"] += 1
+                    t0 = time.perf_counter()
+                    try:
+                        resp = sess.request(method, url, allow_redirects=False, **kw)
+                    finally:
+                        METRICS.observe_request(host, time.perf_counter() - t0, resp.status_code if resp is not None else None)
+                throttled = bucket is not None and resp.status_code == 429
+                if throttled:
+                    # Varje 429 stänger hinken, även på sista försöket: alla trådar mot värden väntar ut Retry-After
+                    wait = self.policy.delay(attempt, resp)
+                    bucket.pause(wait)
+                if resp.status_code not in self.policy.RETRY_STATUSES or attempt >= max_retries:
+                    return resp
+            except (ReqConnectionError, Timeout) as e:
+                with self._lock: self._counts["errors"] += 1
+                if attempt >= max_retries or not self.policy.retryable(e, method): raise
+                throttled = False
+            with self._lock: self._counts["retries"] += 1
+            METRICS.retry(host)
+            if resp is not None: resp.close()
+            if not throttled:
+                time.sleep(self.policy.delay(attempt, resp))   # annars väntar bucket.acquire() ut pausen
+            attempt += 1
+
+    def close(self):
+        """Stäng alla poolade anslutningar; nästa anrop öppnar nya sessioner."""
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+            self._pool_base = {}
+        for sess in sessions: sess.close()
+
+    def get(self, url, **kw):  return self.request("GET", url, **kw)
+    def head(self, url, **kw): return self.request("HEAD", url, **kw)
+    def post(self, url, **kw): return self.request("POST", url, **kw)
+
+    @staticmethod
+    def _pool_counters(sess) -> tuple:
+        conns = reqs = 0
+        for adapter in set(sess.adapters.values()):
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None:
+                    conns += pool.num_connections; reqs += pool.num_requests
+        return conns, reqs
+
+    def stats(self) -> dict:
+        """Körningsstatistik: anrop, omförsök, fel samt nya vs återanvända anslutningar."""
+        with self._lock:
+            out = dict(self._counts); sessions = dict(self._sessions); base = dict(self._pool_base)
+        new_conns = sent = 0
+        for host, sess in sessions.items():
+            conns, reqs = self._pool_counters(sess)
+            b_conns, b_reqs = base.get(host, (0, 0))
+            new_conns += conns - b_conns; sent += reqs - b_reqs
+        out["new_connections"] = new_conns
+        out["reused_connections"] = max(0, sent - new_conns)
+        out["hosts"] = len(sessions)
+        return out
+
+HTTP = HttpClient(host_limits=HOST_LIMITS, pool_sizes=_parse_host_sizes(HTTP_POOL_SIZES),
+                  rate_limits={"api.openai.com": TokenBucket(OPENAI_RPM / 60.0, burst=OPENAI_CONCURRENCY)})
+
+# === Diskcache (TTL + LRU) ===
+_CACHES = []
+
+class DiskCache:
+    """Liten persistent nyckel→värde-cache: TTL per post, LRU-gallring över max_entries, sparas som pickle."""
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.path = os.path.join(CACHE_DIR, f"{name}.pickle")
+        self.ttl = ttl_seconds; self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value), äldst använd först
+        self._lock = threading.Lock()
+        self._loaded = False; self._dirty = False
+        self.hits = self.misses = 0; self.counters = {}
+        _CACHES.append(self)
+
+    def _ensure_loaded(self):
+        if self._loaded: return
+        self._loaded = True
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            if isinstance(data, OrderedDict): self._data = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Cache {self.name} kunde inte läsas ({e}) – börjar om tom.")
+
+    def get(self, key, default=None):
+        return self.get_first([key], default)[1]
+
+    def get_first(self, keys, default=None):
+        """(nyckel, värde) för första nyckeln som finns, annars (None, default); räknas som en enda uppslagning."""
+        with self._lock:
+            self._ensure_loaded()
+            now = time.time()
+            for key in keys:
+                hit = self._data.get(key)
+                if hit is not None and hit[0] < now:
+                    del self._data[key]; self._dirty = True
+                    hit = None
+                if hit is not None:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return key, hit[1]
+            self.misses += 1
+            return None, default
+
+    def set(self, key, value, ttl_seconds: float = None):
+        with self._lock:
+            self._ensure_loaded()
+            self._data[key] = (time.time() + (self.ttl if ttl_seconds is None else ttl_seconds), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            self._dirty = True
+
+    def clear(self):
+        """Töm cachen och nollställ räknarna (filen skrivs om vid nästa save)."""
+        with self._lock:
+            self._loaded = True; self._data = OrderedDict(); self._dirty = True
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Nollställ träffar/missar/räknare (innehållet ligger kvar) – daemonen rapporterar per cykel."""
+        with self._lock:
+            self.hits = self.misses = 0; self.counters = {}
+
+    def bump(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def save(self):
+        with self._lock:
+            if not self._dirty: return
+            now = time.time()
+            for k in [k for k, (exp, _) in self._data.items() if exp < now]:
+                del self._data[k]
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(self._data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.path)
+                self._dirty = False
+            except Exception as e:
+                print(f"⚠️ Cache {self.name} kunde inte sparas: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), **self.counters}
+
+def save_caches():
+    for c in _CACHES:
+        c.save()
+
+def reset_cache_stats():
+    for c in _CACHES:
+        c.reset_stats()
+
+atexit.register(save_caches)
+
+# === Brytare (circuit breaker) per värd/endpoint, sparas mellan körningar ===
+class CircuitBreakers:
+    """stängd → öppen efter `failures` misslyckade anrop i rad (ett anrop = alla dess omförsök); efter cooldown
+    blir den halvöppen och släpper fram ett enda provanrop som stänger den igen, eller öppnar den på nytt med
+    dubbel cooldown. Medan den är öppen kastar allow() CircuitOpenError direkt i stället för att vänta ut
+    timeouter. Läget ligger i en DiskCache, så en värd som var nere förra körningen hoppas över redan från
+    första anropet."""
+    CLOSED, OPEN, HALF_OPEN = "stängd", "öppen", "halvöppen"
+    FAIL_STATUSES = frozenset({500, 502, 503, 504})   # 429 är mottryck, inte ett fel hos värden
+
+    def __init__(self, store: DiskCache, failures=BREAKER_FAILURES, cooldown_s=BREAKER_COOLDOWN_S,
+                 cooldown_max_s=BREAKER_COOLDOWN_MAX_S):
+        self.store = store
+        self.failures = failures; self.cooldown_s = cooldown_s; self.cooldown_max_s = max(cooldown_s, cooldown_max_s)
+        self._states = {}     # nyckel -> {"state", "failures", "opened_at", "cooldown", "last_error", "probing"}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.transitions = []; self.skipped = {}
+
+    def clear(self):
+        """Glöm alla brytare (även de sparade)."""
+        with self._lock:
+            self._states = {}
+        self.store.clear()
+        self.reset_stats()
+
+    def _state(self, key: str) -> dict:
+        st = self._states.get(key)
+        if st is None:
+            saved = self.store.get(key) or {"state": self.CLOSED, "failures": 0, "opened_at": 0.0,
+                                            "cooldown": self.cooldown_s, "last_error": ""}
+            st = self._states[key] = dict(saved, probing=False)
+        return st
+
+    def _save(self, key: str, st: dict):
+        self.store.set(key, {k: v for k, v in st.items() if k != "probing"})
+
+    def _move(self, key: str, st: dict, new: str, why: str = ""):
+        old, st["state"] = st["state"], new
+        if new == self.OPEN: st["opened_at"] = time.time()
+        self.transitions.append({"key": key, "from": old, "to": new, "why": why,
+                                 "at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+        print(f"🔌 Brytare {key}: {old} → {new}" + (f" ({why})" if why else ""))
+
+    def _skip(self, key: str, msg: str):
+        self.skipped[key] = self.skipped.get(key, 0) + 1
+        raise CircuitOpenError(f"brytaren för {key} är {msg}")
+
+    def allow(self, key: str) -> str:
+        """Släpp fram anropet (returnerar läget det går i) eller kasta CircuitOpenError."""
+        if self.failures <= 0: return self.CLOSED
+        with self._lock:
+            st = self._state(key)
+            if st["state"] == self.OPEN:
+                wait = st["opened_at"] + st["cooldown"] - time.time()
+                if wait > 0:
+                    self._skip(key, f"öppen efter {st['last_error']}, nytt prov om {wait:.0f} s")
+                self._move(key, st, self.HALF_OPEN, "provar ett anrop")
+                self._save(key, st)
+            if st["state"] == self.HALF_OPEN:
+                if st["probing"]:
+                    self._skip(key, "halvöppen, provanrop pågår")
+                st["probing"] = True
+            return st["state"]
+
+    def release(self, key: str):
+        """Anropet föll av annat skäl än värden (t.ex. ogiltig URL) – räknas varken som fel eller lyckat."""
+        with self._lock:
+            st = self._states.get(key)
+            if st: st["probing"] = False
+
+    def success(self, key: str):
+        if self.failures <= 0: return
+        with self._lock:
+            st = self._state(key)
+            st["probing"] = False
+            if st["state"] == self.CLOSED and not st["failures"]: return
+            if st["state"] != self.CLOSED:
+                self._move(key, st, self.CLOSED, "svarar igen")
+            st["failures"] = 0; st["cooldown"] = self.cooldown_s
+            self._save(key, st)
+
+    def failure(self, key: str, error: str):
+        if self.failures <= 0: return
+        with self._lock:
+            st = self._state(key)
+            st["probing"] = False; st["failures"] += 1; st["last_error"] = error
+            if st["state"] == self.HALF_OPEN:
+                st["cooldown"] = min(st["cooldown"] * 2, self.cooldown_max_s)
+                self._move(key, st, self.OPEN, f"provet misslyckades: {error}, vilar {st['cooldown']:.0f} s")
+            elif st["state"] == self.CLOSED and st["failures"] >= self.failures:
+                self._move(key, st, self.OPEN, f"{st['failures']} fel i rad, senast {error}, vilar {st['cooldown']:.0f} s")
+            self._save(key, st)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {"not_closed": {k: {"state": st["state"], "failures": st["failures"], "last_error": st["last_error"]}
+                                   for k, st in sorted(self._states.items()) if st["state"] != self.CLOSED},
+                    "skipped": dict(self.skipped), "transitions": list(self.transitions)}
+
+BREAKERS = CircuitBreakers(DiskCache("breakers", ttl_seconds=7 * 86400, max_entries=500))
+HTTP.breakers = BREAKERS
+
+# === Källschema (daemon) ===
+class SourcePoller:
+    """Minne för källanrop mellan cykler i daemon-läge: varje (funktion, argument) hämtas om först när
+    källtypens intervall (± jitter) har gått. Utan daemon (enabled=False) går anropen rakt igenom."""
+    def __init__(self, intervals: dict, jitter: float = 0.1):
+        self.intervals = intervals; self.jitter = jitter
+        self.enabled = False
+        self._entries = {}   # (namn, args, kwargs) -> {"kind", "fn", "args", "kw", "value", "digest", "due"}
+        self._lock = threading.Lock()
+
+    def _due_at(self, kind: str, now: float) -> float:
+        iv = self.intervals.get(kind, 300)
+        return now + iv * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _fetch(self, key, kind, fn, args, kw):
+        value = fn(*args, **kw)
+        digest = hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+        with self._lock:
+            prev = self._entries.get(key)
+            self._entries[key] = {"kind": kind, "fn": fn, "args": args, "kw": kw, "value": value,
+                                  "digest": digest, "due": self._due_at(kind, time.time())}
+        return value, (prev is None or prev["digest"] != digest)
+
+    def call(self, kind: str, fn, *args, **kw):
+        if not self.enabled:
+            return fn(*args, **kw)
+        key = (fn.__name__, repr(args), repr(sorted(kw.items())))  # argument kan vara listor
+        with self._lock:
+            e = self._entries.get(key)
+        if e and time.time() < e["due"]:
+            return e["value"]
+        return self._fetch(key, kind, fn, args, kw)[0]
+
+    def refresh_due(self) -> set:
+        """Hämta om alla förfallna källor parallellt; returnerar källtyperna vars data faktiskt ändrats."""
+        now = time.time()
+        with self._lock:
+            due = [(k, e) for k, e in self._entries.items() if e["due"] <= now]
+        changed = set()
+        if not due: return changed
+        with ThreadPoolExecutor(max_workers=max(1, FETCH_WORKERS), thread_name_prefix="poll") as ex:
+            futs = [(e["kind"], ex.submit(self._fetch, k, e["kind"], e["fn"], e["args"], e["kw"])) for k, e in due]
+            for kind, f in futs:
+                try:
+                    if f.result()[1]: changed.add(kind)
+                except Exception as ex_err:
+                    print(f"⚠️ Omhämtning av {kind} misslyckades:", ex_err)
+        print(f"🔄 Källor omhämtade: {len(due)} | ändrade typer: {', '.join(sorted(changed)) or 'inga'}")
+        return changed
+
+    def next_due(self) -> float:
+        with self._lock:
+            return min((e["due"] for e in self._entries.values()), default=time.time())
+
+POLLER = SourcePoller({"wiki": POLL_WIKI_S, "reddit": POLL_REDDIT_S, "youtube": POLL_YOUTUBE_S,
+                       "gnews": POLL_GNEWS_S, "feeds": POLL_FEEDS_S}, jitter=POLL_JITTER)
+
+def polled(kind: str):
+    """Dekorator: låt källfunktionen gå via POLLER (minne + schema i daemon-läge)."""
+    def wrap(fn):
+        def inner(*args, **kw):
+            with METRICS.span(f"källa:{kind}"):
+                return POLLER.call(kind, fn, *args, **kw)
+        inner.__name__ = fn.__name__; inner.__doc__ = fn.__doc__; inner.__wrapped__ = fn
+        return inner
+    return wrap
 
 # === RSS/APIs ===
+# Snabbväg för välformad RSS 2.0/Atom: XMLPullParser direkt på råa bytes, en post i taget, så att läsaren
+# kan sluta när den har nog. Allt som feedparser skulle tolka annorlunda (trasig XML, HTML i rubriker,
+# relativa länkar, okända datumfält, RSS 1.0 …) lämnas över till feedparser från samma post.
+FEED_CHUNK = 16 * 1024
+FEED_PARSE_STATS = {"fast": 0, "fallback": 0}
+_feed_stats_lock = threading.Lock()
+
+def _count_feed_parse(key: str):
+    with _feed_stats_lock:
+        FEED_PARSE_STATS[key] += 1
+
+def reset_feed_parse_stats():
+    with _feed_stats_lock:
+        FEED_PARSE_STATS.update(fast=0, fallback=0)
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+_HTMLISH_RE = re.compile(r"</\w+>|&#?\w+;")                    # feedparser gör om sådant till HTML
+_RELATIVE_HREF_RE = re.compile(r"""href\s*=\s*(?!["']?https?:)""", re.I)
+# Tillägg som inte påverkar fälten vi läser (content:encoded kräver att description också finns)
+_FEED_IGNORED_NS = ("{http://search.yahoo.com/mrss/}", "{http://purl.org/rss/1.0/modules/slash/}",
+                    "{http://wellformedweb.org/CommentAPI/}", "{http://purl.org/rss/1.0/modules/content/}")
+_DC = "{http://purl.org/dc/elements/1.1/}"
+
+def _feed_ignored(tag) -> bool:
+    return isinstance(tag, str) and (tag.startswith(_FEED_IGNORED_NS) or (tag.startswith(_DC) and tag != _DC + "date"))
+
+class _FeedFallback(Exception):
+    pass
+
+def _feed_text(el, strict_title=False) -> str:
+    text = (el.text or "").strip()
+    if strict_title and (len(el) or _HTMLISH_RE.search(text) or "<" in text): raise _FeedFallback("title")
+    return text
+
+def _feed_dates(entry, published=None, updated=None):
+    for key, value in (("published", published), ("updated", updated)):
+        if value is None: continue
+        entry[key] = value
+        parsed = _feed_parse_date(value)
+        if parsed is not None: entry[key + "_parsed"] = parsed
+
+def _rss_entry(item) -> "feedparser.FeedParserDict":
+    e = feedparser.FeedParserDict()
+    guid_link, published = None, None
+    for child in item:
+        tag = child.tag
+        if tag == "title": e["title"] = _feed_text(child, strict_title=True)
+        elif tag == "link": e["link"] = _feed_text(child)
+        elif tag == "guid":
+            e["id"] = e["guid"] = _feed_text(child)
+            if child.get("isPermaLink", "true").lower() == "true": guid_link = e["id"]
+        elif tag == "pubDate": published = _feed_text(child)
+        elif tag == "description":
+            summary = child.text or ""
+            if _RELATIVE_HREF_RE.search(summary): raise _FeedFallback("relative href")
+            e["summary"] = summary.strip()
+        elif tag == "source":
+            e["source"] = feedparser.FeedParserDict(href=child.get("url", ""), title=_feed_text(child))
+        elif _feed_ignored(tag): continue
+        elif not isinstance(tag, str) or tag.startswith("{") or len(child): raise _FeedFallback(tag)
+    if not published or "title" not in e: raise _FeedFallback("pubDate/title")
+    if "summary" not in e and item.find("{http://purl.org/rss/1.0/modules/content/}encoded") is not None:
+        raise _FeedFallback("content:encoded")
+    if "link" not in e and guid_link and guid_link.startswith("http"): e["link"] = guid_link
+    _feed_dates(e, published=published)
+    return e
+
+def _atom_entry(entry) -> "feedparser.FeedParserDict":
+    e = feedparser.FeedParserDict()
+    published = updated = None
+    for child in entry:
+        tag = child.tag[len(_ATOM):] if child.tag.startswith(_ATOM) else None
+        if tag == "title":
+            if child.get("type") == "xhtml": raise _FeedFallback("xhtml")
+            e["title"] = _feed_text(child, strict_title=True)
+        elif tag == "link":
+            href = child.get("href", "")
+            if not href.startswith("http"): raise _FeedFallback("relative link")
+            if child.get("rel", "alternate") == "alternate" and "link" not in e:
+                if child.get("type", "text/html") not in _HTML_TYPES: raise _FeedFallback("link type")
+                e["link"] = href
+        elif tag == "id": e["id"] = _feed_text(child)
+        elif tag == "published": published = _feed_text(child)
+        elif tag == "updated": updated = _feed_text(child)
+        elif tag in ("summary", "content"):
+            if child.get("type") == "xhtml" or len(child): raise _FeedFallback("xhtml")
+            if tag == "summary":
+                summary = child.text or ""
+                if _RELATIVE_HREF_RE.search(summary): raise _FeedFallback("relative href")
+                e["summary"] = summary.strip()
+        elif _feed_ignored(child.tag): continue
+        elif tag is None or tag in ("source", "issued", "modified", "created"): raise _FeedFallback(child.tag)
+    if not (published or updated) or "title" not in e: raise _FeedFallback("date/title")
+    _feed_dates(e, published=published, updated=updated)
+    return e
+
+def iter_feed_entries(raw: bytes):
+    """Posterna i en feed som FeedParserDict (samma fält och datumtolkning som feedparser), lazily."""
+    done = 0
+    if _feed_parse_date is not None:
+        parser = ET.XMLPullParser(events=("start", "end"))
+        make, item_tag, root = None, None, None
+        try:
+            for pos in range(0, len(raw) or 1, FEED_CHUNK):
+                parser.feed(raw[pos:pos + FEED_CHUNK])
+                if pos + FEED_CHUNK >= len(raw): parser.close()
+                for event, el in parser.read_events():
+                    if root is None:
+                        root = el.tag
+                        if root == "rss": make, item_tag = _rss_entry, "item"
+                        elif root == _ATOM + "feed": make, item_tag = _atom_entry, _ATOM + "entry"
+                        else: raise _FeedFallback(root)
+                    if event == "end" and el.tag == item_tag:
+                        e = make(el)
+                        el.clear()
+                        _count_feed_parse("fast")
+                        yield e
+                        done += 1
+            if root is not None: return
+        except (ET.ParseError, _FeedFallback):
+            pass
+    _count_feed_parse("fallback")
+    for e in feedparser.parse(raw).entries[done:]:
+        yield e
+
+class LazyFeed:
+    """Som feedparser-resultatet för våra läsare: feed.entries, parsas först när någon itererar."""
+    def __init__(self, raw: bytes = b""):
+        self.raw = raw
+
+    @property
+    def entries(self):
+        return iter_feed_entries(self.raw) if self.raw else iter(())
+
+# Villkorlig GET: ETag/Last-Modified + råa feed-bytes per URL; 304 → parsa den sparade kroppen
+FEED_CACHE = DiskCache("feeds", ttl_seconds=FEED_CACHE_TTL_H * 3600, max_entries=FEED_CACHE_MAX)
+
 def fetch_rss(url):
+    cached = FEED_CACHE.get(url)
+    if cached and "body" not in cached: cached = None   # post från äldre version (parsade entries)
+    headers = dict(UA_HEADERS)
+    if cached:
+        if cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"): headers["If-Modified-Since"] = cached["modified"]
     try:
-        r = requests.get(url, headers=UA_HEADERS, timeout=15)
+        r = HTTP.get(url, headers=headers, timeout=15)
+        if r.status_code == 304 and cached:
+            FEED_CACHE.bump("not_modified")
+            return LazyFeed(cached["body"])
         r.raise_for_status()
-        return feedparser.parse(r.text)
+        etag, modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        if etag or modified:
+            FEED_CACHE.set(url, {"etag": etag, "modified": modified, "body": r.content})
+        return LazyFeed(r.content)
     except Exception as e:
         print("⚠️ RSS-fel på", url, "→", e)
-        return feedparser.FeedParserDict(entries=[])
-
-def gnews_recent_titles(query, max_items=6, max_age_hours=48):
+        return LazyFeed()
+
+# --- Högvattenmärken: vilka poster per feed som redan behandlats ---
+class _FeedScan:
+    """En genomläsning av en feed: is_new() släpper bara igenom obehandlade poster, take() noterar posten under
+    sin titel och close() lämnar feedens erbjudanden till FEED_MARKS (ersätter förra genomläsningens)."""
+    def __init__(self, marks, feed: str, mark, by_time: bool):
+        self.marks = marks; self.feed = feed; self.mark = mark; self.by_time = by_time
+        self.seen = set(mark["seen"]) if mark and not by_time else None
+        self.offers = {}   # titel -> (ts, id)
+
+    def is_new(self, dt, entry_id: str) -> bool:
+        if self.mark is None:
+            new = True
+        elif self.by_time:
+            ts = _to_aware_utc(dt).timestamp()
+            new = ts > self.mark["ts"] or (ts == self.mark["ts"] and entry_id not in self.mark["ids"])
+        else:
+            new = entry_id not in self.seen
+        self.marks.count("new" if new else "old")
+        return new or self.marks.force
+
+    def take(self, title: str, dt, entry_id: str):
+        self.offers[title] = (_to_aware_utc(dt).timestamp(), entry_id)
+
+    def close(self):
+        self.marks.offer(self.feed, self.by_time, self.offers)
+
+def _raise_mark(mark, ts: float, ids) -> dict:
+    if mark is None or ts > mark["ts"]: return {"ts": ts, "ids": list(ids)}
+    if ts == mark["ts"]: return {"ts": ts, "ids": mark["ids"] + [i for i in ids if i not in mark["ids"]]}
+    return mark
+
+class FeedMarks:
+    """Vad som redan behandlats per feed-URL, sparat i en DiskCache. Datumsorterade feeds (by_time) får ett
+    högvattenmärke: nyaste behandlade tid + id:n med just den tiden. Google News-sökningar sorteras på relevans
+    och klipps, så där sparas i stället de senaste seen_max behandlade id:na. Källorna läser via scan() och
+    erbjuder det de släppt igenom; märket flyttas först när iter_diverse_topics har poängsatt titeln (commit).
+    Det som hämtats men sållats bort före poängsättningen (planerarens urval, kvoter, avbruten körning) prövas
+    alltså igen nästa gång – även när hämtningen skett i förväg i daemonens omhämtning."""
+    def __init__(self, store: DiskCache, force: bool = False, seen_max: int = FEED_MARKS_SEEN_MAX):
+        self.store = store; self.force = force; self.seen_max = seen_max
+        self._offers = {}   # feed -> (by_time, {titel: (ts, id)}) från senaste genomläsningen
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"new": 0, "old": 0, "committed": 0}
+
+    def count(self, key: str):
+        with self._lock: self.stats[key] += 1
+
+    def scan(self, feed: str, by_time: bool = True) -> _FeedScan:
+        mark = self.store.get(feed)
+        if mark and ("ts" in mark) != by_time: mark = None
+        return _FeedScan(self, feed, mark, by_time)
+
+    def offer(self, feed: str, by_time: bool, offers: dict):
+        with self._lock:
+            if offers: self._offers[feed] = (by_time, dict(offers))
+            else: self._offers.pop(feed, None)
+
+    def commit(self, titles):
+        """Titlarna är bedömda: flytta märkena för de feeds som erbjöd dem."""
+        titles = set(titles)
+        with self._lock:
+            taken = {}
+            for feed, (by_time, offers) in list(self._offers.items()):
+                hit = [offers.pop(t) for t in [t for t in offers if t in titles]]
+                if hit: taken[feed] = (by_time, hit)
+                if not offers: del self._offers[feed]
+        for feed, (by_time, hit) in taken.items():
+            cur = self.store.get(feed)
+            if by_time:
+                mark = cur if cur and "ts" in cur else None
+                for ts, entry_id in hit: mark = _raise_mark(mark, ts, [entry_id])
+            else:
+                seen = list(cur["seen"]) if cur and "seen" in cur else []
+                known = set(seen)
+                seen += [entry_id for _, entry_id in hit if entry_id not in known]
+                mark = {"seen": seen[-self.seen_max:]}
+            self.store.set(feed, mark)
+        with self._lock: self.stats["committed"] += len(taken)
+
+FEED_MARKS = FeedMarks(DiskCache("feed_marks", ttl_seconds=FEED_MARKS_TTL_D * 86400, max_entries=FEED_MARKS_MAX),
+                       force=FORCE_FULL_RESCAN)
+
+def _entry_id(e) -> str:
+    return getattr(e, "id", None) or getattr(e, "link", None) or getattr(e, "title", "")
+
+# Sökningar mot news.google.com: skickade = faktiska anrop; planerade = sammanslagna sökningar som
+# ersatte "ersatta" enskilda (fråga, site)-sökningar
+GNEWS_QUERY_STATS = {"sent": 0, "planned": 0, "replaced": 0}
+_query_stats_lock = threading.Lock()
+
+def reset_gnews_query_stats():
+    with _query_stats_lock:
+        GNEWS_QUERY_STATS.update(sent=0, planned=0, replaced=0)
+
+@polled("gnews")
+def gnews_recent_entries(query, max_items=6, max_age_hours=48):
+    """(titel, källans värd) för färska poster i en Google News-sökning."""
     q = f"{query} when:2d"
     url = f"https://news.google.com/rss/search?q={quote(q)}&hl=sv-SE&gl=SE&ceid=SE:sv"
+    with _query_stats_lock:
+        GNEWS_QUERY_STATS["sent"] += 1
     feed = fetch_rss(url)
-    titles = []
+    scan = FEED_MARKS.scan(url, by_time=False)   # relevanssorterad: id:n, inte tid
+    out = []
     for e in (feed.entries or []):
-        if is_recent(parse_entry_dt(e), max_age_hours=max_age_hours):
-            titles.append(e.title)
-            if len(titles) >= max_items:
+        dt = parse_entry_dt(e)
+        if is_recent(dt, max_age_hours=max_age_hours) and scan.is_new(dt, _entry_id(e)):
+            src = e.get("source") or {}
+            out.append((e.title, (urlparse(src.get("href") or "").netloc or "").lower()))
+            scan.take(e.title, dt, _entry_id(e))
+            if len(out) >= max_items:
                 break
-    return titles
+    scan.close()
+    return out
+
+def gnews_recent_titles(query, max_items=6, max_age_hours=48):
+    return [t for t, _ in gnews_recent_entries(query, max_items=max_items, max_age_hours=max_age_hours)]
+
+# --- Frågeplanering: många små sökningar → några få OR-sökningar, träffarna fördelas tillbaka ---
+_QUERY_TOKEN_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+def _or_group(terms) -> str:
+    parts = [f"({t})" if " " in t and not (t.startswith('"') and t.endswith('"')) else t for t in terms]
+    return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+@lru_cache(maxsize=256)
+def _query_terms(query: str) -> tuple:
+    """Fraser och ord som måste finnas i rubriken för att en träff ska räknas till frågan."""
+    return tuple((phrase or word).lower() for phrase, word in _QUERY_TOKEN_RE.findall(query))
+
+def _matches_query(query: str, title_low: str) -> bool:
+    return all(term in title_low for term in _query_terms(query))
+
+def _site_index(sites, host: str):
+    for i, site in enumerate(sites):
+        dom = site.split(":", 1)[1].lower()
+        if host == dom or host.endswith("." + dom):
+            return i
+    return None
+
+def gnews_planned_titles(queries, sites=(), per_pair=3, max_items=None, max_age_hours=48, max_terms=None):
+    """Samma urval som en gnews_recent_titles(f"{q} {site}", max_items=per_pair) per par i ordningen fråga × site,
+    men via några få sökningar av formen (q1 OR q2 …) (site:a OR site:b …). Träffarna knyts tillbaka till
+    (fråga, site) via rubrik och källa; träffar Google matchat på brödtexten läggs sist. Dubbletter tas bort
+    och inga fler sökningar skickas när max_items nåtts."""
+    sites = list(sites); pairs = len(sites) or 1
+    max_terms = max(1, max_terms or GNEWS_PLAN_MAX_TERMS)
+    out, rest, seen = [], [], set()
+    for start in range(0, len(queries), max_terms):
+        chunk = list(range(start, min(start + max_terms, len(queries))))
+        q = _or_group([queries[i] for i in chunk]) + (f" {_or_group(sites)}" if sites else "")
+        entries = gnews_recent_entries(q, max_items=100, max_age_hours=max_age_hours)
+        with _query_stats_lock:
+            GNEWS_QUERY_STATS["planned"] += 1; GNEWS_QUERY_STATS["replaced"] += len(chunk) * pairs
+        buckets, unmatched = {}, []
+        for title, host in entries:
+            si = _site_index(sites, host) if sites else 0
+            low = title.lower()
+            hits = [qi for qi in chunk if _matches_query(queries[qi], low)] if si is not None else []
+            for qi in hits:
+                buckets.setdefault((qi, si), []).append(title)
+            if not hits: unmatched.append(title)
+        # Varje par tar sina per_pair första träffar (som en egen sökning hade gjort); dubbletter hoppas över
+        for qi in chunk:
+            for si in range(pairs):
+                for t in buckets.get((qi, si), [])[:per_pair]:
+                    key = normalize_title_key(t)
+                    if key in seen: continue
+                    seen.add(key); out.append(t)
+                    if max_items and len(out) >= max_items:
+                        return out
+        rest.extend(unmatched)
+    for t in rest:
+        key = normalize_title_key(t)
+        if key in seen: continue
+        seen.add(key); out.append(t)
+        if len(out) >= (max_items or len(queries) * pairs * per_pair): break
+    return out
 
 # --- Google News: originalkälla (aldrig consent/news) ---
 GOOGLE_HOSTS = ("google.", "news.google.", "consent.google.", "accounts.google.")
 
-def _first_external_href_from_html(html: str):
+# Första <a href> som uppfyller ett villkor – strömmande HTMLParser i stället för ett helt BeautifulSoup-träd.
+# Samma tolkning som BeautifulSoup(html, "html.parser").find_all("a", href=True): samma tokenisering,
+# <a href> utan värde = "", vid dubblerat href vinner det sista, ingenting i script/style/kommentarer.
+_A_START_RE = re.compile(r"<a(?:[\t\n\r\f />\x00]|$)", re.I)  # nödvändigt för att en a-tagg ska finnas
+
+class _HrefFound(Exception):
+    pass
+
+class _FirstHrefParser(HTMLParser):
+    def __init__(self, accept):
+        super().__init__(convert_charrefs=False)
+        self.accept = accept; self.found = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a": return
+        href = None
+        for k, v in attrs:
+            if k == "href": href = "" if v is None else v
+        if href is not None and self.accept(href):
+            self.found = href
+            raise _HrefFound
+
+def _first_href(html: str, accept):
+    if not html or not _A_START_RE.search(html): return None
+    parser = _FirstHrefParser(accept)
     try:
-        soup = BeautifulSoup(html, "html.parser")
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if not any(h in href for h in GOOGLE_HOSTS):
-                return href
+        parser.feed(html); parser.close()
+    except _HrefFound:
+        return parser.found
     except Exception:
         pass
     return None
 
+def _first_external_href_from_html(html: str):
+    return _first_href(html, lambda href: not any(h in href for h in GOOGLE_HOSTS))
+
 def _maybe_strip_consent(u: str) -> str:
     # consent.google.com/... ?continue=https://news.google.com/...
     if "consent.google.com" in u:
@@ -182,21 +1300,57 @@ def _maybe_strip_consent(u: str) -> str:
     return u
 
 def _extract_external_from_news_html(html: str) -> str | None:
+    return _first_href(html, lambda href: not any(h in href for h in GOOGLE_HOSTS) and href.startswith("http"))
+
+# Google News-länkar bär ofta originalet i artikel-token (base64url-protobuf: 08 13 22 <varint-längd> <url> ...).
+# Nyare token ("AU_yqL...") kräver Googles egna API – då blir det miss och HTTP-vägen tar över.
+_GNEWS_TOKEN_RE = re.compile(r"/articles/([A-Za-z0-9_-]{16,})")
+GNEWS_DECODE_STATS = {"hit": 0, "miss": 0}
+_decode_stats_lock = threading.Lock()
+
+def reset_gnews_decode_stats():
+    with _decode_stats_lock:
+        GNEWS_DECODE_STATS.update(hit=0, miss=0)
+
+def decode_gnews_article_url(link: str) -> str | None:
+    """Avkoda publicistens URL ur en news.google.com/rss/articles/<token>-länk, utan nätverk."""
+    url = _decode_gnews_token(link)
+    with _decode_stats_lock:
+        GNEWS_DECODE_STATS["hit" if url else "miss"] += 1
+    return url
+
+def _decode_gnews_token(link: str) -> str | None:
+    m = _GNEWS_TOKEN_RE.search(urlparse(link or "").path)
+    if not m: return None
+    token = m.group(1)
     try:
-        soup = BeautifulSoup(html, "html.parser")
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if not any(h in href for h in GOOGLE_HOSTS) and href.startswith("http"):
-                return href
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
     except Exception:
-        pass
-    return None
+        return None
+    if not raw.startswith(b"\x08\x13\x22"): return None
+    pos, length, shift = 3, 0, 0
+    while pos < len(raw):  # protobuf-varint
+        b = raw[pos]; pos += 1
+        length |= (b & 0x7F) << shift; shift += 7
+        if not b & 0x80: break
+    else:
+        return None
+    try:
+        url = raw[pos:pos + length].decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if len(url) != length or not url.startswith(("http://", "https://")) or any(h in url for h in GOOGLE_HOSTS):
+        return None
+    return url
+
+# Egen brytare för artikelupplösningen: timeouter där får inte stänga RSS-sökningarna på news.google.com
+GNEWS_ARTICLE_BREAKER = "news.google.com/articles"
 
-def resolve_final_url(u: str) -> str:
+def resolve_final_url(u: str, breaker: str = GNEWS_ARTICLE_BREAKER) -> str:
     if not u: 
         return u
     try:
-        r = requests.head(u, headers=UA_HEADERS, timeout=10, allow_redirects=True)
+        r = HTTP.head(u, headers=UA_HEADERS, timeout=10, allow_redirects=True, breaker=breaker)
         # Om vi landar på Google → prova GET
         if any(h in r.url for h in GOOGLE_HOSTS):
             raise HTTPError("Still on Google after HEAD")
@@ -204,7 +1358,7 @@ def resolve_final_url(u: str) -> str:
         return r.url
     except Exception:
         try:
-            r = requests.get(u, headers=UA_HEADERS, timeout=12, allow_redirects=True)
+            r = HTTP.get(u, headers=UA_HEADERS, timeout=12, allow_redirects=True, breaker=breaker)
             if any(h in r.url for h in GOOGLE_HOSTS):
                 # prova att skrapa HTML efter extern länk
                 ext = _extract_external_from_news_html(r.text)
@@ -216,18 +1370,39 @@ def resolve_final_url(u: str) -> str:
         except Exception:
             return u
 
+# Google News GUID/länk → (original-URL, källnamn); misslyckanden minns kort så de inte provas om direkt
+GNEWS_URL_CACHE = DiskCache("gnews_urls", ttl_seconds=GNEWS_URL_TTL_H * 3600, max_entries=GNEWS_URL_CACHE_MAX)
+
 def extract_original_from_gnews_entry(entry):
-    # 1) Försök: plocka direkt från summary (oftast säkrast)
-    summary = getattr(entry, "summary", "") or ""
-    href = _first_external_href_from_html(summary)
+    ck = getattr(entry, "id", "") or getattr(entry, "link", "")
+    if ck:
+        hit = GNEWS_URL_CACHE.get(ck)
+        if hit: return hit
+    final, source_name, ok = _resolve_gnews_entry(entry)
+    if ck:
+        GNEWS_URL_CACHE.set(ck, (final, source_name), ttl_seconds=None if ok else GNEWS_URL_FAIL_TTL_M * 60)
+    return final, source_name
+
+@METRICS.timed("url:upplösning")
+def _resolve_gnews_entry(entry):
+    """(url, källnamn, lyckades) – lyckades=False när vi bara har news-länken kvar."""
     src_title = ""
     src_obj = getattr(entry, "source", None) or getattr(entry, "source_detail", None) or {}
     try:
         src_title = getattr(src_obj, "title", "") or src_obj.get("title","")
     except Exception:
         pass
+
+    # 0) Avkoda artikel-token lokalt (ingen HTTP)
+    decoded = decode_gnews_article_url(getattr(entry, "link", ""))
+    if decoded:
+        return decoded, (src_title or urlparse(decoded).netloc.replace("www.","")), True
+
+    # 1) Försök: plocka direkt från summary (oftast säkrast)
+    summary = getattr(entry, "summary", "") or ""
+    href = _first_external_href_from_html(summary)
     if href:
-        return href, (src_title or urlparse(href).netloc.replace("www.",""))
+        return href, (src_title or urlparse(href).netloc.replace("www.","")), True
 
     # 2) Hantera consent → news → original
     link = getattr(entry, "link", "")
@@ -235,7 +1410,7 @@ def extract_original_from_gnews_entry(entry):
     if link:
         # Följ/läs news-sidan och plocka första icke-Google-länk
         try:
-            r = requests.get(link, headers=UA_HEADERS, timeout=12, allow_redirects=True)
+            r = HTTP.get(link, headers=UA_HEADERS, timeout=12, allow_redirects=True, breaker=GNEWS_ARTICLE_BREAKER)
             if not any(h in r.url for h in GOOGLE_HOSTS):
                 # Vi hamnade direkt på extern sajt
                 final = r.url
@@ -243,19 +1418,20 @@ def extract_original_from_gnews_entry(entry):
                 # Skrapa HTML
                 final = _extract_external_from_news_html(r.text)
             if final:
-                return final, (src_title or urlparse(final).netloc.replace("www.",""))
+                return final, (src_title or urlparse(final).netloc.replace("www.","")), True
         except Exception:
             pass
 
     # 3) Sista utvägen: prova HEAD/GET-resolve
     final = resolve_final_url(link)
     if final and not any(h in final for h in GOOGLE_HOSTS):
-        return final, (src_title or urlparse(final).netloc.replace("www.",""))
+        return final, (src_title or urlparse(final).netloc.replace("www.","")), True
 
     # 4) Ge upp – returnera news-länken med källnamn
     dom = (urlparse(link).netloc or "").replace("www.","")
-    return link, (src_title or dom or "Källa")
+    return link, (src_title or dom or "Källa"), False
 
+@METRICS.timed("källa:snippets")
 def gnews_snippets_sv(query, max_items=3, max_age_hours=72):
     q = f"{query} when:3d"
     url = f"https://news.google.com/rss/search?q={quote(q)}&hl=sv-SE&gl=SE&ceid=SE:sv"
@@ -274,13 +1450,14 @@ def gnews_snippets_sv(query, max_items=3, max_age_hours=72):
     return items
 
 # === Wikipedia: idag → igår → i förrgår, filtrera meta-sidor ===
+@polled("wiki")
 def wiki_top_sv(limit=10):
     META_PREFIXES = ("Special:", "Huvudsida", "Portal:", "Wikipedia:", "Mall:", "Kategori:", "Diskussion:", "Användare:", "Fil:", "Wikidata:")
     for back in [0,1,2]:
         date_str = (datetime.now(timezone.utc) - timedelta(days=back)).strftime("%Y/%m/%d")
         url = f"https://wikimedia.org/api/rest_v1/metrics/pageviews/top/sv.wikipedia/all-access/{date_str}"
         try:
-            r = requests.get(url, headers=UA_HEADERS, timeout=15)
+            r = HTTP.get(url, headers=UA_HEADERS, timeout=15)
             r.raise_for_status()
             items = r.json().get("items", [])
             if not items: 
@@ -303,10 +1480,11 @@ def wiki_top_sv(limit=10):
     return []
 
 # === Reddit: JSON → RSS fallback ===
+@polled("reddit")
 def reddit_top_sweden(limit=10):
     url_json = "https://www.reddit.com/r/sweden/top/.json?t=day&limit=20"
     try:
-        r = requests.get(url_json, headers={"User-Agent": UA_HEADERS["User-Agent"]}, timeout=15)
+        r = HTTP.get(url_json, headers={"User-Agent": UA_HEADERS["User-Agent"]}, timeout=15, breaker="www.reddit.com/json")
         r.raise_for_status()
         titles = []
         for c in r.json().get("data",{}).get("children",[]):
@@ -317,7 +1495,7 @@ def reddit_top_sweden(limit=10):
         print("⚠️ reddit_top_sweden fel:", e)
     try:
         feed = fetch_rss("https://www.reddit.com/r/sweden/top/.rss?t=day&limit=20")
-        titles = [e.title for e in (feed.entries or [])]
+        titles = [e.title for e in islice(feed.entries or [], limit)]
         if titles:
             print(f"▶ reddit fallback via RSS: {len(titles)} titlar")
         return titles[:limit]
@@ -326,13 +1504,14 @@ def reddit_top_sweden(limit=10):
         return []
 
 # === YouTube trending (valfritt) ===
+@polled("youtube")
 def youtube_trending_titles(limit=10):
     if not YT_API_KEY: return []
     try:
         url = ("https://www.googleapis.com/youtube/v3/videos"
                f"?part=snippet&chart=mostPopular&regionCode={quote(YT_REGION)}"
                f"&maxResults={min(limit,50)}&key={quote(YT_API_KEY)}")
-        r = requests.get(url, timeout=15)
+        r = HTTP.get(url, timeout=15)
         r.raise_for_status()
         items = r.json().get("items", [])
         return [it["snippet"]["title"] for it in items if "snippet" in it][:limit]
@@ -341,18 +1520,22 @@ def youtube_trending_titles(limit=10):
         return []
 
 # === Samling av feedtitlar (med åldersfilter) ===
+@polled("feeds")
 def feed_titles(feed_urls, max_items=20, max_age_days=14):
     items = []
     cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
     for u in feed_urls:
         feed = fetch_rss(u)
+        scan = FEED_MARKS.scan(u)
         for e in (feed.entries or []):
             dt = parse_entry_dt(e)
-            if not dt or dt < cutoff:
+            if not dt or dt < cutoff or not scan.is_new(dt, _entry_id(e)):
                 continue
             items.append((e.title, getattr(e, "link", u)))
+            scan.take(e.title, dt, _entry_id(e))
             if len(items) >= max_items:
                 break
+        scan.close()
         if len(items) >= max_items:
             break
     return items
@@ -362,48 +1545,34 @@ def prylradar_items(max_items=12, max_age_days=14):
     items = []
     items.extend(feed_titles(PRYL_FEEDS_SV, max_items=max_items, max_age_days=max_age_days))
     if len(items) < max_items:
-        for q in PRYL_QUERIES:
-            for domain in ["site:surfa.se", "site:m3.idg.se", "site:mobil.se", "site:sweclockers.com",
-                           "site:feber.se", "site:nyteknik.se"]:
-                ts = gnews_recent_titles(f"{q} {domain}", max_items=3, max_age_hours=max_age_days*24)
-                for t in ts:
-                    items.append((t, ""))  # origin ok
-                    if len(items) >= max_items:
-                        break
-                if len(items) >= max_items: break
-            if len(items) >= max_items: break
+        ts = gnews_planned_titles(PRYL_QUERIES, PRYL_SITES, per_pair=3, max_items=max_items - len(items),
+                                  max_age_hours=max_age_days*24)
+        items.extend((t, "") for t in ts)  # origin ok
     if len(items) < max_items:
         items.extend(feed_titles(PRYL_FEEDS_INT, max_items=max_items - len(items), max_age_days=max_age_days))
     return items[:max_items]
 
 # === Rubrikstädning + svenskifiering ===
+SWEDISHIFY_REPL = {
+    r"\bupdate\b": "uppdatering",
+    r"\breview\b": "recension",
+    r"\blaunch\b": "lansering",
+    r"\brollout\b": "utrullning",
+    r"\bstable\b": "stabil",
+    r"\bnow rolling out\b": "utrullas nu",
+    r"\bis rolling out\b": "utrullas",
+    r"\bwill (likely )?feature\b": "väntas få",
+    r"\bis finally headed to\b": "lanseras i",
+    r"\bcoming to\b": "kommer till",
+    r"\bteases?\b": "teasar",
+    r"\bleaked\b": "läckt",
+}
+
 def clean_topic_title(t: str) -> str:
-    t = t.strip()
-    t = re.sub(r'^(JUST NU:|DN Direkt\s*-\s*|LIVE:|AB:\s*|Aftonbladet:\s*|Expressen:\s*)\s*', '', t, flags=re.I)
-    if re.match(r'^(se\s|ett inlägg i\s*”?se)', t, flags=re.I):
-        return ""  # tv-promo
-    t = re.sub(r'\s+[–-]\s+[^\-–—|:]{2,}$', '', t).strip()
-    return t
+    return SCORER.clean(t)
 
 def swedishify_title_if_needed(title: str) -> str:
-    t = title.strip()
-    repl = {
-        r"\bupdate\b": "uppdatering",
-        r"\breview\b": "recension",
-        r"\blaunch\b": "lansering",
-        r"\brollout\b": "utrullning",
-        r"\bstable\b": "stabil",
-        r"\bnow rolling out\b": "utrullas nu",
-        r"\bis rolling out\b": "utrullas",
-        r"\bwill (likely )?feature\b": "väntas få",
-        r"\bis finally headed to\b": "lanseras i",
-        r"\bcoming to\b": "kommer till",
-        r"\bteases?\b": "teasar",
-        r"\bleaked\b": "läckt",
-    }
-    for k,v in repl.items():
-        t = re.sub(k, v, t, flags=re.I)
-    return clean_topic_title(t)
+    return SCORER.swedishify(title)
 
 # === “Svenskhet” heuristik + poängsystem ===
 SV_DOMAINS = {"svt.se","svtplay.se","sr.se","aftonbladet.se","expressen.se","dn.se","svd.se","gp.se","nyheter24.se",
@@ -414,30 +1583,10 @@ SPORT_WORDS = {"allsvenskan","shl","slutspel","kvartsfinal","semifinal","landsla
 SE_WORDS = {"sverige","svensk","svenska","stockholm","göteborg","malmö","umeå","luleå","umea","lulea","örebro","uppsala","borås","boras"}
 
 def is_probably_swedish(title: str) -> bool:
-    if re.search(r"[åäöÅÄÖ]", title): return True
-    return bool(re.search(r"\b(är|och|eller|men|som|på|för|med|utan|en|ett|det|den|i|från)\b", title, flags=re.I))
+    return SCORER.is_probably_swedish(title)
 
 def score_candidate(title: str, cat_slug: str, origin: str):
-    score = 0; reasons = {}
-    if is_probably_swedish(title): score += 3; reasons["åäö/sv-ord"] = +3
-    dom = ""
-    if origin:
-        try: dom = urlparse(origin).netloc.lower()
-        except Exception: dom = ""
-    if dom:
-        if dom.endswith(".se") or dom in SV_DOMAINS: score += 3; reasons[".se/domän"] = +3
-        elif not dom.endswith(".com"): score -= 1; reasons["utländsk domän"] = -1
-    if any(w in title.lower() for w in SE_WORDS): score += 2; reasons["Sverige-ord"] = +2
-    if cat_slug == "sport" and any(w in title.lower() for w in SPORT_WORDS): score += 2; reasons["sport-ord"] = +2
-    if cat_slug in ("prylradar","teknik-prylar","gaming-esport") and re.search(r"\b(lanser|släpper|uppdatering|recension|test|release|utrullning)\b", title, flags=re.I):
-        score += 2; reasons["pryl-signal"] = +2
-    if re.search(r"\b(India|Indien|China|Kina|USA|US|UK)\b", title) and not any(w in title.lower() for w in ("sverige","svensk","stockholm","göteborg","malmö")):
-        score -= 2; reasons["utlandsfokus"] = -2
-    L = len(title)
-    if L < 28: score -= 1; reasons["för kort"] = -1
-    elif L > 120: score -= 1; reasons["för lång"] = -1
-    else: score += 1; reasons["lagom längd"] = +1
-    return score, reasons
+    return SCORER.score(title, cat_slug, origin)
 
 def reasons_to_str(d: dict) -> str:
     if not d: return "{}"
@@ -452,68 +1601,252 @@ CLICKBAIT_PATTERNS = [
     r"\b[a-zåäö]+s\s+kvinna\b",            # poss. form som reducerar person till “kvinna”
 ]
 def is_clickbait_title(t: str) -> bool:
-    low = t.lower()
-    return any(re.search(p, low, flags=re.I) for p in CLICKBAIT_PATTERNS)
+    return SCORER.is_clickbait(t)
+
+# === Poängmotor: alla mönster och ordlistor kompileras en gång ===
+@lru_cache(maxsize=4096)
+def _origin_domain(origin: str) -> str:
+    try: return urlparse(origin).netloc.lower()
+    except Exception: return ""
+
+def _word_alternation(words):
+    # Längsta först; search() hittar något ord ⇔ något ord finns som delsträng (som any(w in s ...))
+    return re.compile("|".join(re.escape(w) for w in sorted(words, key=len, reverse=True)))
+
+class ScoringEngine:
+    """Rubrikstädning, svenskhet, clickbait och poäng med förkompilerade mönster.
+    Ger exakt samma titlar, poäng och skäl (i samma ordning) som de gamla regex-/substring-looparna."""
+    PRYL_CATS = ("prylradar", "teknik-prylar", "gaming-esport")
+
+    def __init__(self, se_words=SE_WORDS, sport_words=SPORT_WORDS, sv_domains=SV_DOMAINS,
+                 clickbait=CLICKBAIT_PATTERNS, swedishify=SWEDISHIFY_REPL):
+        self.sv_domains = frozenset(sv_domains)
+        self._se = _word_alternation(se_words)
+        self._sport = _word_alternation(sport_words)
+        self._home = _word_alternation(("sverige","svensk","stockholm","göteborg","malmö"))
+        self._sv_chars = re.compile(r"[åäöÅÄÖ]")
+        self._sv_words = re.compile(r"\b(är|och|eller|men|som|på|för|med|utan|en|ett|det|den|i|från)\b", re.I)
+        self._pryl = re.compile(r"\b(lanser|släpper|uppdatering|recension|test|release|utrullning)\b", re.I)
+        self._foreign = re.compile(r"\b(India|Indien|China|Kina|USA|US|UK)\b")
+        self._clickbait = re.compile("|".join(f"(?:{p})" for p in clickbait), re.I)
+        self._prefix = re.compile(r'^(JUST NU:|DN Direkt\s*-\s*|LIVE:|AB:\s*|Aftonbladet:\s*|Expressen:\s*)\s*', re.I)
+        self._promo = re.compile(r'^(se\s|ett inlägg i\s*”?se)', re.I)
+        self._suffix = re.compile(r'\s+[–-]\s+[^\-–—|:]{2,}$')
+        # Ersättningarna körs i ordning som förr, men bara om någon av dem alls matchar
+        self._sw_any = re.compile("|".join(f"(?:{k})" for k in swedishify), re.I)
+        self._sw = [(re.compile(k, re.I), v) for k, v in swedishify.items()]
+
+    def clean(self, t: str) -> str:
+        t = self._prefix.sub('', t.strip(), count=1)
+        if self._promo.match(t):
+            return ""  # tv-promo
+        if "-" in t or "–" in t:  # källsuffixet kräver ett bindestreck
+            t = self._suffix.sub('', t)
+        return t.strip()
+
+    def swedishify(self, title: str) -> str:
+        t = title.strip()
+        if self._sw_any.search(t):
+            for rx, v in self._sw:
+                t = rx.sub(v, t)
+        return self.clean(t)
+
+    def is_probably_swedish(self, title: str) -> bool:
+        return bool(self._sv_chars.search(title) or self._sv_words.search(title))
+
+    def is_clickbait(self, t: str) -> bool:
+        return bool(self._clickbait.search(t.lower()))
+
+    def _score(self, title: str, origin: str, sport: bool, pryl: bool):
+        score = 0; reasons = {}
+        if self.is_probably_swedish(title): score += 3; reasons["åäö/sv-ord"] = +3
+        dom = _origin_domain(origin) if origin else ""
+        if dom:
+            if dom.endswith(".se") or dom in self.sv_domains: score += 3; reasons[".se/domän"] = +3
+            elif not dom.endswith(".com"): score -= 1; reasons["utländsk domän"] = -1
+        low = title.lower()
+        if self._se.search(low): score += 2; reasons["Sverige-ord"] = +2
+        if sport and self._sport.search(low): score += 2; reasons["sport-ord"] = +2
+        if pryl and self._pryl.search(title):
+            score += 2; reasons["pryl-signal"] = +2
+        if self._foreign.search(title) and not self._home.search(low):
+            score -= 2; reasons["utlandsfokus"] = -2
+        L = len(title)
+        if L < 28: score -= 1; reasons["för kort"] = -1
+        elif L > 120: score -= 1; reasons["för lång"] = -1
+        else: score += 1; reasons["lagom längd"] = +1
+        return score, reasons
+
+    def score(self, title: str, cat_slug: str, origin: str):
+        return self._score(title, origin, cat_slug == "sport", cat_slug in self.PRYL_CATS)
+
+    def score_many(self, titles, cat_slug: str, origins=None) -> list:
+        """[(poäng, skäl)] för en hel pool i samma kategori; origins (valfri) följer titlarna."""
+        sport, pryl = cat_slug == "sport", cat_slug in self.PRYL_CATS
+        if origins is None:
+            return [self._score(t, "", sport, pryl) for t in titles]
+        return [self._score(t, o, sport, pryl) for t, o in zip(titles, origins)]
+
+SCORER = ScoringEngine()
+
+# === Nära-dubbletter: MinHash-LSH över titelshinglar ===
+_MH_PRIME = (1 << 61) - 1
+_mh_rng = random.Random(0x7E4D)
+_MH_PARAMS = [(_mh_rng.randrange(1, _MH_PRIME), _mh_rng.randrange(0, _MH_PRIME)) for _ in range(32)]
+
+def title_shingles(title: str, k: int = 4) -> frozenset:
+    s = normalize_title_key(title)
+    if len(s) <= k: return frozenset([s]) if s else frozenset()
+    return frozenset(s[i:i+k] for i in range(len(s) - k + 1))
+
+class NearDupIndex:
+    """Titlar som tecken-4-gram; MinHash-signatur (32 hashar) delas i 16 band à 2 rader.
+    Kandidater = titlar som delar minst ett band, beslut = exakt Jaccard >= threshold."""
+    BANDS, ROWS = 16, 2
+
+    def __init__(self, threshold: float = None):
+        self.threshold = NEAR_DUP_THRESHOLD if threshold is None else threshold
+        self._items = []     # [(titel, shinglar, etikett)]
+        self._buckets = {}   # (band, radvärden) -> [index i _items]
+
+    def __len__(self): return len(self._items)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _signature(sh):
+        hs = [int.from_bytes(hashlib.blake2b(x.encode("utf-8"), digest_size=8).digest(), "little") for x in sh]
+        return tuple(min((a * h + b) % _MH_PRIME for h in hs) for a, b in _MH_PARAMS)
+
+    def _bands(self, sig):
+        for i in range(self.BANDS):
+            yield (i, tuple(sig[i*self.ROWS:(i+1)*self.ROWS]))
+
+    def find(self, title: str, skip_labels=()):
+        """Mest lika indexerade titel över tröskeln som (likhet, titel, etikett), annars None.
+        Titlar med en etikett i skip_labels räknas inte."""
+        sh = title_shingles(title)
+        if not sh or not self._items: return None
+        cands = set()
+        for band in self._bands(self._signature(sh)):
+            cands.update(self._buckets.get(band, ()))
+        best = None
+        for i in cands:
+            other, osh, label = self._items[i]
+            if label in skip_labels: continue
+            sim = len(sh & osh) / len(sh | osh)
+            if sim >= self.threshold and (best is None or sim > best[0]):
+                best = (sim, other, label)
+        return best
+
+    def add(self, title: str, label: str = ""):
+        sh = title_shingles(title)
+        if not sh: return
+        idx = len(self._items); self._items.append((title, sh, label))
+        for band in self._bands(self._signature(sh)):
+            self._buckets.setdefault(band, []).append(idx)
+
+    def is_near_dup(self, title: str, skip_labels=()) -> bool:
+        hit = self.find(title, skip_labels)
+        if hit:
+            sim, other, label = hit
+            print(f"🔀 Nära-dubblett ({sim:.2f}) släpps: \"{title}\" ≈ \"{other}\"" + (f" [{label}]" if label else ""))
+        return bool(hit)
+
+def _wp_dup_exempt(title: str) -> tuple:
+    """Väder-/sporthändelser ska likna den publicerade posten – de går vidare till uppdateringsvägen i stället."""
+    return ("WP",) if mergeable_event_key(title) else ()
 
 # === Kandidater per kategori ===
-def pick_diverse_topics(max_total):
-    print(f"▶ YouTube {'ON' if YT_API_KEY else 'OFF'} (region {YT_REGION})")
-    seen_keys = set(); picked = []
-    for cat in CATEGORIES:
-        quota = CATEGORY_QUOTA.get(cat["slug"], 0)
-        if quota <= 0: continue
-        pool = []
-        if cat["slug"] == "sport":
-            for q in SPORT_QUERIES:
-                for t in gnews_recent_titles(q, max_items=6, max_age_hours=72): pool.append((t, ""))
-        elif cat["slug"] == "prylradar":
-            pool.extend(prylradar_items(max_items=24, max_age_days=14))
-        elif cat["slug"] == "viralt-trend":
-            wiki = wiki_top_sv(limit=15); reddit = reddit_top_sweden(limit=15); yt = youtube_trending_titles(limit=15)
+def _submit_category_sources(ex, cat):
+    """Skicka kategorins källanrop till poolen direkt; returnerar en funktion som väntar in och slår ihop
+    resultaten i samma ordning som den sekventiella hämtningen gav."""
+    slug = cat["slug"]
+    if slug == "sport":
+        fut = ex.submit(gnews_planned_titles, SPORT_QUERIES, per_pair=6, max_age_hours=72)
+        return lambda: [(t, "") for t in fut.result()]
+    if slug == "prylradar":
+        return ex.submit(prylradar_items, max_items=24, max_age_days=14).result
+    if slug == "viralt-trend":
+        f_wiki = ex.submit(wiki_top_sv, limit=15)
+        f_reddit = ex.submit(reddit_top_sweden, limit=15)
+        f_yt = ex.submit(youtube_trending_titles, limit=15)
+        def merge():
+            wiki, reddit, yt = f_wiki.result(), f_reddit.result(), f_yt.result()
             print(f"▶ Viralt pool: wiki={len(wiki)} reddit={len(reddit)} youtube={len(yt)}")
-            pool += [(t, "") for t in wiki] + [(t, "") for t in reddit] + [(t, "") for t in yt]
-        else:
-            for t in gnews_recent_titles(cat["query"], max_items=18, max_age_hours=48): pool.append((t, ""))
-
-        ranked = []
-        for tup in pool:
-            title, origin = tup if isinstance(tup, tuple) else (tup, "")
-            clean = clean_topic_title(title)
-            if not clean or is_clickbait_title(clean): 
-                continue
-            if cat["slug"] in ("prylradar","teknik-prylar"): clean = swedishify_title_if_needed(clean)
-            key = normalize_title_key(clean)
-            if key in seen_keys: continue
-            sc, why = score_candidate(clean, cat["slug"], origin)
-            ranked.append({"title": clean, "origin": origin, "cat_slug": cat["slug"], "cat_name": cat["name"], "score": sc, "why": why, "key": key})
-
-        thr = WOW_THRESHOLD.get(cat["slug"], 3)
-        ranked = [r for r in ranked if r["score"] >= thr]
-        ranked.sort(key=lambda x: x["score"], reverse=True)
-
-        for r in ranked[:3]:
-            print(f"🧪 {cat['slug']} kandidat: {r['title']} | score={r['score']} {reasons_to_str(r['why'])}")
-
-        count = 0
-        for r in ranked:
-            if count >= quota or len(picked) >= max_total: break
-            if r["key"] in seen_keys: continue
-            picked.append(r); seen_keys.add(r["key"]); count += 1
-        if len(picked) >= max_total: break
-
-    if len(picked) < max_total:
-        extras = gnews_recent_titles("Sverige", max_items=50, max_age_hours=48)
-        for t in extras:
-            if len(picked) >= max_total: break
-            clean = clean_topic_title(t)
-            if not clean or is_clickbait_title(clean): continue
-            key = normalize_title_key(clean)
-            if key in seen_keys: continue
-            sc, why = score_candidate(clean, "nyheter", "")
-            if sc >= WOW_THRESHOLD.get("nyheter", 3):
-                picked.append({"title": clean, "origin": "", "cat_slug": "nyheter", "cat_name": "Nyheter", "score": sc, "why": why, "key": key})
-                seen_keys.add(key)
-    return picked
+            return [(t, "") for t in wiki] + [(t, "") for t in reddit] + [(t, "") for t in yt]
+        return merge
+    fut = ex.submit(gnews_recent_titles, cat["query"], max_items=18, max_age_hours=48)
+    return lambda: [(t, "") for t in fut.result()]
+
+def iter_diverse_topics(max_total, near_dups: NearDupIndex = None):
+    """Generator: ger kategoriernas val så fort kategorins källor är klara (i CATEGORIES-ordning),
+    medan senare kategorier fortfarande hämtas. Avbryts generatorn släpps ej påbörjade hämtningar."""
+    print(f"▶ YouTube {'ON' if YT_API_KEY else 'OFF'} (region {YT_REGION})")
+    seen_keys = set(); picked = 0
+    near_dups = near_dups if near_dups is not None else NearDupIndex()
+    ex = ThreadPoolExecutor(max_workers=max(1, FETCH_WORKERS), thread_name_prefix="fetch")
+    try:
+        # Alla källor skickas iväg på en gång; sammanslagningen nedan går i CATEGORIES-ordning
+        pools = [(cat, _submit_category_sources(ex, cat)) for cat in CATEGORIES if CATEGORY_QUOTA.get(cat["slug"], 0) > 0]
+        extras_fut = ex.submit(gnews_recent_titles, "Sverige", max_items=50, max_age_hours=48)
+
+        for cat, pool_result in pools:
+            quota = CATEGORY_QUOTA.get(cat["slug"], 0)
+            pool = pool_result()
+
+            ranked = []
+            for tup in pool:
+                title, origin = tup if isinstance(tup, tuple) else (tup, "")
+                clean = clean_topic_title(title)
+                if not clean or is_clickbait_title(clean): 
+                    continue
+                if cat["slug"] in ("prylradar","teknik-prylar"): clean = swedishify_title_if_needed(clean)
+                key = normalize_title_key(clean)
+                if key in seen_keys: continue
+                ranked.append({"title": clean, "origin": origin, "cat_slug": cat["slug"], "cat_name": cat["name"], "key": key})
+            scores = SCORER.score_many([r["title"] for r in ranked], cat["slug"], [r["origin"] for r in ranked])
+            for r, (sc, why) in zip(ranked, scores):
+                r["score"] = sc; r["why"] = why
+            FEED_MARKS.commit(tup[0] if isinstance(tup, tuple) else tup for tup in pool)   # poolen är nu bedömd
+
+            thr = WOW_THRESHOLD.get(cat["slug"], 3)
+            ranked = [r for r in ranked if r["score"] >= thr]
+            ranked.sort(key=lambda x: x["score"], reverse=True)
+
+            for r in ranked[:3]:
+                print(f"🧪 {cat['slug']} kandidat: {r['title']} | score={r['score']} {reasons_to_str(r['why'])}")
+
+            count = 0
+            for r in ranked:
+                if count >= quota or picked >= max_total: break
+                if r["key"] in seen_keys or near_dups.is_near_dup(r["title"], _wp_dup_exempt(r["title"])): continue
+                seen_keys.add(r["key"]); near_dups.add(r["title"], r["cat_slug"]); count += 1; picked += 1
+                yield r
+            if picked >= max_total: break
+
+        if picked < max_total:
+            extras = extras_fut.result()
+            judged = []
+            try:
+                for t in extras:
+                    if picked >= max_total: break
+                    judged.append(t)
+                    clean = clean_topic_title(t)
+                    if not clean or is_clickbait_title(clean): continue
+                    key = normalize_title_key(clean)
+                    if key in seen_keys: continue
+                    sc, why = score_candidate(clean, "nyheter", "")
+                    if sc >= WOW_THRESHOLD.get("nyheter", 3) and not near_dups.is_near_dup(clean, _wp_dup_exempt(clean)):
+                        seen_keys.add(key); near_dups.add(clean, "nyheter"); picked += 1
+                        yield {"title": clean, "origin": "", "cat_slug": "nyheter", "cat_name": "Nyheter", "score": sc, "why": why, "key": key}
+            finally:
+                FEED_MARKS.commit(judged)   # bara de som hann bedömas
+    finally:
+        # Normalt är allt redan klart; vid tidigt stopp avbryts det som inte hunnit starta
+        ex.shutdown(wait=False, cancel_futures=True)
+
+def pick_diverse_topics(max_total, near_dups: NearDupIndex = None):
+    return list(iter_diverse_topics(max_total, near_dups))
 
 # === Text / utdrag ===
 def make_excerpt(raw_text: str, max_chars=160) -> str:
@@ -544,25 +1877,30 @@ def text_to_html(txt: str) -> str:
     return "\n".join(parts) if parts else "<p></p>"
 
 # === OpenAI sammanfattning (folkbildningsläge, utan synlig rubrik) ===
-def openai_chat_summarize(topic, snippets, model="gpt-5"):
-    system = (
-      "Skriv på enkel svenska (ca högstadienivå), 110–150 ord. Ingen rubrik och ingen etikett som 'Enkelt förklarat'.\n"
-      "Struktur (utan rubriker i texten):\n"
-      "• Första meningen: vardagsnära sammanfattning (undvik jargong; förklara ev. facktermer kort i parentes).\n"
-      "• Detta har hänt: 1–2 meningar (med namn, siffror/datum om finns).\n"
-      "• Varför det spelar roll: 1–2 meningar (påverkan i Sverige, pris/tid/risk/omfång).\n"
-      "• Så påverkar det dig: 2–4 punkter som börjar med '- ' (konkreta vardagseffekter i Sverige).\n"
-      "• Vad händer härnäst: 1 mening (nästa steg med datum/trigger).\n"
-      "Avsluta med: 'Affiliate-idéer:' och 1–2 punkter som börjar med '- '."
-    )
+SUMMARY_SYSTEM_PROMPT = (
+  "Skriv på enkel svenska (ca högstadienivå), 110–150 ord. Ingen rubrik och ingen etikett som 'Enkelt förklarat'.\n"
+  "Struktur (utan rubriker i texten):\n"
+  "• Första meningen: vardagsnära sammanfattning (undvik jargong; förklara ev. facktermer kort i parentes).\n"
+  "• Detta har hänt: 1–2 meningar (med namn, siffror/datum om finns).\n"
+  "• Varför det spelar roll: 1–2 meningar (påverkan i Sverige, pris/tid/risk/omfång).\n"
+  "• Så påverkar det dig: 2–4 punkter som börjar med '- ' (konkreta vardagseffekter i Sverige).\n"
+  "• Vad händer härnäst: 1 mening (nästa steg med datum/trigger).\n"
+  "Avsluta med: 'Affiliate-idéer:' och 1–2 punkter som börjar med '- '."
+)
+# Ändras prompten byts versionen → gamla cachade sammanfattningar används inte längre
+SUMMARY_PROMPT_VERSION = hashlib.sha1(SUMMARY_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+@METRICS.timed("openai:anrop")
+def openai_chat_summarize(topic, snippets, model="gpt-5", read_timeout=OPENAI_READ_TIMEOUT_S):
     snip = "; ".join([f"{s['title']} ({s['link']})" for s in snippets]) if snippets else "Inga källsnuttar"
     payload = {"model": model,
-               "messages": [{"role":"system","content":system},
+               "messages": [{"role":"system","content":SUMMARY_SYSTEM_PROMPT},
                             {"role":"user","content": f"Ämne: {topic}\nNyhetssnuttar: {snip}"}]}
-    resp = requests.post("https://api.openai.com/v1/chat/completions",
-                         headers={"Authorization": f"Bearer {OPENAI_API_KEY}",
-                                  "Content-Type": "application/json"},
-                         json=payload, timeout=60)
+    resp = HTTP.post("https://api.openai.com/v1/chat/completions",
+                     headers={"Authorization": f"Bearer {OPENAI_API_KEY}",
+                              "Content-Type": "application/json"},
+                     json=payload, timeout=(OPENAI_CONNECT_TIMEOUT_S, read_timeout), retry=True, retries=1,
+                     breaker=f"api.openai.com/{model}")   # per modell: ett gpt-5 som är nere får inte stänga gpt-5-mini
     try:
         resp.raise_for_status()
     except requests.HTTPError:
@@ -570,201 +1908,542 @@ def openai_chat_summarize(topic, snippets, model="gpt-5"):
         raise
     return resp.json()["choices"][0]["message"]["content"].strip()
 
+# Innehållsadresserad cache: samma ämne + samma källänkar + modell + promptversion → samma text
+SUMMARY_CACHE = DiskCache("summaries", ttl_seconds=SUMMARY_CACHE_TTL_H * 3600, max_entries=SUMMARY_CACHE_MAX)
+
+def summary_cache_key(topic, snippets, model) -> str:
+    links = sorted(s.get("link") or "" for s in (snippets or []))
+    raw = "\x1f".join([normalize_title_key(topic), *links, model, SUMMARY_PROMPT_VERSION])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+@METRICS.timed("openai:sammanfattning")
 def summarize_with_retries(topic, snippets):
+    # 429/5xx/anslutningsfel omförsöks en gång i HTTP-klienten (aldrig ReadTimeout); här faller vi bara
+    # vidare till nästa modell, så länge OPENAI_DEADLINE_S inte har gått
     models = ["gpt-5", "gpt-5-mini"]
+    keys = {summary_cache_key(topic, snippets, model): model for model in models}
+    key, cached = SUMMARY_CACHE.get_first(keys)   # en uppslagning per ämne, oavsett antal modeller
+    if cached:
+        print(f"💾 Sammanfattning från cache ({keys[key]}): {topic}")
+        return cached
+    deadline = time.monotonic() + OPENAI_DEADLINE_S
     for model in models:
-        for attempt in range(2):
-            try:
-                return openai_chat_summarize(topic, snippets, model=model)
-            except ReadTimeout:
-                wait = 2 ** attempt
-                print(f"⏳ OpenAI timeout ({model}) – försöker igen om {wait}s...")
-                time.sleep(wait); continue
-            except HTTPError as e:
-                print("OpenAI HTTPError:", e); break
-            except RequestException as e:
-                print("OpenAI RequestException:", e); break
-            except Exception as e:
-                print("OpenAI annat fel:", e); break
+        left = deadline - time.monotonic()
+        if left < OPENAI_CONNECT_TIMEOUT_S:
+            print(f"⏳ OpenAI: tidsgränsen {OPENAI_DEADLINE_S:.0f} s nådd – hoppar över {model}")
+            break
+        try:
+            text = openai_chat_summarize(topic, snippets, model=model, read_timeout=min(OPENAI_READ_TIMEOUT_S, left))
+            SUMMARY_CACHE.set(summary_cache_key(topic, snippets, model), text)
+            return text
+        except ReadTimeout:
+            print(f"⏳ OpenAI timeout ({model}) – provar nästa modell...")
+        except HTTPError as e:
+            print("OpenAI HTTPError:", e)
+        except RequestException as e:
+            print("OpenAI RequestException:", e)
+        except Exception as e:
+            print("OpenAI annat fel:", e)
     raise Exception("Alla modellförsök misslyckades")
 
+# OpenAI-steget: N anrop i luften samtidigt, token bucket framför api.openai.com
+class SummaryPipeline:
+    """Kör summarize_with_retries i en begränsad trådpool; submit() ger en Future per ämne."""
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._ex = None; self._lock = threading.Lock()
+
+    def submit(self, topic, snippets):
+        with self._lock:
+            if self._ex is None:
+                self._ex = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="openai")
+        return self._ex.submit(summarize_with_retries, topic, snippets)
+
+SUMMARIZER = SummaryPipeline(OPENAI_CONCURRENCY)
+
 # === WordPress ===
-def wp_post_trend(title, body, topics=None, categories=None, excerpt=""):
+@METRICS.timed("wp:post")
+def wp_post_trend(title, body, topics=None, categories=None, excerpt="", featured_media=None, social_url=None):
     url = f"{WP_BASE_URL}/wp-json/trendkollen/v1/ingest"
     payload = {"title": title,"content": body,"excerpt": excerpt,
                "topics": topics or [],"categories": categories or []}
-    resp = requests.post(url, json=payload, auth=(WP_USER, WP_APP_PASS), timeout=30)
+    if featured_media: payload["featured_media"] = featured_media
+    if social_url: payload["meta"] = {"tk_social_image": social_url}
+    resp = HTTP.post(url, json=payload, auth=(WP_USER, WP_APP_PASS), timeout=30)
     resp.raise_for_status()
     return resp.json()
 
-def wp_trend_exists_exact(title, within_hours=24):
-    try:
-        url = f"{WP_BASE_URL}/wp-json/wp/v2/trend?per_page=10&orderby=date&order=desc"
-        resp = requests.get(url, auth=(WP_USER, WP_APP_PASS), timeout=20)
-        resp.raise_for_status()
-        posts = resp.json()
-    except Exception as e:
-        print("⚠️ Kunde inte läsa WP-lista för duplikat:", e)
-        return False
-
-    def _parse_wp_dt(p):
-        raw_gmt = p.get("date_gmt") or ""
-        raw_loc = p.get("date") or ""
-        for s in (raw_gmt, raw_loc):
-            if not s: continue
-            try:
-                dt = datetime.fromisoformat(s.replace("Z","+00:00"))
-                dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
-                return dt
-            except Exception:
-                continue
-        return datetime.now(timezone.utc)
-
-    now = datetime.now(timezone.utc)
-    want_key = normalize_title_key(title)
-    for p in posts:
-        rendered = unescape(p.get("title", {}).get("rendered", "")).strip()
-        have_key = normalize_title_key(rendered)
-        if have_key == want_key:
-            dt = _parse_wp_dt(p)
-            if (now - dt) <= timedelta(hours=within_hours):
-                return True
-    return False
+def _parse_wp_dt(p):
+    raw_gmt = p.get("date_gmt") or ""
+    raw_loc = p.get("date") or ""
+    for s in (raw_gmt, raw_loc):
+        if not s: continue
+        try:
+            dt = datetime.fromisoformat(s.replace("Z","+00:00"))
+            dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+            return dt
+        except Exception:
+            continue
+    return datetime.now(timezone.utc)
+
+class WpTrendIndex:
+    """Senaste trend-posterna i WP, hämtade en gång per körning (paginerat över hela fönstret).
+    Exakt-dubbletter slås upp på normaliserad titelnyckel, händelser via titlar nyast först."""
+    def __init__(self, window_hours=24):
+        self.window_hours = window_hours
+        self.by_key = {}    # normalize_title_key(titel) -> [(dt, post_id)]
+        self.posts = []     # [(dt, post_id, titel i gemener)], nyast först
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    @METRICS.timed("wp:index")
+    def load(self, per_page=100, since: datetime = None):
+        """Läs in fönstret. Med since (daemon) hämtas bara poster efter since och slås ihop med de kända."""
+        now = datetime.now(timezone.utc)
+        # WP tolkar "after" i sajtens lokala tid – ta marginal och filtrera exakt på date_gmt nedan
+        start = since if since is not None else now - timedelta(hours=self.window_hours)
+        after = (start - timedelta(hours=14)).strftime("%Y-%m-%dT%H:%M:%S")
+        by_key, posts, page = {}, [], 1
+        try:
+            while True:
+                url = (f"{WP_BASE_URL}/wp-json/wp/v2/trend?per_page={per_page}&page={page}"
+                       f"&orderby=date&order=desc&after={after}&_fields=id,date,date_gmt,title")
+                r = HTTP.get(url, auth=(WP_USER, WP_APP_PASS), timeout=20)
+                r.raise_for_status()
+                batch = r.json()
+                for p in batch:
+                    dt = _parse_wp_dt(p)
+                    if (now - dt) > timedelta(hours=self.window_hours):
+                        continue
+                    rendered = unescape(p.get("title", {}).get("rendered", ""))
+                    by_key.setdefault(normalize_title_key(rendered.strip()), []).append((dt, p.get("id")))
+                    posts.append((dt, p.get("id"), rendered.lower()))
+                total_pages = int(r.headers.get("X-WP-TotalPages") or page)
+                if not batch or len(batch) < per_page or page >= total_pages:
+                    break
+                page += 1
+        except Exception as e:
+            print("⚠️ Kunde inte läsa WP-lista för duplikat:", e)
+            return False
+        if since is not None:
+            window = timedelta(hours=self.window_hours)
+            with self._lock:
+                known = {pid for _, pid, _ in self.posts}
+                fresh = [p for p in posts if p[1] not in known]
+                posts = [p for p in self.posts if (now - p[0]) <= window] + fresh
+                merged = {}
+                for src in (self.by_key, by_key):
+                    for k, hits in src.items():
+                        keep = [(dt, pid) for dt, pid in hits if (now - dt) <= window and (src is self.by_key or pid not in known)]
+                        if keep: merged.setdefault(k, []).extend(keep)
+            by_key = merged
+            print(f"▶ WP-index: +{len(fresh)} nya, {len(posts)} trend-poster senaste {self.window_hours}h")
+        posts.sort(key=lambda x: x[0], reverse=True)
+        with self._lock:
+            self.by_key, self.posts, self.loaded = by_key, posts, True
+        if since is None:
+            print(f"▶ WP-index: {len(posts)} trend-poster senaste {self.window_hours}h ({page} sid)")
+        return True
+
+    def refresh(self):
+        """Full inläsning första gången, därefter bara det som tillkommit sedan senaste kända post."""
+        with self._lock:
+            newest = self.posts[0][0] if (self.loaded and self.posts) else None
+        if not self.loaded:
+            return self.load()
+        return self.load(since=newest or datetime.now(timezone.utc) - timedelta(hours=self.window_hours))
+
+    def titles(self) -> list[str]:
+        with self._lock:
+            return [t for _, _, t in self.posts]
+
+    def add(self, post_id, title: str, dt: datetime = None):
+        dt = dt or datetime.now(timezone.utc)
+        with self._lock:
+            self.by_key.setdefault(normalize_title_key(title.strip()), []).append((dt, post_id))
+            self.posts.insert(0, (dt, post_id, title.lower()))
+
+    def exists_exact(self, title: str, within_hours=24) -> bool:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            hits = list(self.by_key.get(normalize_title_key(title), ()))
+        return any((now - dt) <= timedelta(hours=within_hours) for dt, _ in hits)
 
-def wp_find_recent_trend_by_keywords_recent(keywords: list[str], within_hours=24, per_page=20):
-    """Hämta senaste trend-poster och hitta första vars titel innehåller alla keywords."""
-    url = f"{WP_BASE_URL}/wp-json/wp/v2/trend?per_page={per_page}&orderby=date&order=desc"
-    try:
-        r = requests.get(url, auth=(WP_USER, WP_APP_PASS), timeout=20)
-        r.raise_for_status()
-        posts = r.json()
+    def find_by_keywords(self, keywords: list[str], within_hours=24):
         now = datetime.now(timezone.utc)
-        for p in posts:
-            raw = (p.get("date_gmt") or p.get("date") or "").replace("Z","+00:00")
-            try:
-                dt = datetime.fromisoformat(raw)
-                dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
-            except Exception:
-                dt = now
+        kws = [k.lower() for k in keywords]
+        with self._lock:
+            posts = list(self.posts)
+        for dt, post_id, title in posts:
             if (now - dt) > timedelta(hours=within_hours):
-                continue
-            title = unescape(p.get("title", {}).get("rendered", "")).lower()
-            if all(k.lower() in title for k in keywords):
-                return p.get("id")
-    except Exception as e:
-        print("⚠️ wp_find_recent_trend_by_keywords_recent fel:", e)
-    return None
+                break
+            if all(k in title for k in kws):
+                return post_id
+        return None
 
-def wp_append_update(post_id: int, extra_html: str):
-    url = f"{WP_BASE_URL}/wp-json/wp/v2/trend/{post_id}"
-    try:
-        cur = requests.get(url, auth=(WP_USER, WP_APP_PASS), timeout=20).json()
-        old_content = cur.get("content",{}).get("rendered","")
-    except Exception:
-        old_content = ""
-    new_content = old_content + "\n<hr />\n<h3>Uppdatering</h3>\n" + extra_html
-    resp = requests.post(url, json={"content": new_content}, auth=(WP_USER, WP_APP_PASS), timeout=30)
+WP_INDEX = WpTrendIndex(window_hours=24)
+
+def wp_trend_exists_exact(title, within_hours=24):
+    if not WP_INDEX.loaded and not WP_INDEX.load():
+        return False
+    return WP_INDEX.exists_exact(title, within_hours=within_hours)
+
+def wp_find_recent_trend_by_keywords_recent(keywords: list[str], within_hours=24):
+    """Första (senaste) trend-post vars titel innehåller alla keywords – ur WP-indexet."""
+    if not WP_INDEX.loaded and not WP_INDEX.load():
+        return None
+    return WP_INDEX.find_by_keywords(keywords, within_hours=within_hours)
+
+# Händelseuppdateringar: register per post med senast kända modified_gmt, det råa innehållet vi skrev och
+# våra egna block. Är posten oförändrad sedan vår senaste skrivning räcker ett litet GET + POST, utan att
+# ladda ner posten; med WP_APPEND_ENDPOINT skickas bara det nya blocket (och bara då är tillägget atomiskt).
+UPDATE_LOG = DiskCache("updates", ttl_seconds=UPDATE_LOG_TTL_H * 3600, max_entries=UPDATE_LOG_MAX)
+UPDATE_LOG_BLOCKS = 50   # block per post som minns (för dubblettskydd och återställning)
+_UPDATE_MARK = "<!-- tk-update:{} -->"
+_append_endpoint_missing = threading.Event()
+
+def _update_block(block_id: str, extra_html: str) -> str:
+    return f"\n<hr />\n<h3>Uppdatering</h3>\n{_UPDATE_MARK.format(block_id)}\n{extra_html}"
+
+def _wp_trend_fields(post_id: int, fields: str) -> dict:
+    url = f"{WP_BASE_URL}/wp-json/wp/v2/trend/{post_id}?context=edit&_fields={fields}"
+    resp = HTTP.get(url, auth=(WP_USER, WP_APP_PASS), timeout=20)
+    resp.raise_for_status()
+    return resp.json()
+
+def _wp_append_via_endpoint(post_id: int, block_id: str, block: str):
+    """Bara det nya blocket; pluginet lägger till det atomiskt och ignorerar ett block_id det redan har.
+    None om endpointen saknas (äldre plugin)."""
+    url = f"{WP_BASE_URL}/wp-json/trendkollen/v1/append"
+    resp = HTTP.post(url, json={"post_id": post_id, "block_id": block_id, "html": block}, auth=(WP_USER, WP_APP_PASS), timeout=30)
+    if resp.status_code == 404:
+        return None
     resp.raise_for_status()
     return resp.json()
 
+@METRICS.timed("wp:uppdatering")
+def wp_append_update(post_id: int, extra_html: str):
+    block_id = hashlib.sha1(extra_html.encode("utf-8")).hexdigest()[:12]
+    rec = UPDATE_LOG.get(post_id) or {"modified": None, "content": None, "blocks": {}}
+    rec = dict(rec, blocks=dict(rec["blocks"]))
+    if block_id in rec["blocks"]:
+        return {"id": post_id, "appended": False}   # samma uppdatering redan tillagd (t.ex. överlappande körningar)
+
+    def remember(content, modified):
+        rec["blocks"][block_id] = extra_html
+        for old in list(rec["blocks"])[:-UPDATE_LOG_BLOCKS]: del rec["blocks"][old]
+        rec.update(content=content, modified=modified)
+        UPDATE_LOG.set(post_id, rec)
+
+    if WP_APPEND_ENDPOINT and not _append_endpoint_missing.is_set():
+        j = _wp_append_via_endpoint(post_id, block_id, _update_block(block_id, extra_html))
+        if j is not None:
+            remember(None, None)
+            return j
+        _append_endpoint_missing.set()
+        print("⚠️ trendkollen/v1/append saknas i pluginet – uppdaterar via REST.")
+
+    # Bygg bara vidare på vår lokala kopia om posten inte ändrats sedan vår senaste skrivning. Det här sparar
+    # nedladdningen men är inget skydd mot samtidiga skrivningar: REST-API:t kan inte skriva villkorligt, så
+    # en annan körning kan hinna skriva mellan GET och POST (därför läggs vårt förra block tillbaka nedan).
+    raw, modified = None, rec["modified"]
+    if rec["content"] is not None and _wp_trend_fields(post_id, "modified_gmt").get("modified_gmt") == modified:
+        raw = rec["content"]
+    if raw is None:
+        cur = _wp_trend_fields(post_id, "modified_gmt,content")
+        raw, modified = (cur.get("content") or {}).get("raw"), cur.get("modified_gmt")
+        if raw is None: raise RuntimeError(f"post {post_id} saknar content.raw (context=edit)")
+    # Vår senaste skrivning kan ha skrivits över av en samtidig körning → läggs tillbaka före det nya blocket.
+    # Äldre block rörs inte (de kan ha tagits bort för hand i WP).
+    last = next(reversed(rec["blocks"]), None)
+    blocks = [(b, rec["blocks"][b]) for b in ([last] if last else []) if _UPDATE_MARK.format(b) not in raw]
+    if _UPDATE_MARK.format(block_id) not in raw: blocks.append((block_id, extra_html))
+    if not blocks:
+        remember(raw, modified)
+        return {"id": post_id, "appended": False}
+    new_content = raw + "".join(_update_block(b, h) for b, h in blocks)
+    url = f"{WP_BASE_URL}/wp-json/wp/v2/trend/{post_id}?context=edit&_fields=id,modified_gmt"
+    resp = HTTP.post(url, json={"content": new_content}, auth=(WP_USER, WP_APP_PASS), timeout=30)
+    resp.raise_for_status()
+    j = resp.json()
+    remember(new_content, j.get("modified_gmt"))
+    return j
+
 # === Bildgenerator (card + social) ===
 def _hex_to_rgb(h): h=h.lstrip('#'); return tuple(int(h[i:i+2],16) for i in (0,2,4))
 def _lerp(a,b,t): return int(a+(b-a)*t)
-def _grad_color(c1, c2, t):
-    r1,g1,b1 = _hex_to_rgb(c1); r2,g2,b2 = _hex_to_rgb(c2)
-    return (_lerp(r1,r2,t), _lerp(g1,g2,t), _lerp(b1,b2,t))
 def _seed_from_title(title: str) -> int: return int(hashlib.sha1(title.encode("utf-8")).hexdigest()[:8], 16)
 
+def _gradient_image(c1, c2, W, H):
+    """Vertikal gradient: en 1px-kolumn med radfärgerna, utsträckt (NEAREST) till full bredd."""
+    (r1,g1,b1), (r2,g2,b2) = _hex_to_rgb(c1), _hex_to_rgb(c2)
+    col = bytearray()
+    for y in range(H):
+        t = y / (H-1)
+        col += bytes((_lerp(r1,r2,t), _lerp(g1,g2,t), _lerp(b1,b2,t)))
+    return Image.frombytes("RGB", (1,H), bytes(col)).resize((W,H), Image.NEAREST)
+
+_DOT_SPRITES = {}
+def _dot_sprite(r, alpha):
+    m = _DOT_SPRITES.get((r, alpha))
+    if m is None:
+        m = Image.new("L", (r*2,r*2), 0)
+        ImageDraw.Draw(m).ellipse((0,0,r*2,r*2), fill=alpha)
+        _DOT_SPRITES[(r, alpha)] = m
+    return m
+
+# Processvid font-cache: (path, size) → FreeTypeFont. Fel loggas en gång per fil.
+_FONTS = {}
+_FONT_FAILS = set()
+_fonts_lock = threading.Lock()
+
 def _load_font(path, size, label=''):
-    try:
-        f = ImageFont.truetype(path, size=size)
-        print(f"🅵 Font OK ({label}): {path}")
+    key = (path, size)
+    f = _FONTS.get(key)
+    if f is not None:
         return f
-    except Exception as e:
-        print(f"⚠️ Font FAIL ({label}) vid {path}: {e}. Faller tillbaka till PIL default.")
-        return ImageFont.load_default()
+    with _fonts_lock:
+        f = _FONTS.get(key)
+        if f is None:
+            try:
+                f = ImageFont.truetype(path, size=size)
+            except Exception as e:
+                if path not in _FONT_FAILS:
+                    _FONT_FAILS.add(path)
+                    print(f"⚠️ Font FAIL ({label}) vid {path}: {e}. Faller tillbaka till PIL default.")
+                f = ImageFont.load_default()
+            _FONTS[key] = f
+    return f
+
+def _load_all_fonts():
+    """Alla storlekar bildgeneratorn använder (även initierare för renderingsprocesserna)."""
+    for size in (*TITLE_FONT_SIZES, 28, 24):
+        _load_font(FONT_BOLD_PATH, size, 'Bold')
+    _load_font(FONT_REG_PATH, 28, 'Regular')
+
+def preload_fonts():
+    """Ladda alla storlekar bildgeneratorn använder och logga en gång."""
+    _load_all_fonts()
+    ok = lambda p: "FAIL" if p in _FONT_FAILS else "OK"
+    print(f"🅵 Fonter: Bold {ok(FONT_BOLD_PATH)} ({FONT_BOLD_PATH}), Regular {ok(FONT_REG_PATH)} ({FONT_REG_PATH}), {len(_FONTS)} storlekar")
+
+# Rubrikstorlekar att prova, störst först (64 → 40)
+TITLE_FONT_SIZES = tuple(range(64, 39, -4))
+
+_word_widths = {}
+def _word_width(font, word: str) -> float:
+    key = (id(font), word)
+    w = _word_widths.get(key)
+    if w is None:
+        if len(_word_widths) > 20000: _word_widths.clear()
+        w = _word_widths[key] = font.getlength(word)
+    return w
+
+def _wrap_title(draw, words, font, max_width):
+    """Girig radbrytning som tidigare, men radbredd = summan av cachade ordbredder.
+    Bara rader nära gränsen mäts om med textbbox, så kerning o.d. inte kan flytta ett radbrott."""
+    space = _word_width(font, " "); slack = max(4, max_width * 0.02)
+    lines, cur, cur_w = [], "", 0.0
+    for w in words:
+        test = (cur+" "+w).strip()
+        est = (cur_w + space + _word_width(font, w)) if cur else _word_width(font, w)
+        tw = draw.textbbox((0,0), test, font=font)[2] if abs(est - max_width) <= slack else est
+        if tw <= max_width: cur, cur_w = test, est
+        else: lines.append(cur); cur, cur_w = w, _word_width(font, w)
+    if cur: lines.append(cur)
+    return lines
+
+def _fit_title(draw, words, max_width, max_lines=3):
+    """Största storlek där rubriken ryms på max_lines rader (binärsökning, färre rader med mindre font)."""
+    best = None
+    lo, hi = 0, len(TITLE_FONT_SIZES) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        f = _load_font(FONT_BOLD_PATH, TITLE_FONT_SIZES[mid], 'Bold')
+        lines = _wrap_title(draw, words, f, max_width)
+        if len(lines) <= max_lines:
+            best = (f, lines); hi = mid - 1
+        else:
+            lo = mid + 1
+    return best
 
-def generate_og_image(title: str, cat_slug: str, cat_name: str, date_str: str, out_path: str, with_text: bool = True):
-    W,H = 1200, 630
+OG_W, OG_H = 1200, 630
+
+def _render_background(title: str, cat_slug: str):
+    """Gradient + prickar, deterministiskt per titel (seed från titeln)."""
+    W,H = OG_W, OG_H
     base1, base2 = CAT_COLORS.get(cat_slug, ("#111827","#374151"))
     seed = _seed_from_title(title); random.seed(seed)
 
-    img = Image.new("RGB", (W,H), _hex_to_rgb(base1))
-    draw = ImageDraw.Draw(img)
-    for y in range(H):
-        t = y / (H-1); col = _grad_color(base1, base2, t)
-        draw.line([(0,y),(W,y)], fill=col)
+    img = _gradient_image(base1, base2, W, H)
+    # Prickarna: cachade alfamasker per (radie, alfa) klistras med vit färg direkt i bilden –
+    # samma komposit som en RGBA-prick per varv, utan att skapa och rita en ny bild varje gång.
     for _ in range(120):
         x = random.randint(0,W); y = random.randint(0,H)
         r = random.randint(2,5); alpha = random.randint(18,32)
-        dot = Image.new("RGBA",(r*2,r*2),(0,0,0,0))
-        ImageDraw.Draw(dot).ellipse((0,0,r*2,r*2), fill=(255,255,255,alpha))
-        img.paste(dot,(x,y),dot)
+        img.paste((255,255,255), (x,y), _dot_sprite(r, alpha))
+    return img
 
+def _draw_og_text(img, title: str, cat_name: str, date_str: str):
+    W,H = img.size
+    draw = ImageDraw.Draw(img)
+    padX, padY = 72, 60
+    title_font = _load_font(FONT_BOLD_PATH, 64, 'Bold')
+    chip_font  = _load_font(FONT_BOLD_PATH, 28, 'Bold')
+    meta_font  = _load_font(FONT_REG_PATH, 28, 'Regular')
+
+    chip_text = cat_name
+    chip_padX, chip_padY = 18, 10
+    chip_text_w, chip_text_h = draw.textbbox((0,0), chip_text, font=chip_font)[2:]
+    chip_w = chip_text_w + chip_padX*2; chip_h = chip_text_h + chip_padY*2
+    chip_x, chip_y = padX, padY
+    draw.rounded_rectangle((chip_x, chip_y, chip_x+chip_w, chip_y+chip_h), radius=16,
+                           fill=(255,255,255,38), outline=(255,255,255,64), width=1)
+    draw.text((chip_x+chip_padX, chip_y+chip_padY-2), chip_text, font=chip_font, fill=(255,255,255,230))
+
+    dt_w, _ = draw.textbbox((0,0), date_str, font=meta_font)[2:]
+    draw.text((W-padX-dt_w, padY+2), date_str, font=meta_font, fill=(236,242,255,220))
+
+    max_width = W - padX*2; words = re.split(r'\s+', title.strip())
+    lines = []
+    fit = _fit_title(draw, words, max_width)
+    if fit: title_font, lines = fit
+    y = chip_y + chip_h + 36
+    for ln in lines:
+        draw.text((padX, y), ln, font=title_font, fill=(255,255,255,245))
+        y += title_font.size + 6
+
+    brand_font = _load_font(FONT_BOLD_PATH, 24, 'Bold')
+    draw.text((padX, H-60-28), "Trendkoll", font=brand_font, fill=(255,255,255,200))
+
+@METRICS.timed("bild:render")
+def generate_og_image(title: str, cat_slug: str, cat_name: str, date_str: str, out_path: str, with_text: bool = True):
+    img = _render_background(title, cat_slug)
     if with_text:
-        padX, padY = 72, 60
-        title_font = _load_font(FONT_BOLD_PATH, 64, 'Bold')
-        chip_font  = _load_font(FONT_BOLD_PATH, 28, 'Bold')
-        meta_font  = _load_font(FONT_REG_PATH, 28, 'Regular')
-
-        chip_text = cat_name
-        chip_padX, chip_padY = 18, 10
-        chip_text_w, chip_text_h = draw.textbbox((0,0), chip_text, font=chip_font)[2:]
-        chip_w = chip_text_w + chip_padX*2; chip_h = chip_text_h + chip_padY*2
-        chip_x, chip_y = padX, padY
-        draw.rounded_rectangle((chip_x, chip_y, chip_x+chip_w, chip_y+chip_h), radius=16,
-                               fill=(255,255,255,38), outline=(255,255,255,64), width=1)
-        draw.text((chip_x+chip_padX, chip_y+chip_padY-2), chip_text, font=chip_font, fill=(255,255,255,230))
-
-        dt_w, _ = draw.textbbox((0,0), date_str, font=meta_font)[2:]
-        draw.text((W-padX-dt_w, padY+2), date_str, font=meta_font, fill=(236,242,255,220))
-
-        max_width = W - padX*2; words = re.split(r'\s+', title.strip())
-        lines, size = [], 64
-        while size >= 40:
-            f = _load_font(FONT_BOLD_PATH, size, 'Bold')
-            tmp, cur = [], ""
-            for w in words:
-                test = (cur+" "+w).strip()
-                tw = draw.textbbox((0,0), test, font=f)[2]
-                if tw <= max_width: cur = test
-                else: tmp.append(cur); cur = w
-            if cur: tmp.append(cur)
-            if len(tmp) <= 3:
-                title_font = f; lines = tmp; break
-            size -= 4
-        y = chip_y + chip_h + 36
-        for ln in lines:
-            draw.text((padX, y), ln, font=title_font, fill=(255,255,255,245))
-            y += title_font.size + 6
-
-        brand_font = _load_font(FONT_BOLD_PATH, 24, 'Bold')
-        draw.text((padX, H-60-28), "Trendkoll", font=brand_font, fill=(255,255,255,200))
-
+        _draw_og_text(img, title, cat_name, date_str)
     img.save(out_path, "PNG")
 
-def upload_media_to_wp(png_path: str, filename: str):
+_IMAGE_FORMATS = {
+    "png":     ("PNG",  "png",  "image/png",  {}),
+    "png-opt": ("PNG",  "png",  "image/png",  {"optimize": True}),
+    "webp":    ("WEBP", "webp", "image/webp", {"quality": OG_WEBP_QUALITY, "method": 6}),
+}
+
+def encode_image(img, fmt: str = None) -> dict:
+    """Koda bilden i minnet → {"data": bytes, "ext": ..., "mime": ...}."""
+    pil_fmt, ext, mime, opts = _IMAGE_FORMATS.get((fmt or OG_IMAGE_FORMAT), _IMAGE_FORMATS["png"])
+    buf = io.BytesIO()
+    img.save(buf, pil_fmt, **opts)
+    return {"data": buf.getvalue(), "ext": ext, "mime": mime}
+
+def render_og_images(title: str, cat_slug: str, cat_name: str, date_str: str, fmt: str = None) -> dict:
+    """Card (utan text) och social (med text) från samma bakgrund, kodade i minnet. Körs i RENDERER:s
+    processer, så tiden skickas med tillbaka ("render_s") i stället för att mätas här."""
+    t0 = time.perf_counter()
+    img = _render_background(title, cat_slug)
+    card = encode_image(img, fmt)   # kodas innan texten ritas på samma bild
+    _draw_og_text(img, title, cat_name, date_str)
+    return {"card": card, "social": encode_image(img, fmt), "render_s": time.perf_counter() - t0}
+
+# Bildsteget: ett jobb per post i en processpool, beställt så fort rubrik och kategori är klara
+# (parallellt med sammanfattningen). spawn i stället för fork: workern har trådar igång.
+class RenderPipeline:
+    """Kör render_og_images i RENDER_WORKERS processer; submit() ger en Future med båda bilderna."""
+    KINDS = ("card", "social")
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._ex = None; self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._ex is None and self.workers > 0:
+                try:
+                    self._ex = ProcessPoolExecutor(max_workers=self.workers, initializer=_load_all_fonts,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+                except Exception as e:
+                    print("⚠️ Kunde inte starta renderingsprocesser, renderar i trådar:", e)
+                    self.workers = 0
+            if self._ex is None:
+                self._ex = ThreadPoolExecutor(max_workers=2, thread_name_prefix="render")
+            return self._ex
+
+    def start(self):
+        """Starta processerna i förväg (import + typsnitt) så att första posten inte väntar på dem."""
+        if self._ex is not None: return   # daemon: poolen lever kvar mellan cyklerna
+        ex = self._executor()
+        if isinstance(ex, ProcessPoolExecutor):
+            for _ in range(self.workers): ex.submit(os.getpid)
+
+    def _record(self, fut):
+        if not fut.cancelled() and fut.exception() is None:
+            METRICS.observe("bild:render", fut.result()["render_s"])
+
+    def submit(self, title: str, cat_slug: str, cat_name: str, date_str: str):
+        try:
+            fut = self._executor().submit(render_og_images, title, cat_slug, cat_name, date_str)
+        except Exception as e:   # trasig pool (t.ex. en process som dödats) → trådar från och med nu
+            print("⚠️ Renderingspoolen ur funktion, byter till trådar:", e)
+            with self._lock:
+                self._ex, self.workers = None, 0
+            fut = self._executor().submit(render_og_images, title, cat_slug, cat_name, date_str)
+        fut.add_done_callback(self._record)
+        return fut
+
+RENDERER = RenderPipeline(RENDER_WORKERS)
+
+@METRICS.timed("wp:media")
+def upload_media_to_wp(data: bytes, filename: str, content_type: str = "image/png"):
     url = f"{WP_BASE_URL}/wp-json/wp/v2/media"
-    with open(png_path, "rb") as f:
-        headers = {"Content-Disposition": f'attachment; filename="{filename}"',
-                   "Content-Type": "image/png"}
-        resp = requests.post(url, headers=headers, data=f, auth=(WP_USER, WP_APP_PASS), timeout=60)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"',
+               "Content-Type": content_type}
+    resp = HTTP.post(url, headers=headers, data=data, auth=(WP_USER, WP_APP_PASS), timeout=60)
     resp.raise_for_status()
     j = resp.json()
     return j.get("id"), j.get("source_url")
 
-def set_post_featured_media(post_id: int, media_id: int):
-    url = f"{WP_BASE_URL}/wp-json/wp/v2/trend/{post_id}"
-    resp = requests.post(url, json={"featured_media": media_id}, auth=(WP_USER, WP_APP_PASS), timeout=30)
+def delete_media_from_wp(media_id: int):
+    """Ta bort en uppladdad bild helt (force=true hoppar över papperskorgen)."""
+    url = f"{WP_BASE_URL}/wp-json/wp/v2/media/{media_id}?force=true"
+    resp = HTTP.request("DELETE", url, auth=(WP_USER, WP_APP_PASS), timeout=30)
     resp.raise_for_status()
-    return resp.json()
 
-def set_post_social_image_url(post_id: int, social_url: str):
+@METRICS.timed("wp:bildmeta")
+def set_post_media(post_id: int, media_id: int = None, social_url: str = None):
+    """featured_media (card) och tk_social_image (social) i en och samma uppdatering av posten."""
+    payload = {}
+    if media_id: payload["featured_media"] = media_id
+    if social_url: payload["meta"] = {"tk_social_image": social_url}
+    if not payload: return None
     url = f"{WP_BASE_URL}/wp-json/wp/v2/trend/{post_id}"
-    resp = requests.post(url, json={"meta": {"tk_social_image": social_url}}, auth=(WP_USER, WP_APP_PASS), timeout=30)
+    resp = HTTP.post(url, json=payload, auth=(WP_USER, WP_APP_PASS), timeout=30)
     resp.raise_for_status()
     return resp.json()
 
+# Card och social laddas upp samtidigt (WP-värden begränsas ändå av HttpClient per värd)
+MEDIA_UPLOADER = ThreadPoolExecutor(max_workers=HOST_MAX_CONCURRENCY, thread_name_prefix="wp-media")
+
+def upload_job_images(job, name: str) -> dict:
+    """Ladda upp jobbets bilder, båda samtidigt så fort renderingen är klar → {"card"/"social": (media_id, url)}."""
+    title, cat, cat_name = job["title"], job["cat"], job["cat_name"]
+    date_for_img = job.get("image_date") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    fut = job.get("images") or RENDERER.submit(title, cat, cat_name, date_for_img)
+    try:
+        imgs = fut.result()
+    except Exception as e:
+        print("⚠️ Renderingen misslyckades i poolen, renderar här:", e)
+        imgs = render_og_images(title, cat, cat_name, date_for_img)
+    uploads = {kind: MEDIA_UPLOADER.submit(upload_media_to_wp, imgs[kind]["data"], f"{kind}_trend_{name}.{imgs[kind]['ext']}",
+                                           imgs[kind]["mime"])
+               for kind in RenderPipeline.KINDS}
+    media = {}
+    for kind in RenderPipeline.KINDS:
+        try:
+            media[kind] = uploads[kind].result()
+        except Exception as e:
+            print(f"⚠️ Kunde inte ladda upp {kind}-bilden:", e)
+    return media
+
 # === Event-grouping: slå ihop upprepade händelser (storm, sport, etc.) ===
 def canonical_event_key(title: str):
     t = title.lower()
@@ -776,6 +2455,11 @@ def canonical_event_key(title: str):
     if "kärnkraft" in t: return "policy:karnkraft"
     return None
 
+def mergeable_event_key(title: str):
+    """Händelsenyckel för titlar som slås ihop med en befintlig post (väder/sport), annars None."""
+    event_key = canonical_event_key(title)
+    return event_key if event_key and event_key.startswith(("weather:", "sport:")) else None
+
 def dynamic_min_snippets(cat_slug: str, resolved_snippets: list[dict]) -> int:
     base = MIN_SNIPPETS.get(cat_slug, 1)
     if base <= 1: return base
@@ -800,147 +2484,395 @@ def has_trusted_news(resolved_snippets: list[dict]) -> bool:
     return False
 
 # === MAIN ===
-def main():
-    print("🔎 Startar Trendkoll-worker...")
-    print("BASE_URL:", WP_BASE_URL, "| USER:", WP_USER)
+@METRICS.timed("steg:förbered")
+def prepare_bundle(b, claimed_keys: set):
+    """Dubblettskydd, källor och event-koll för en kandidat. Returnerar ett jobb att publicera, eller None."""
+    title    = b["title"]
+    cat      = b["cat_slug"]
+    origin   = b.get("origin") or ""
+    key      = b.get("key") or normalize_title_key(title)
+    score    = b.get("score", None)
+    why      = b.get("why", {})
+
+    print(f"➡️  [{cat}] {title}")
+    if score is not None: print(f"🧮 score={score} {reasons_to_str(why)}")
+
+    # Dubblettskydd
+    if key in claimed_keys:
+        print("⏭️ Hoppar över (dubblett i samma körning)."); return None
+    if wp_trend_exists_exact(title, within_hours=24):
+        print("⏭️ Hoppar över (fanns redan senaste 24h i WP)."); return None
+
+    # Snippets + källor (riktiga URL:er, varumärke + domän)
+    snippets = gnews_snippets_sv(title, max_items=4, max_age_hours=72)
+    resolved = []
+    for s in snippets:
+        final = s["link"]
+        dom = urlparse(final).netloc.replace("www.", "") if final else "Källa"
+        resolved.append({"title": s["title"], "link": final, "source": s.get("source") or dom, "dom": dom})
+
+    # Nyheter måste ha minst en betrodd källa
+    if cat == "nyheter" and resolved and not has_trusted_news(resolved):
+        print("⏭️ Skippas: nyhet utan betrodd källa.")
+        return None
+
+    need = dynamic_min_snippets(cat, resolved)
+    if len(resolved) < need and not origin:
+        print(f"⏭️ Skippas: för få källor ({len(resolved)}/{need})."); return None
+
+    if not resolved and origin:
+        dom = urlparse(origin).netloc.replace("www.", "") if origin else "Källa"
+        resolved = [{"title": dom, "link": origin, "source": dom, "dom": dom}]
+
+    job = {"bundle": b, "title": title, "cat": cat, "cat_name": b["cat_name"], "key": key,
+           "resolved": resolved, "update_id": None, "summary": None}
+
+    # Event-sammanslagning
+    event_key, existing_id = _find_event_post(title)
+    if existing_id:
+        job["update_id"] = existing_id; job["event_key"] = event_key
+    return job
+
+def _find_event_post(title: str):
+    """(event_key, post_id) om titeln hör till en väder-/sporthändelse som redan har en post, annars (None, None)."""
+    event_key = mergeable_event_key(title)
+    if event_key:
+        q = event_key.split(":")[1]
+        existing_id = wp_find_recent_trend_by_keywords_recent([q], within_hours=12)
+        if existing_id:
+            return event_key, existing_id
+    return None, None
+
+def _summary_snippets(resolved):
+    return [{"title": r["source"], "link": r["link"]} for r in resolved]
+
+# Utfall av publish_job: bara PUBLISHED räknas mot MAX_TRENDS. SKIPPED = uppdateringen fanns redan i posten
+# (ingen ny post heller); FAILED släpper jobbets nyckel så att en annan kandidat kan ta platsen.
+PUBLISHED, SKIPPED, FAILED = "publicerad", "överhoppad", "misslyckad"
+
+def _publish_update(job) -> str:
+    title, resolved = job["title"], job["resolved"]
+    print(f"🔁 Uppdaterar befintlig händelse ({job['event_key']}) → post {job['update_id']}")
+    update_txt = f"{title}. " + (", ".join(r['source'] for r in resolved) if resolved else "")
+    update_html = text_to_html(make_excerpt(update_txt, max_chars=220))
+    try:
+        res = wp_append_update(job["update_id"], update_html)
+    except Exception as e:
+        print("⚠️ Misslyckades uppdatera, postar nytt istället:", e)
+        return FAILED
+    if res.get("appended") is False:
+        print(f"⏭️ Uppdateringen finns redan i post {job['update_id']} – hoppar över.")
+        return SKIPPED
+    time.sleep(random.uniform(0.6, 1.2) * POST_PAUSE_SCALE)
+    return PUBLISHED
+
+@METRICS.timed("steg:publicera")
+def publish_job(job, date_tag: str) -> str:
+    """Publicera ett förberett jobb (uppdatering eller ny post) → PUBLISHED, SKIPPED eller FAILED.
+    Sammanfattningen är en Future från SUMMARIZER."""
+    title, cat, resolved = job["title"], job["cat"], job["resolved"]
+    if not job["update_id"]:
+        # Ett tidigare jobb i körningen kan ha publicerat händelsen medan det här förbereddes
+        event_key, existing_id = _find_event_post(title)
+        if existing_id:
+            job["update_id"] = existing_id; job["event_key"] = event_key
+    if job["update_id"]:
+        outcome = _publish_update(job)
+        if outcome != FAILED:
+            _cancel_job(job)
+            return outcome
+    if job["summary"] is None:
+        job["summary"] = SUMMARIZER.submit(title, _summary_snippets(resolved))
+
+    # Sammanfattning
+    try:
+        raw_summary = job["summary"].result()
+    except Exception as e2:
+        print("❌ OpenAI-fel, kör no-AI fallback:", e2)
+        bullets = "\n".join([f"- {r['source']}" for r in resolved[:3]]) if resolved else "- Ingen nyhetskälla tillgänglig"
+        raw_summary = f"{title}.\n\n{bullets}\n\nAffiliate-idéer:\n- Sök efter relaterade produkter/tjänster hos dina partnernätverk."
 
-    date_tag = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    bundles = pick_diverse_topics(max_total=MAX_TRENDS * 3)
-    if not bundles:
-        print("⚠️ Hittade inga topics. Avbryter."); return
-
-    posted_now_keys = set(); posted = 0
-
-    for b in bundles:
-        if posted >= MAX_TRENDS: break
-
-        title    = b["title"]
-        cat      = b["cat_slug"]
-        cat_name = b["cat_name"]
-        origin   = b.get("origin") or ""
-        key      = b.get("key") or normalize_title_key(title)
-        score    = b.get("score", None)
-        why      = b.get("why", {})
-
-        print(f"➡️  [{cat}] {title}")
-        if score is not None: print(f"🧮 score={score} {reasons_to_str(why)}")
-
-        # Dubblettskydd
-        if key in posted_now_keys:
-            print("⏭️ Hoppar över (dubblett i samma körning)."); continue
-        if wp_trend_exists_exact(title, within_hours=24):
-            print("⏭️ Hoppar över (fanns redan senaste 24h i WP)."); continue
-
-        # Snippets + källor (riktiga URL:er, varumärke + domän)
-        snippets = gnews_snippets_sv(title, max_items=4, max_age_hours=72)
-        resolved = []
-        for s in snippets:
-            final = s["link"]
-            dom = urlparse(final).netloc.replace("www.", "") if final else "Källa"
-            resolved.append({"title": s["title"], "link": final, "source": s.get("source") or dom, "dom": dom})
-
-        # Nyheter måste ha minst en betrodd källa
-        if cat == "nyheter" and resolved and not has_trusted_news(resolved):
-            print("⏭️ Skippas: nyhet utan betrodd källa.")
-            continue
+    summary_html   = text_to_html(raw_summary)
+    published_str  = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M')
 
-        need = dynamic_min_snippets(cat, resolved)
-        if len(resolved) < need and not origin:
-            print(f"⏭️ Skippas: för få källor ({len(resolved)}/{need})."); continue
-
-        if not resolved and origin:
-            dom = urlparse(origin).netloc.replace("www.", "") if origin else "Källa"
-            resolved = [{"title": dom, "link": origin, "source": dom, "dom": dom}]
-
-        # Event-sammanslagning
-        event_key = canonical_event_key(title)
-        if event_key and ("weather:" in event_key or "sport:" in event_key):
-            q = event_key.split(":")[1]
-            existing_id = wp_find_recent_trend_by_keywords_recent([q], within_hours=12)
-            if existing_id:
-                print(f"🔁 Uppdaterar befintlig händelse ({event_key}) → post {existing_id}")
-                update_txt = f"{title}. " + (", ".join(r['source'] for r in resolved) if resolved else "")
-                update_html = text_to_html(make_excerpt(update_txt, max_chars=220))
-                try:
-                    wp_append_update(existing_id, update_html)
-                    posted += 1; posted_now_keys.add(key)
-                    time.sleep(random.uniform(0.6, 1.2))
-                    continue
-                except Exception as e:
-                    print("⚠️ Misslyckades uppdatera, postar nytt istället:", e)
+    # Källrendering
+    li = []
+    for r in resolved:
+        dom = (urlparse(r['link']).netloc or "").replace("www.","")
+        label = r.get("source") or dom or "Källa"
+        label_full = f"{label} ({dom})" if dom and label.lower() not in dom.lower() else label
+        li.append(f"<li><a href='{r['link']}' target='_blank' rel='nofollow noopener'>{escape(label_full)}</a></li>")
+    source_items = "".join(li)
+    source_header = "<h3>Källor</h3>" if len(resolved) != 1 else "<h3>Källa</h3>"
+    sources_html  = f"{source_header}\n<ul>{source_items or '<li>(Inga källor tillgängliga just nu)</li>'}</ul>"
+
+    body = f"""
+    <p><em>Publicerad: {published_str} UTC</em></p>
+    <div class='tk-summary'>
+{summary_html}
+    </div>
+    {sources_html}
+    """
+
+    excerpt = make_excerpt(raw_summary, max_chars=160)
 
-        # Sammanfattning
+    # Med WP_INGEST_MEDIA laddas bilderna upp först och följer med i ingest-anropet (två rundor i stället för
+    # tre); pluginet bekräftar genom att skicka tillbaka featured_media och meta.tk_social_image
+    media = {}; res = None
+    if WP_INGEST_MEDIA:
+        media = upload_job_images(job, f"{date_tag}-{hashlib.sha1(job['key'].encode('utf-8')).hexdigest()[:10]}")
+    card, social = media.get("card"), media.get("social")
+
+    try:
+        res = wp_post_trend(
+            title=title,
+            body=body,
+            topics=["idag", "svenska-trender", date_tag],
+            categories=[cat],
+            excerpt=excerpt,
+            featured_media=card[0] if card else None,
+            social_url=social[1] if social else None,
+        )
+        post_id = res.get("post_id")
+        print("✅ Postad:", res)
+        METRICS.mark("first_post")
+        WP_INDEX.add(post_id, title)
+
+        if post_id:
+            card_ok = bool(card) and res.get("featured_media") == card[0]
+            social_ok = bool(social) and (res.get("meta") or {}).get("tk_social_image") == social[1]
+            if not media:
+                media = upload_job_images(job, str(post_id))
+                card, social = media.get("card"), media.get("social")
+            try:
+                # Det pluginet inte bekräftat sätts i efterhand (äldre plugin: båda, annars ev. bara det ena)
+                set_post_media(post_id, card[0] if card and not card_ok else None,
+                               social[1] if social and not social_ok else None)
+                if card: print(f"🖼️  Featured (card) image satt: {card[1]}")
+                if social: print(f"🔗  Social image satt (og:image): {social[1]}")
+            except Exception as e:
+                print("⚠️ Kunde inte sätta bilderna på posten:", e)
+
+        time.sleep(random.uniform(0.8, 1.6) * POST_PAUSE_SCALE)
+        return PUBLISHED
+
+    except Exception as e:
+        print("❌ Fel vid postning till WP:", e)
+        if res is None: _discard_media(media)
+        return FAILED
+
+def _discard_media(media: dict):
+    """Bilder som laddats upp inför en ingest som misslyckades – ta bort dem så att de inte blir kvar lösa."""
+    for kind, (media_id, url) in media.items():
         try:
-            raw_summary = summarize_with_retries(title, [{"title": r["source"], "link": r["link"]} for r in resolved])
-        except Exception as e2:
-            print("❌ OpenAI-fel, kör no-AI fallback:", e2)
-            bullets = "\n".join([f"- {r['source']}" for r in resolved[:3]]) if resolved else "- Ingen nyhetskälla tillgänglig"
-            raw_summary = f"{title}.\n\n{bullets}\n\nAffiliate-idéer:\n- Sök efter relaterade produkter/tjänster hos dina partnernätverk."
-
-        summary_html   = text_to_html(raw_summary)
-        published_str  = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M')
-
-        # Källrendering
-        li = []
-        for r in resolved:
-            dom = (urlparse(r['link']).netloc or "").replace("www.","")
-            label = r.get("source") or dom or "Källa"
-            label_full = f"{label} ({dom})" if dom and label.lower() not in dom.lower() else label
-            li.append(f"<li><a href='{r['link']}' target='_blank' rel='nofollow noopener'>{escape(label_full)}</a></li>")
-        source_items = "".join(li)
-        source_header = "<h3>Källor</h3>" if len(resolved) != 1 else "<h3>Källa</h3>"
-        sources_html  = f"{source_header}\n<ul>{source_items or '<li>(Inga källor tillgängliga just nu)</li>'}</ul>"
-
-        body = f"""
-        <p><em>Publicerad: {published_str} UTC</em></p>
-        <div class='tk-summary'>
-{summary_html}
-        </div>
-        {sources_html}
-        """
+            delete_media_from_wp(media_id)
+            print(f"🧹 Tog bort oanvänd {kind}-bild {media_id}")
+        except Exception as e:
+            print(f"⚠️ Oanvänd {kind}-bild {media_id} ({url}) kunde inte tas bort:", e)
 
-        excerpt = make_excerpt(raw_summary, max_chars=160)
+# === Strömmande pipeline: källa → förbered (snippets; sammanfattning + bilder beställs) → publicera ===
+_STAGE_DONE = object()
 
+def _stage_put(q, item, stop) -> bool:
+    """Lägg i en begränsad kö (mottryck); ger upp om pipelinen stoppas."""
+    while not stop.is_set():
         try:
-            res = wp_post_trend(
-                title=title,
-                body=body,
-                topics=["idag", "svenska-trender", date_tag],
-                categories=[cat],
-                excerpt=excerpt
-            )
-            post_id = res.get("post_id")
-            print("✅ Postad:", res)
-
-            if post_id:
-                card_path   = f"/tmp/card_trend_{post_id}.png"
-                social_path = f"/tmp/social_trend_{post_id}.png"
-                date_for_img = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-
-                generate_og_image(title, cat, cat_name, date_for_img, card_path, with_text=False)
-                try:
-                    media_id_card, url_card = upload_media_to_wp(card_path, f"card_trend_{post_id}.png")
-                    set_post_featured_media(post_id, media_id_card)
-                    print(f"🖼️  Featured (card) image satt: {url_card}")
-                except Exception as e:
-                    print("⚠️ Kunde inte sätta featured card image:", e)
+            q.put(item, timeout=0.2); return True
+        except queue.Full:
+            continue
+    return False
+
+def _stage_items(q, stop):
+    """Läs ur en kö tills föregående steg är klart eller pipelinen stoppas."""
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.2)
+        except queue.Empty:
+            continue
+        if item is _STAGE_DONE: return
+        yield item
 
-                generate_og_image(title, cat, cat_name, date_for_img, social_path, with_text=True)
+def _start_stage(name, items, fn, outbox, stop):
+    """Kör ett pipelinesteg i egen tråd: fn(item) → outbox (None = släpp). Ett fel i fn släpper bara det objektet;
+    ett fel i själva källan (items) avslutar steget. Skickar _STAGE_DONE när klart."""
+    def run():
+        try:
+            for item in items:
+                if stop.is_set(): break
                 try:
-                    media_id_social, url_social = upload_media_to_wp(social_path, f"social_trend_{post_id}.png")
-                    set_post_social_image_url(post_id, url_social)
-                    print(f"🔗  Social image satt (og:image): {url_social}")
+                    out = fn(item)
                 except Exception as e:
-                    print("⚠️ Kunde inte sätta social image:", e)
-
-            posted_now_keys.add(key); posted += 1
-            time.sleep(random.uniform(0.8, 1.6))
-
+                    title = item.get("title") if isinstance(item, dict) else item
+                    print(f"⚠️ Pipelinesteg {name}: hoppar över \"{title}\":", e)
+                    continue
+                if out is not None and not _stage_put(outbox, out, stop): break
         except Exception as e:
-            print("❌ Fel vid postning till WP:", e)
+            print(f"⚠️ Pipelinesteg {name} avbröts:", e)
+        finally:
+            _stage_put(outbox, _STAGE_DONE, stop)
+    t = threading.Thread(target=run, name=f"stage-{name}", daemon=True)
+    t.start()
+    return t
+
+class Lookahead:
+    """Antal förberedda men ej publicerade jobb: högst min(limit, kvarvarande kvot), minst 1."""
+    def __init__(self, limit: int, quota: int):
+        self.limit, self.quota = limit, quota
+        self.in_flight = 0; self.done = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, stop) -> bool:
+        with self._cond:
+            while self.in_flight >= max(1, min(self.limit, self.quota - self.done)):
+                if stop.is_set(): return False
+                self._cond.wait(0.2)
+            self.in_flight += 1
+            return not stop.is_set()
+
+    def release(self, published: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if published: self.done += 1
+            self._cond.notify_all()
+
+def _prepare_stage(claimed_keys: set, lookahead: Lookahead, stop):
+    def prepare(b):
+        if not lookahead.acquire(stop): return None
+        job = None
+        try:
+            job = prepare_bundle(b, claimed_keys)
+            if not job:
+                lookahead.release(); return None
+            claimed_keys.add(job["key"])
+            if not job["update_id"]:   # uppdateringar behöver varken sammanfattning eller bilder
+                job["summary"] = SUMMARIZER.submit(job["title"], _summary_snippets(job["resolved"]))
+                job["image_date"] = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+                job["images"] = RENDERER.submit(job["title"], job["cat"], job["cat_name"], job["image_date"])
+            return job
+        except Exception:
+            # Platsen och nyckeln lämnas tillbaka så att nästa kandidat kan förberedas
+            if job:
+                claimed_keys.discard(job["key"]); _cancel_job(job)
+            lookahead.release()
+            raise
+    return prepare
+
+def _cancel_job(job):
+    """Släpp ett förberett jobb som inte ska publiceras: avbryt det som inte hunnit starta."""
+    if job.get("summary") is not None: job["summary"].cancel()
+    if job.get("images"): job["images"].cancel()
+
+def run_cycle():
+    """En körning: källor → publicering. Returnerar antal publicerade, eller None om inga topics hittades."""
+    HTTP.reset_stats()
+    reset_cache_stats(); reset_gnews_decode_stats(); reset_gnews_query_stats(); reset_feed_parse_stats()
+    METRICS.reset()
+    RENDERER.start()
+    WP_INDEX.refresh()
+    date_tag = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    # Nära-dubbletter mot det som redan publicerats senaste dygnet och mot körningens egna val
+    near_dups = NearDupIndex()
+    for t in WP_INDEX.titles(): near_dups.add(t, "WP")
+
+    # Stegen kopplas med begränsade köer: första posten går ut medan senare kategorier hämtas,
+    # och allt uppströms stoppas när MAX_TRENDS publicerats. Publicering sker i kandidatordning.
+    stop = threading.Event()
+    claimed_keys = set(); posted = 0; collected = [0]
+    lookahead = Lookahead(OPENAI_CONCURRENCY, MAX_TRENDS)
+    candidates = queue.Queue(maxsize=max(1, PIPELINE_QUEUE_SIZE))
+    prepared   = queue.Queue(maxsize=max(1, PIPELINE_QUEUE_SIZE))
+
+    def source_items():
+        for b in iter_diverse_topics(max_total=MAX_TRENDS * 3, near_dups=near_dups):
+            collected[0] += 1
+            yield b
+    stages = [
+        _start_stage("källor", source_items(), lambda b: b, candidates, stop),
+        _start_stage("förbered", _stage_items(candidates, stop), _prepare_stage(claimed_keys, lookahead, stop), prepared, stop),
+    ]
+
+    for job in _stage_items(prepared, stop):
+        outcome = publish_job(job, date_tag)
+        lookahead.release(published=outcome == PUBLISHED)
+        if outcome == PUBLISHED:
+            posted += 1
+            if posted >= MAX_TRENDS: break
+        elif outcome == FAILED:
+            claimed_keys.discard(job["key"])
+    stop.set()
+
+    # Släpp det som hunnit förberedas men inte behövs
+    for t in stages: t.join(timeout=5)
+    while True:
+        try: job = prepared.get_nowait()
+        except queue.Empty: break
+        if job is not _STAGE_DONE: _cancel_job(job)
+
+    if not collected[0]:
+        METRICS.write(posted=0, collected=0); FEED_MARKS.reset_stats()
+        print("⚠️ Hittade inga topics. Avbryter."); return None
+
+    print(f"📊 Summering: publicerade={posted}, översamlade={collected[0]}, kvar_kvot={max(0, MAX_TRENDS-posted)}")
+    hs = HTTP.stats()
+    print(f"🌐 HTTP: anrop={hs['requests']} nya_anslutningar={hs['new_connections']} återanvända={hs['reused_connections']} "
+          f"omförsök={hs['retries']} nätverksfel={hs['errors']} värdar={hs['hosts']}")
+    fc = FEED_CACHE.stats()
+    print(f"🗂️ Feed-cache: 304={fc.get('not_modified', 0)} villkorliga={fc['hits']} nya={fc['misses']} poster={fc['size']} | "
+          f"parsning: snabb={FEED_PARSE_STATS['fast']} poster, feedparser={FEED_PARSE_STATS['fallback']} feeds")
+    uc = GNEWS_URL_CACHE.stats()
+    print(f"🗂️ URL-cache: träffar={uc['hits']} missar={uc['misses']} poster={uc['size']} | "
+          f"token-avkodning: träffar={GNEWS_DECODE_STATS['hit']} missar={GNEWS_DECODE_STATS['miss']}")
+    print(f"🔎 Google News-sökningar: skickade={GNEWS_QUERY_STATS['sent']} | "
+          f"sammanslagna={GNEWS_QUERY_STATS['planned']} i stället för {GNEWS_QUERY_STATS['replaced']} enskilda")
+    sc = SUMMARY_CACHE.stats()
+    print(f"🗂️ Sammanfattningscache: träffar={sc['hits']} missar={sc['misses']} poster={sc['size']}")
+    fm = FEED_MARKS.stats
+    print(f"🗂️ Feed-märken: nya poster={fm['new']} redan behandlade={fm['old']}"
+          + (" (läses ändå: full omläsning)" if FEED_MARKS.force else "") + f" | flyttade märken={fm['committed']}")
+    br = BREAKERS.report()
+    if br["transitions"] or br["not_closed"]:
+        print(f"🔌 Brytare: växlingar={len(br['transitions'])} överhoppade anrop={sum(br['skipped'].values())} | "
+              + (" ".join(f"{k}={v['state']}" for k, v in br["not_closed"].items()) or "alla stängda"))
+    rep = METRICS.write(posted=posted, collected=collected[0])
+    FEED_MARKS.reset_stats()   # efter rapporten: daemonens omhämtning före nästa cykel räknas till den cykeln
+    slow = sorted(rep["stages"].items(), key=lambda kv: kv[1]["sum_s"], reverse=True)[:3]
+    print(f"⏱️ Körtid {rep['duration_s']:.1f}s | första post {rep['time_to_first_post_s'] if rep['time_to_first_post_s'] is not None else '–'}s | "
+          + " ".join(f"{k}={v['sum_s']:.1f}s" for k, v in slow))
+    return posted
 
-    print(f"📊 Summering: publicerade={posted}, översamlade={len(bundles)}, kvar_kvot={max(0, MAX_TRENDS-posted)}")
+def main():
+    print("🔎 Startar Trendkoll-worker...")
+    print("BASE_URL:", WP_BASE_URL, "| USER:", WP_USER)
+    preload_fonts()
+    if run_cycle() is None: return
+    save_caches()
     print("🏁 Klar körning.")
 
+def run_daemon():
+    """Långlivad process: HTTP-pooler, feeds, typsnitt, URL-cache och WP-index ligger kvar i minnet.
+    Varje källtyp pollas enligt sitt intervall; en cykel körs bara när någon källa faktiskt ändrats."""
+    print("🔎 Startar Trendkoll-worker i daemon-läge...")
+    print("BASE_URL:", WP_BASE_URL, "| USER:", WP_USER)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # → atexit sparar cacharna
+    POLLER.enabled = True
+    preload_fonts()
+    cycle = 0
+    while True:
+        cycle += 1
+        changed = POLLER.refresh_due() if cycle > 1 else {"första"}
+        if changed:
+            print(f"🔁 Cykel {cycle} ({', '.join(sorted(changed))})")
+            try:
+                run_cycle()
+            except Exception as e:
+                print(f"❌ Cykel {cycle} avbröts:", e)
+            save_caches()
+        else:
+            print(f"💤 Cykel {cycle}: inga källor har ändrats – hoppar över.")
+        time.sleep(max(DAEMON_MIN_SLEEP_S, POLLER.next_due() - time.time()))
+
 if __name__ == "__main__":
-    main()
+    if DAEMON or "--daemon" in sys.argv[1:]:
+        run_daemon()
+    else:
+        main()